@@ -1,7 +1,543 @@
+import argparse
+import array
+import csv
+import mmap
+import os
 import re
 import json
+import struct
+import sys
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Hashable, Iterable, Optional, Union
+
+# bytes系バリデーションが受け付ける型（bytes / bytearray / memoryview / mmap）
+BytesLike = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+# 電話番号から除去する文字（括弧・ハイフン・空白）の削除テーブル
+# re の \s と同じく str.isspace() が真になる文字をすべて含める（U+3000 まで）
+_PHONE_DELETE_TABLE = str.maketrans(
+    "", "", "()-" + "".join(ch for ch in map(chr, range(0x3001)) if ch.isspace())
+)
+
+# バイト値 -> 数字の値（ASCII数字以外は -1）
+_BYTE_DIGIT_VALUE = tuple(b - 0x30 if 0x30 <= b <= 0x39 else -1 for b in range(256))
+
+# Luhnアルゴリズムで2倍した桁の値（9を超えたら9を引いたもの）
+_LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+
+# ASCII数字のバイト -> 数字の値 / Luhnで2倍した値（bytes.translate と sum で桁和を計算する）
+_LUHN_VALUE_TABLE = bytes.maketrans(b"0123456789", bytes(range(10)))
+_LUHN_DOUBLED_TABLE = bytes.maketrans(b"0123456789", bytes(_LUHN_DOUBLED))
+
+# str.isspace() が真になるASCII文字（bytes側で str 版と同じ判定にするため）
+_ASCII_SPACE_CLASS = rb"\t-\r\x1c-\x1f "
+
+# 同梱データ（Public Suffix List の ICANN セクションのスナップショット等）
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+class ValidationCache:
+    """サイズ上限付きのLRUキャッシュ（ヒット/ミス数を記録）"""
+
+    def __init__(self, maxsize: int = 4096):
+        if maxsize <= 0:
+            raise ValueError("maxsize は1以上を指定してください")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """キャッシュ済みならその値を、なければ func() の結果を保存して返す"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        value = func()
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)  # 最も古いエントリを破棄
+        return value
+
+    def clear(self) -> None:
+        """エントリと統計をリセット"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット数・ミス数・現在のサイズ"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+class PublicSuffixTrie:
+    """Public Suffix List をラベル逆順のトライ木にしたバイナリ（mmap で読み込み）
+
+    ファイル形式（リトルエンディアン）:
+    - ヘッダ: マジック b"PSLT", バージョン(u16), 予約(u16), ノード数(u32), ラベル領域サイズ(u32)
+    - ノード表: (子の開始位置 u32, ラベル位置 u32, 子の数 u16, ラベル長 u8, フラグ u8) × ノード数
+      ノード0が根。子はラベルのバイト順に連続して並ぶため二分探索できる
+    - ラベル領域: 重複を除いたラベル（ASCII / Punycode）を連結したもの
+    """
+
+    MAGIC = b"PSLT"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHII")
+    NODE = struct.Struct("<IIHBB")
+    FLAG_RULE = 0x01       # ここで終わるルールがある
+    FLAG_EXCEPTION = 0x02  # 例外ルール（!www.ck など）
+
+    DEFAULT_LIST_PATH = os.path.join(DATA_DIR, "public_suffix_list.dat")
+    DEFAULT_TRIE_PATH = os.path.join(DATA_DIR, "public_suffix.trie")
+
+    def __init__(self, buf: Any):
+        magic, version, _, node_count, _ = self.HEADER.unpack_from(buf, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Public Suffix トライ木のファイル形式が不正です")
+        self._buf = buf
+        self._node_count = node_count
+        self._nodes_offset = self.HEADER.size
+        self._labels_offset = self.HEADER.size + node_count * self.NODE.size
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "PublicSuffixTrie":
+        """コンパイル済みファイルを mmap で読み込む
+
+        既定のファイルが未生成の場合は、同梱のリストからメモリ上でコンパイルする。
+        """
+        trie_path = path or cls.DEFAULT_TRIE_PATH
+        if path is None and not os.path.exists(trie_path):
+            return cls(cls.compile(cls.parse_list(cls.DEFAULT_LIST_PATH)))
+        with open(trie_path, "rb") as f:
+            try:
+                buf: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                buf = f.read()  # 空ファイルや mmap 非対応環境
+        return cls(buf)
+
+    @staticmethod
+    def parse_list(path: str) -> List[str]:
+        """public_suffix_list.dat 形式のファイルからルールを読み込む"""
+        rules = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                rule = line.split(None, 1)[0] if line.strip() else ""
+                if rule and not rule.startswith("//"):
+                    rules.append(rule)
+        return rules
+
+    @classmethod
+    def compile(cls, rules: Iterable[str]) -> bytes:
+        """ルール一覧をトライ木バイナリにコンパイル"""
+        root: Dict[str, Any] = {"flags": 0, "children": {}}
+        for rule in rules:
+            flag = cls.FLAG_RULE
+            if rule.startswith("!"):
+                flag, rule = cls.FLAG_EXCEPTION, rule[1:]
+            try:
+                labels = [
+                    b"*" if label == "*" else label.encode("idna")
+                    for label in reversed(rule.lower().split("."))
+                ]
+            except UnicodeError:
+                continue  # Punycode に変換できないルールは無視
+            node = root
+            for label in labels:
+                node = node["children"].setdefault(label, {"flags": 0, "children": {}})
+            node["flags"] |= flag
+
+        # 幅優先で番号を振り、兄弟ノードを連続させる
+        order: List[Any] = [(b"", root)]
+        child_start: List[int] = []
+        for _, node in order:
+            child_start.append(len(order))
+            order.extend(sorted(node["children"].items()))
+
+        label_offsets: Dict[bytes, int] = {}
+        blob = bytearray()
+        nodes = bytearray()
+        for i, (label, node) in enumerate(order):
+            if label not in label_offsets:
+                label_offsets[label] = len(blob)
+                blob += label
+            nodes += cls.NODE.pack(
+                child_start[i], label_offsets[label], len(node["children"]),
+                len(label), node["flags"],
+            )
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, len(order), len(blob))
+        return bytes(header + nodes + blob)
+
+    def _node(self, index: int):
+        return self.NODE.unpack_from(self._buf, self._nodes_offset + index * self.NODE.size)
+
+    def _label(self, offset: int, length: int) -> bytes:
+        start = self._labels_offset + offset
+        return self._buf[start:start + length]
+
+    def _find_child(self, start: int, count: int, label: bytes) -> int:
+        """子ノードからラベルを二分探索（見つからなければ -1）"""
+        lo, hi = start, start + count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            _, offset, _, length, _ = self._node(mid)
+            current = self._label(offset, length)
+            if current < label:
+                lo = mid + 1
+            elif current > label:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def public_suffix_length(self, domain: str) -> int:
+        """ドメインのパブリックサフィックスのラベル数（一致するルールがなければ0）"""
+        try:
+            labels = domain.lower().encode("ascii").split(b".")
+        except UnicodeError:
+            try:
+                labels = domain.lower().encode("idna").split(b".")
+            except UnicodeError:
+                return 0
+
+        suffix = 0
+        child_start, _, child_count, _, _ = self._node(0)
+        for depth, label in enumerate(reversed(labels)):
+            if child_count == 0:
+                break
+            # "*" はどのラベルよりも前にソートされるので先頭だけ見ればよい
+            _, offset, _, length, flags = self._node(child_start)
+            if flags & self.FLAG_RULE and self._label(offset, length) == b"*":
+                suffix = depth + 1
+            index = self._find_child(child_start, child_count, label)
+            if index < 0:
+                break
+            child_start, _, child_count, _, flags = self._node(index)
+            if flags & self.FLAG_EXCEPTION:
+                return depth  # 例外ルールは最左ラベルを除いた部分がサフィックス
+            if flags & self.FLAG_RULE:
+                suffix = depth + 1
+        return suffix
+
+    def is_registrable(self, domain: str) -> bool:
+        """既知のパブリックサフィックスの下にある登録可能なドメインか"""
+        suffix = self.public_suffix_length(domain)
+        return 0 < suffix < domain.count(".") + 1
+
+
+class BinTable:
+    """カードブランドの BIN/IIN 範囲表（重ならない範囲のソート済み配列。mmap で読み込み）
+
+    IIN は先頭8桁の整数として扱い、範囲の開始値の配列を bisect で探索する。
+
+    ファイル形式（リトルエンディアン）:
+    - ヘッダ: マジック b"BINR", バージョン(u16), 種別数(u16), 範囲数(u32), 名前領域サイズ(u32)
+    - 範囲の開始値(u32) × 範囲数、範囲の終了値(u32) × 範囲数（いずれも開始値の昇順）
+    - 範囲の種別番号(u8) × 範囲数（4バイト境界まで0埋め）
+    - 種別表: (有効桁数のビットマスク u32, 名前位置 u16, 名前長 u8, 予約 u8) × 種別数
+      種別はブランドと有効桁数の組（Diners の 36 と 300-305 のように桁数が異なる範囲は別種別）
+    - 名前領域: 重複を除いたブランド名（ASCII）を連結したもの
+    """
+
+    MAGIC = b"BINR"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHII")
+    BRAND = struct.Struct("<IHBx")
+    IIN_DIGITS = 8
+
+    DEFAULT_TABLE_PATH = os.path.join(DATA_DIR, "bin_ranges.csv")
+    DEFAULT_BINARY_PATH = os.path.join(DATA_DIR, "bin_ranges.bin")
+
+    def __init__(self, buf: Any):
+        magic, version, kind_count, count, _ = self.HEADER.unpack_from(buf, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("BIN範囲表のファイル形式が不正です")
+        self._buf = buf
+        starts_offset = self.HEADER.size
+        ends_offset = starts_offset + count * 4
+        brands_offset = ends_offset + count * 4
+        table_offset = brands_offset + -(-count // 4) * 4
+        names_offset = table_offset + kind_count * self.BRAND.size
+
+        self._starts = self._u32_array(buf, starts_offset, count)
+        self._ends = self._u32_array(buf, ends_offset, count)
+        self._range_kinds = bytes(buf[brands_offset:brands_offset + count])
+        # 種別番号 -> ブランド名、有効桁数のビットマスク
+        self.brands: List[str] = []
+        self.lengths: List[int] = []
+        for i in range(kind_count):
+            mask, offset, length = self.BRAND.unpack_from(buf, table_offset + i * self.BRAND.size)
+            start = names_offset + offset
+            self.brands.append(bytes(buf[start:start + length]).decode("ascii"))
+            self.lengths.append(mask)
+
+    @staticmethod
+    def _u32_array(buf: Any, offset: int, count: int) -> Any:
+        """u32 の配列（リトルエンディアンの環境ではコピーせず mmap を直接参照）"""
+        if sys.byteorder == "little":
+            return memoryview(buf)[offset:offset + count * 4].cast("I")
+        values = array.array("I", bytes(buf[offset:offset + count * 4]))
+        values.byteswap()
+        return values
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "BinTable":
+        """コンパイル済みファイルを mmap で読み込む
+
+        既定のファイルが未生成の場合は、同梱の範囲表からメモリ上でコンパイルする。
+        """
+        binary_path = path or cls.DEFAULT_BINARY_PATH
+        if path is None and not os.path.exists(binary_path):
+            return cls(cls.compile(cls.parse_table(cls.DEFAULT_TABLE_PATH)))
+        with open(binary_path, "rb") as f:
+            try:
+                buf: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                buf = f.read()  # 空ファイルや mmap 非対応環境
+        return cls(buf)
+
+    @staticmethod
+    def parse_lengths(spec: str) -> List[int]:
+        """"13;16;19" や "16-19" 形式の桁数指定を展開"""
+        lengths = []
+        for part in spec.split(";"):
+            low, _, high = part.strip().partition("-")
+            lengths.extend(range(int(low), int(high or low) + 1))
+        return lengths
+
+    @classmethod
+    def parse_table(cls, path: str) -> List[tuple]:
+        """bin_ranges.csv 形式のファイルから (開始, 終了, ブランド, 桁数) を読み込む"""
+        rules = []
+        with open(path, encoding="utf-8") as f:
+            lines = [line for line in f if line.strip() and not line.startswith("#")]
+        for row in csv.DictReader(lines):
+            rules.append((
+                row["start"].strip(), row["end"].strip(), row["brand"].strip(),
+                cls.parse_lengths(row["lengths"]),
+            ))
+        return rules
+
+    @classmethod
+    def compile(cls, rules: Iterable[tuple]) -> bytes:
+        """範囲表を重ならない範囲のソート済み配列にしてバイナリにコンパイル
+
+        範囲が重なる部分は幅の狭い（より具体的な）範囲のブランドにする。
+        """
+        kinds: Dict[tuple, int] = {}
+        ranges = []
+        for start, end, brand, lengths in rules:
+            if not (start.isdigit() and end.isdigit()) or len(end) > cls.IIN_DIGITS:
+                raise ValueError(f"BIN範囲が不正です: {start}-{end}")
+            low = int(start.ljust(cls.IIN_DIGITS, "0"))
+            high = int(end.ljust(cls.IIN_DIGITS, "9"))
+            if low > high:
+                raise ValueError(f"BIN範囲が不正です: {start}-{end}")
+            kind = kinds.setdefault((brand, sum(1 << n for n in lengths)), len(kinds))
+            ranges.append((low, high, kind))
+
+        # 範囲の境界で区切った区間ごとに、覆う範囲のうち最も狭いものを選ぶ
+        bounds = sorted({low for low, _, _ in ranges} | {high + 1 for _, high, _ in ranges})
+        segments: List[List[int]] = []
+        for low, next_low in zip(bounds, bounds[1:]):
+            covering = [(h - l, b) for l, h, b in ranges if l <= low and next_low - 1 <= h]
+            if not covering:
+                continue
+            kind = min(covering)[1]
+            if segments and segments[-1][1] == low - 1 and segments[-1][2] == kind:
+                segments[-1][1] = next_low - 1  # 隣接する同じ種別の区間はまとめる
+            else:
+                segments.append([low, next_low - 1, kind])
+
+        names = bytearray()
+        name_offsets: Dict[bytes, int] = {}
+        table = bytearray()
+        for brand, mask in kinds:
+            encoded = brand.encode("ascii")
+            if encoded not in name_offsets:
+                name_offsets[encoded] = len(names)
+                names += encoded
+            table += cls.BRAND.pack(mask, name_offsets[encoded], len(encoded))
+        count = len(segments)
+        body = struct.pack(f"<{count}I", *(s[0] for s in segments))
+        body += struct.pack(f"<{count}I", *(s[1] for s in segments))
+        body += bytes(s[2] for s in segments).ljust(-(-count // 4) * 4, b"\0")
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(kinds), count, len(names))
+        return header + body + bytes(table) + bytes(names)
+
+    def lookup(self, digits: str) -> int:
+        """カード番号（ASCII数字のみ）の先頭桁から種別番号を返す（該当なしは -1）"""
+        iin = int(digits[:self.IIN_DIGITS].ljust(self.IIN_DIGITS, "0"))
+        i = bisect_right(self._starts, iin) - 1
+        if i < 0 or iin > self._ends[i]:
+            return -1
+        return self._range_kinds[i]
+
+    def brand(self, digits: str) -> Optional[str]:
+        """カード番号の先頭桁（6桁以上を推奨）からブランド名を返す"""
+        index = self.lookup(digits)
+        return self.brands[index] if index >= 0 else None
+
+
+# 都道府県名（JIS X 0401 の都道府県コード順。コード n の名前は PREFECTURES[n - 1]）
+PREFECTURES = (
+    "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
+    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
+    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
+    "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
+    "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
+    "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
+    "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県",
+)
+
+
+class PostalCodeIndex:
+    """郵便番号の存在チェック用ビットマップ（mmap で読み込み）
+
+    7桁の郵便番号 n の存在をビットマップの n ビット目で表す（10^7 ビット = 1.25MB）。
+    都道府県は上3桁ごとの代表値と、代表値と異なる番号の例外表で引く。
+
+    ファイル形式（リトルエンディアン）:
+    - ヘッダ: マジック b"JPPC", バージョン(u16), 予約(u16), 郵便番号数(u32), 例外数(u32)
+    - ビットマップ: 10^7 ビット（n ビット目 = バイト n >> 3 のビット n & 7）
+    - 上3桁ごとの都道府県コード(u8) × 1000（0 は該当なし）
+    - 例外の郵便番号(u32) × 例外数（昇順）、例外の都道府県コード(u8) × 例外数
+    """
+
+    MAGIC = b"JPPC"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHII")
+    CODE_COUNT = 10_000_000
+    BITMAP_SIZE = CODE_COUNT // 8
+    PREFIX_DIVISOR = 10_000  # 上3桁 = 郵便番号 // 10000
+
+    DEFAULT_INDEX_PATH = os.path.join(DATA_DIR, "postal_codes.bin")
+
+    def __init__(self, buf: Any):
+        magic, version, _, count, exception_count = self.HEADER.unpack_from(buf, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("郵便番号インデックスのファイル形式が不正です")
+        self._buf = buf
+        self.count = count
+        self._bitmap_offset = self.HEADER.size
+        prefixes_offset = self._bitmap_offset + self.BITMAP_SIZE
+        exceptions_offset = prefixes_offset + self.CODE_COUNT // self.PREFIX_DIVISOR
+        self._prefixes = bytes(buf[prefixes_offset:exceptions_offset])
+        self._exception_codes = BinTable._u32_array(buf, exceptions_offset, exception_count)
+        prefs_offset = exceptions_offset + exception_count * 4
+        self._exception_prefs = bytes(buf[prefs_offset:prefs_offset + exception_count])
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "PostalCodeIndex":
+        """コンパイル済みファイルを mmap で読み込む（未生成なら FileNotFoundError）"""
+        index_path = path or cls.DEFAULT_INDEX_PATH
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(
+                f"郵便番号インデックスがありません: {index_path}"
+                "（python Validation/vali.py build-postal --source KEN_ALL.CSV で作成）"
+            )
+        with open(index_path, "rb") as f:
+            try:
+                buf: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                buf = f.read()  # 空ファイルや mmap 非対応環境
+        return cls(buf)
+
+    @staticmethod
+    def parse_japan_post(path: str) -> List[tuple]:
+        """日本郵便の郵便番号データから (郵便番号, 都道府県名) を読み込む
+
+        住所の郵便番号（KEN_ALL.CSV, 15列）と事業所の個別郵便番号（JIGYOSYO.CSV, 13列）
+        に対応する。文字コードは UTF-8（utf_ken_all.csv）と Shift_JIS のどちらでもよい。
+        """
+        for encoding in ("utf-8-sig", "cp932"):
+            try:
+                with open(path, encoding=encoding, newline="") as f:
+                    rows = list(csv.reader(f))
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            raise ValueError(f"{path}: 文字コードを判別できません")
+
+        entries = []
+        for row in rows:
+            if len(row) == 15:
+                code, prefecture = row[2], row[6]
+            elif len(row) == 13:
+                code, prefecture = row[7], row[3]
+            else:
+                raise ValueError(f"{path}: 日本郵便の郵便番号データの形式ではありません")
+            entries.append((code.strip(), prefecture.strip()))
+        return entries
+
+    @classmethod
+    def compile(cls, entries: Iterable[tuple]) -> bytes:
+        """(郵便番号, 都道府県名) の一覧をビットマップにコンパイル"""
+        bitmap = bytearray(cls.BITMAP_SIZE)
+        prefecture_codes = {name: i for i, name in enumerate(PREFECTURES, 1)}
+        codes: Dict[int, int] = {}
+        for code, prefecture in entries:
+            if len(code) != 7 or not (code.isascii() and code.isdigit()):
+                raise ValueError(f"郵便番号が不正です: {code}")
+            if prefecture not in prefecture_codes:
+                raise ValueError(f"都道府県名が不正です: {prefecture}")
+            number = int(code)
+            bitmap[number >> 3] |= 1 << (number & 7)
+            codes.setdefault(number, prefecture_codes[prefecture])
+
+        # 上3桁ごとに最も多い都道府県を代表値にし、それ以外を例外にする
+        tally: Dict[int, Dict[int, int]] = {}
+        for number, pref in codes.items():
+            counts = tally.setdefault(number // cls.PREFIX_DIVISOR, {})
+            counts[pref] = counts.get(pref, 0) + 1
+        prefixes = bytearray(cls.CODE_COUNT // cls.PREFIX_DIVISOR)
+        for prefix, counts in tally.items():
+            prefixes[prefix] = max(sorted(counts), key=counts.__getitem__)
+        exceptions = sorted(
+            (number, pref) for number, pref in codes.items()
+            if prefixes[number // cls.PREFIX_DIVISOR] != pref
+        )
+
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, len(codes), len(exceptions))
+        return (
+            header + bytes(bitmap) + bytes(prefixes)
+            + struct.pack(f"<{len(exceptions)}I", *(number for number, _ in exceptions))
+            + bytes(pref for _, pref in exceptions)
+        )
+
+    def __contains__(self, number: int) -> bool:
+        """7桁の郵便番号（整数）が存在するか"""
+        if not 0 <= number < self.CODE_COUNT:
+            return False
+        return bool(self._buf[self._bitmap_offset + (number >> 3)] >> (number & 7) & 1)
+
+    def prefecture(self, number: int) -> Optional[str]:
+        """郵便番号（整数）の都道府県名（存在しなければ None）"""
+        if number not in self:
+            return None
+        i = bisect_left(self._exception_codes, number)
+        if i < len(self._exception_codes) and self._exception_codes[i] == number:
+            pref = self._exception_prefs[i]
+        else:
+            pref = self._prefixes[number // self.PREFIX_DIVISOR]
+        return PREFECTURES[pref - 1]
 
 
 class Validator:
@@ -24,18 +560,152 @@ class Validator:
     # 日本の郵便番号（ハイフンあり/なし両方OK）
     POSTAL_CODE_REGEX = re.compile(r"^\d{3}-?\d{4}$")
 
+    # EMAIL_REGEX をローカル部とドメイン部に分割したもの（キャッシュ利用時）
+    EMAIL_LOCAL_REGEX = re.compile(
+        r"[a-zA-Z0-9!#$%&'*+/=?^_`{|}~-]+"
+        r"(?:\.[a-zA-Z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    )
+    EMAIL_DOMAIN_REGEX = re.compile(
+        r"(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+"
+        r"[a-zA-Z]{2,}",
+        re.IGNORECASE
+    )
+
+    # bytes系バリデーション用（ASCIIのみ。mmap等のバッファをそのまま照合する）
+    EMAIL_BYTES_REGEX = re.compile(EMAIL_REGEX.pattern.encode("ascii"), re.IGNORECASE)
+    PHONE_BYTES_REGEX = re.compile(
+        rb"[()%s-]*0(?:[()%s-]*[0-9]){9,10}[()%s-]*"
+        % (_ASCII_SPACE_CLASS, _ASCII_SPACE_CLASS, _ASCII_SPACE_CLASS)
+    )
+    POSTAL_CODE_BYTES_REGEX = re.compile(
+        rb"[%s]*[0-9]{3}-?[0-9]{4}[%s]*" % (_ASCII_SPACE_CLASS, _ASCII_SPACE_CLASS)
+    )
+
+    # オプトインの結果キャッシュ（enable_cache() で有効化）
+    _caches: Optional[Dict[str, ValidationCache]] = None
+
+    # Public Suffix List（初回のチェック時に読み込む）
+    _public_suffixes: Optional[PublicSuffixTrie] = None
+
+    # カードブランドの BIN/IIN 範囲表（初回の判定時に読み込む）
+    _bin_table: Optional[BinTable] = None
+
+    # 郵便番号の存在チェック用ビットマップ（初回のチェック時に読み込む）
+    _postal_codes: Optional[PostalCodeIndex] = None
+
+    @staticmethod
+    def load_public_suffix_list(path: Optional[str] = None) -> PublicSuffixTrie:
+        """メールドメインのチェックに使う Public Suffix トライ木を読み込む"""
+        Validator._public_suffixes = PublicSuffixTrie.load(path)
+        return Validator._public_suffixes
+
+    @staticmethod
+    def _has_public_suffix(domain: str) -> bool:
+        trie = Validator._public_suffixes or Validator.load_public_suffix_list()
+        return trie.is_registrable(domain)
+
+    @staticmethod
+    def load_bin_table(path: Optional[str] = None) -> BinTable:
+        """カードブランド判定に使う BIN/IIN 範囲表を読み込む"""
+        Validator._bin_table = BinTable.load(path)
+        return Validator._bin_table
+
+    @staticmethod
+    def load_postal_codes(path: Optional[str] = None) -> PostalCodeIndex:
+        """郵便番号の存在チェックに使うビットマップを読み込む"""
+        Validator._postal_codes = PostalCodeIndex.load(path)
+        return Validator._postal_codes
+
     @staticmethod
-    def validate_email(email: str) -> bool:
-        """メールアドレスのバリデーション（厳密め）"""
+    def enable_cache(maxsize: int = 4096) -> None:
+        """メールドメイン・電話番号・郵便番号の結果キャッシュを有効化"""
+        Validator._caches = {
+            "email_domain": ValidationCache(maxsize),
+            "phone": ValidationCache(maxsize),
+            "postal_code": ValidationCache(maxsize),
+        }
+
+    @staticmethod
+    def disable_cache() -> None:
+        """結果キャッシュを無効化（エントリも破棄）"""
+        Validator._caches = None
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Dict[str, int]]:
+        """キャッシュ種別ごとのヒット/ミス統計（無効時は空）"""
+        if Validator._caches is None:
+            return {}
+        return {name: c.stats() for name, c in Validator._caches.items()}
+
+    @staticmethod
+    def validate_email(email: str, check_public_suffix: bool = False) -> bool:
+        """メールアドレスのバリデーション（厳密め）
+
+        check_public_suffix=True の場合、ドメインが Public Suffix List に載っている
+        サフィックスの下にあるかも確認する（gmail.con や co.jp 直下を拒否）。
+        """
         if not email or len(email) > 254:
             return False
-        return bool(Validator.EMAIL_REGEX.fullmatch(email))
+        caches = Validator._caches
+        if caches is None:
+            if not Validator.EMAIL_REGEX.fullmatch(email):
+                return False
+            return not check_public_suffix or Validator._has_public_suffix(
+                email.rpartition("@")[2]
+            )
+
+        # キャッシュ有効時: ドメイン部の検証は異なるドメインごとに1回だけ
+        local, at, domain = email.rpartition("@")
+        if not at or len(local) > 64:
+            return False
+        if not Validator.EMAIL_LOCAL_REGEX.fullmatch(local):
+            return False
+        return caches["email_domain"].get_or_compute(
+            (domain.lower(), check_public_suffix),
+            lambda: bool(Validator.EMAIL_DOMAIN_REGEX.fullmatch(domain)) and (
+                not check_public_suffix or Validator._has_public_suffix(domain)
+            ),
+        )
 
     @staticmethod
     def validate_phone_number(phone: str) -> bool:
         """日本の電話番号（ハイフンあり/なし対応）"""
-        cleaned = re.sub(r"[()\s-]", "", phone)  # 余計な文字除去
-        return bool(Validator.PHONE_REGEX.fullmatch(cleaned))
+        caches = Validator._caches
+        if caches is not None:
+            return caches["phone"].get_or_compute(
+                phone, lambda: Validator._check_phone_number(phone)
+            )
+        return Validator._check_phone_number(phone)
+
+    @staticmethod
+    def _check_phone_number(phone: str) -> bool:
+        return Validator.normalize_phone_number(phone) is not None
+
+    @staticmethod
+    def normalize_phone_number(phone: str, e164: bool = False) -> Optional[str]:
+        """電話番号を検証し、正規化した番号を返す（無効なら None）
+
+        validate_phone_number と同じ判定を1パスで行う。
+        - 国内形式: 09012345678
+        - E.164形式（e164=True）: +819012345678
+        """
+        # 括弧・ハイフン・空白を削除（正規表現の置換を使わない）
+        cleaned = phone.translate(_PHONE_DELETE_TABLE)
+        # 先頭0 + 数字9〜10桁（PHONE_REGEX と同じ判定）
+        if len(cleaned) not in (10, 11) or cleaned[0] != "0" or not cleaned.isdecimal():
+            return None
+        if not cleaned.isascii():
+            # 全角数字などのUnicode数字はASCIIに揃える
+            cleaned = "".join(str(unicodedata.decimal(ch)) for ch in cleaned)
+        return "+81" + cleaned[1:] if e164 else cleaned
+
+    @staticmethod
+    def normalize_phone_numbers(
+        phones: Iterable[str], e164: bool = False
+    ) -> List[Optional[str]]:
+        """normalize_phone_number のバッチ版（入力順に結果を返す）"""
+        normalize = Validator.normalize_phone_number
+        return [normalize(phone, e164) for phone in phones]
 
     @staticmethod
     def validate_password(password: str, min_length: int = 8) -> bool:
@@ -48,7 +718,7 @@ class Validator:
         has_upper = re.search(r"[A-Z]", password)
         has_lower = re.search(r"[a-z]", password)
         has_digit = re.search(r"\d", password)
-        return has_upper and has_lower and has_digit
+        return bool(has_upper and has_lower and has_digit)
 
     @staticmethod
     def validate_date(date_str: str, fmt: str = "%Y-%m-%d") -> bool:
@@ -60,9 +730,38 @@ class Validator:
             return False
 
     @staticmethod
-    def validate_postal_code(postal_code: str) -> bool:
-        """日本の郵便番号（123-4567 または 1234567）"""
-        return bool(Validator.POSTAL_CODE_REGEX.fullmatch(postal_code.strip()))
+    def validate_postal_code(postal_code: str, check_exists: bool = False) -> bool:
+        """日本の郵便番号（123-4567 または 1234567）
+
+        check_exists=True の場合、日本郵便のデータから作ったビットマップで
+        実在する番号かも確認する（000-0000 などを拒否）。
+        """
+        caches = Validator._caches
+        if caches is not None:
+            return caches["postal_code"].get_or_compute(
+                (postal_code, check_exists),
+                lambda: Validator._check_postal_code(postal_code, check_exists),
+            )
+        return Validator._check_postal_code(postal_code, check_exists)
+
+    @staticmethod
+    def _check_postal_code(postal_code: str, check_exists: bool = False) -> bool:
+        postal_code = postal_code.strip()
+        if not Validator.POSTAL_CODE_REGEX.fullmatch(postal_code):
+            return False
+        if not check_exists:
+            return True
+        index = Validator._postal_codes or Validator.load_postal_codes()
+        return int(postal_code.replace("-", "")) in index
+
+    @staticmethod
+    def postal_code_prefecture(postal_code: str) -> Optional[str]:
+        """実在する郵便番号の都道府県名を返す（形式が不正・存在しなければ None）"""
+        postal_code = postal_code.strip()
+        if not Validator.POSTAL_CODE_REGEX.fullmatch(postal_code):
+            return None
+        index = Validator._postal_codes or Validator.load_postal_codes()
+        return index.prefecture(int(postal_code.replace("-", "")))
 
     @staticmethod
     def validate_credit_card(card_number: str) -> bool:
@@ -85,6 +784,75 @@ class Validator:
 
         return total % 10 == 0
 
+    @staticmethod
+    def _card_digits(card_number: str) -> str:
+        """空白・ハイフンを除いたカード番号をASCII数字で返す（他の文字を含めば空文字列）"""
+        digits = card_number.replace(" ", "").replace("-", "")
+        if digits.isascii():
+            return digits if digits.isdecimal() else ""
+        if not digits.isdecimal():
+            return ""
+        # 全角数字などのUnicode数字はASCIIに揃える
+        return "".join(str(unicodedata.decimal(ch)) for ch in digits)
+
+    @staticmethod
+    def _luhn_valid(digits: str) -> bool:
+        """ASCII数字列のLuhnチェック（桁ごとのループなし）"""
+        data = digits.encode("ascii")
+        total = sum(data[-1::-2].translate(_LUHN_VALUE_TABLE))
+        total += sum(data[-2::-2].translate(_LUHN_DOUBLED_TABLE))
+        return total % 10 == 0
+
+    @staticmethod
+    def card_brand(card_number: str) -> Optional[str]:
+        """BIN/IIN 範囲表によるカードブランド判定（桁数・Luhnは見ない。該当なしは None）"""
+        digits = Validator._card_digits(card_number)
+        if not digits:
+            return None
+        table = Validator._bin_table or Validator.load_bin_table()
+        return table.brand(digits)
+
+    @staticmethod
+    def classify_credit_card(card_number: str) -> Optional[str]:
+        """カード番号を検証し、ブランド名を返す（無効なら None）
+
+        ブランド判定・ブランドごとの桁数チェック・Luhnチェックを1回で行う。
+        validate_credit_card と異なり、空白・ハイフン以外の文字を含む番号や
+        範囲表にないBINの番号は、Luhnが通っても無効とする。
+        """
+        digits = Validator._card_digits(card_number)
+        if not 12 <= len(digits) <= 19:
+            return None
+        table = Validator._bin_table or Validator.load_bin_table()
+        kind = table.lookup(digits)
+        if kind < 0 or not table.lengths[kind] >> len(digits) & 1:
+            return None
+        return table.brands[kind] if Validator._luhn_valid(digits) else None
+
+    @staticmethod
+    def classify_credit_cards(card_numbers: Iterable[str]) -> List[Optional[str]]:
+        """classify_credit_card のバッチ版（入力順に結果を返す）"""
+        table = Validator._bin_table or Validator.load_bin_table()
+        card_digits = Validator._card_digits
+        lookup = table.lookup
+        brands = table.brands
+        lengths = table.lengths
+        values = _LUHN_VALUE_TABLE
+        doubled = _LUHN_DOUBLED_TABLE
+        results: List[Optional[str]] = []
+        append = results.append
+        for card_number in card_numbers:
+            digits = card_digits(card_number)
+            n = len(digits)
+            kind = lookup(digits) if 12 <= n <= 19 else -1
+            if kind < 0 or not lengths[kind] >> n & 1:
+                append(None)
+                continue
+            data = digits.encode("ascii")
+            total = sum(data[-1::-2].translate(values)) + sum(data[-2::-2].translate(doubled))
+            append(brands[kind] if total % 10 == 0 else None)
+        return results
+
     @staticmethod
     def validate_json(json_str: str) -> bool:
         """JSON文字列として有効か"""
@@ -94,6 +862,44 @@ class Validator:
         except json.JSONDecodeError:
             return False
 
+    # ── bytes系バリデーション（str へのデコードなし） ──
+    # 結果は対応する str 版に ASCII デコードした入力を渡した場合と同じ。
+    # 結果キャッシュは使わない。
+
+    @staticmethod
+    def validate_email_bytes(email: BytesLike) -> bool:
+        """validate_email の bytes 版"""
+        if not email or len(email) > 254:
+            return False
+        return bool(Validator.EMAIL_BYTES_REGEX.fullmatch(email))
+
+    @staticmethod
+    def validate_phone_number_bytes(phone: BytesLike) -> bool:
+        """validate_phone_number の bytes 版"""
+        return bool(Validator.PHONE_BYTES_REGEX.fullmatch(phone))
+
+    @staticmethod
+    def validate_postal_code_bytes(postal_code: BytesLike) -> bool:
+        """validate_postal_code の bytes 版（前後の空白は無視）"""
+        return bool(Validator.POSTAL_CODE_BYTES_REGEX.fullmatch(postal_code))
+
+    @staticmethod
+    def validate_credit_card_bytes(card_number: BytesLike) -> bool:
+        """validate_credit_card の bytes 版（バイト表で数字を判定しコピーなしでLuhn計算）"""
+        digit_value = _BYTE_DIGIT_VALUE
+        doubled = _LUHN_DOUBLED
+        total = 0
+        count = 0
+        for b in reversed(memoryview(card_number).cast("B")):
+            d = digit_value[b]
+            if d < 0:
+                continue  # 数字以外は無視
+            total += doubled[d] if count & 1 else d
+            count += 1
+            if count > 19:
+                return False
+        return count >= 13 and total % 10 == 0
+
 
 # ──────────────────────────────────────────────────
 # 使用例（ユーザー登録フォームのバリデーション）
@@ -132,8 +938,13 @@ def validate_user_form(user_data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-# テスト実行例
-if __name__ == "__main__":
+# lib/script_profiling.py（cProfile・tracemalloc は --profile / --trace-memory 指定時だけ読み込む）
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from script_profiling import maybe_load as _load_profiling, phase as _phase, session as _profiling_session  # noqa: E402
+
+
+def run_demo() -> None:
+    """使用例の実行"""
     test_data = {
         "email": "user@example.co.jp",
         "phone": "090-1234-5678",
@@ -142,4 +953,110 @@ if __name__ == "__main__":
         "postal_code": "100-0001",
     }
     result = validate_user_form(test_data)
-    print(result)
\ No newline at end of file
+    print(result)
+
+
+def build_public_suffix_trie(source: str, output: str) -> int:
+    """Public Suffix List をトライ木バイナリにコンパイルして保存"""
+    with _phase("parse"):
+        rules = PublicSuffixTrie.parse_list(source)
+    with _phase("compile"):
+        data = PublicSuffixTrie.compile(rules)
+    with _phase("write"), open(output, "wb") as f:
+        f.write(data)
+    print(f"{output} を作成しました（{len(data)} バイト）")
+    return 0
+
+
+def build_bin_table(source: str, output: str) -> int:
+    """BIN/IIN 範囲表をバイナリにコンパイルして保存"""
+    with _phase("parse"):
+        ranges = BinTable.parse_table(source)
+    with _phase("compile"):
+        data = BinTable.compile(ranges)
+    with _phase("write"), open(output, "wb") as f:
+        f.write(data)
+    print(f"{output} を作成しました（{len(data)} バイト）")
+    return 0
+
+
+def build_postal_code_index(sources: List[str], output: str) -> int:
+    """日本郵便の郵便番号データを存在チェック用ビットマップにコンパイルして保存"""
+    entries: List[tuple] = []
+    with _phase("parse"):
+        for source in sources:
+            entries.extend(PostalCodeIndex.parse_japan_post(source))
+    with _phase("compile"):
+        data = PostalCodeIndex.compile(entries)
+    with _phase("write"), open(output, "wb") as f:
+        f.write(data)
+    count = PostalCodeIndex.HEADER.unpack_from(data, 0)[3]
+    print(f"{output} を作成しました（郵便番号 {count} 件, {len(data)} バイト）")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        description="入力データバリデーション",
+        epilog="プロファイリング: --profile / --trace-memory / --profile-output FILE（サブコマンドの前に指定する）",
+    )
+    profiling = _load_profiling(argv)
+    if profiling is not None:
+        profiling.add_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command")
+
+    build_psl = subparsers.add_parser(
+        "build-psl", help="Public Suffix List をトライ木バイナリにコンパイル"
+    )
+    build_psl.add_argument(
+        "--source", default=PublicSuffixTrie.DEFAULT_LIST_PATH,
+        help="public_suffix_list.dat のパス (default: 同梱のスナップショット)",
+    )
+    build_psl.add_argument(
+        "--output", default=PublicSuffixTrie.DEFAULT_TRIE_PATH,
+        help="出力ファイル (default: data/public_suffix.trie)",
+    )
+
+    build_bin = subparsers.add_parser(
+        "build-bin", help="カードブランドの BIN/IIN 範囲表をバイナリにコンパイル"
+    )
+    build_bin.add_argument(
+        "--source", default=BinTable.DEFAULT_TABLE_PATH,
+        help="bin_ranges.csv のパス (default: 同梱の範囲表)",
+    )
+    build_bin.add_argument(
+        "--output", default=BinTable.DEFAULT_BINARY_PATH,
+        help="出力ファイル (default: data/bin_ranges.bin)",
+    )
+
+    build_postal = subparsers.add_parser(
+        "build-postal", help="日本郵便の郵便番号データを存在チェック用ビットマップにコンパイル"
+    )
+    build_postal.add_argument(
+        "--source", nargs="+", required=True,
+        help="KEN_ALL.CSV（住所）・JIGYOSYO.CSV（事業所）のパス（複数可）",
+    )
+    build_postal.add_argument(
+        "--output", default=PostalCodeIndex.DEFAULT_INDEX_PATH,
+        help="出力ファイル (default: data/postal_codes.bin)",
+    )
+
+    args = parser.parse_args(argv)
+    command = " ".join(["vali.py", *argv])
+    with _profiling_session(args, command):
+        if args.command == "build-psl":
+            return build_public_suffix_trie(args.source, args.output)
+        if args.command == "build-bin":
+            return build_bin_table(args.source, args.output)
+        if args.command == "build-postal":
+            return build_postal_code_index(args.source, args.output)
+
+        # テスト実行例
+        with _phase("demo"):
+            run_demo()
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,451 @@
+"""入力検証サーバー（Validator を常駐プロセスで実行し、複数のクライアントから呼び出す）
+
+短命なワーカーが毎回 vali.py を読み込むと、正規表現のコンパイルや Public Suffix List・
+BIN範囲表の読み込みを毎回やり直すことになる。このサーバーは温まった Validator を
+常駐させ、Unix ソケットまたは localhost の TCP で要求を受け付ける。
+
+- 全クライアントからの要求をまとめて（マイクロバッチ）ワーカーに渡す
+- 検証はサーバーのイベントループ内（--workers 0）またはプロセスプールで実行
+- クライアントは1件ずつの call と、送受信を重ねる map / call_many を使える
+
+プロトコル（ビッグエンディアン）:
+- 要求: ペイロード長(u32), 要求ID(u32), メソッド番号(u8) + 引数の JSON 配列
+- 応答: ペイロード長(u32), 要求ID(u32), 状態(u8: 0=成功, 1=エラー) + 結果の JSON
+  （エラー時はメッセージの JSON 文字列）。応答は要求の順に届くとは限らない
+
+Usage:
+    python Validation/vali_server.py --socket /tmp/vali.sock --workers 4
+    python Validation/vali_server.py --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# サーバーで呼び出せる Validator のメソッド（番号はプロトコル上のメソッド番号。末尾にのみ追加する）
+METHODS = (
+    "validate_email",
+    "validate_phone_number",
+    "normalize_phone_number",
+    "normalize_phone_numbers",
+    "validate_password",
+    "validate_date",
+    "validate_postal_code",
+    "postal_code_prefecture",
+    "validate_credit_card",
+    "card_brand",
+    "classify_credit_card",
+    "classify_credit_cards",
+    "validate_json",
+)
+METHOD_INDEX = {name: i for i, name in enumerate(METHODS)}
+
+REQUEST = struct.Struct(">IIB")
+RESPONSE = struct.Struct(">IIB")
+STATUS_OK = 0
+STATUS_ERROR = 1
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+# 接続ごとの送信バッファがこれを超えたら、クライアントが読むまで受信を止める
+WRITE_HIGH_WATER = 1024 * 1024
+
+Address = Union[str, Tuple[str, int]]
+
+
+# ──────────────────────────────────────────────────
+# ワーカー側（プロセスプールでは子プロセスで実行される）
+# ──────────────────────────────────────────────────
+_validator: Any = None
+
+
+def _load_validator() -> Any:
+    """Validator を読み込んで温める（プロセスごとに1回）"""
+    global _validator
+    if _validator is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        if here not in sys.path:
+            sys.path.insert(0, here)
+        from vali import Validator
+
+        # 初回の要求が遅くならないよう、遅延読み込みのデータと正規表現を先に使っておく
+        Validator.validate_email("warm@example.com", check_public_suffix=True)
+        Validator.classify_credit_card("4111111111111111")
+        Validator.normalize_phone_number("090-1234-5678")
+        Validator.validate_postal_code("100-0001")
+        _validator = Validator
+    return _validator
+
+
+def _run_batch(batch: List[Tuple[int, bytes]]) -> List[Tuple[int, bytes]]:
+    """(メソッド番号, 引数のJSON) の一覧を実行し、(状態, 結果のJSON) の一覧を返す"""
+    validator = _load_validator()
+    results = []
+    for method, payload in batch:
+        try:
+            value = getattr(validator, METHODS[method])(*json.loads(payload))
+            results.append((STATUS_OK, json.dumps(value, ensure_ascii=False).encode()))
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"
+            results.append((STATUS_ERROR, json.dumps(message, ensure_ascii=False).encode()))
+    return results
+
+
+# ──────────────────────────────────────────────────
+# サーバー
+# ──────────────────────────────────────────────────
+class ValidationServer:
+    """Validator をマイクロバッチで実行する常駐サーバー
+
+    受信した要求は全接続で1つの待ち行列に入る。ワーカーが空くたびに、その時点で
+    溜まっている要求（最大 batch_size 件）を1バッチとして渡すため、負荷が低いときは
+    1件ずつ即座に、高いときは大きなバッチで処理される。batch_delay を指定すると、
+    最初の要求からその秒数だけ待って集めてから渡す。
+    """
+
+    def __init__(self, workers: int = 0, batch_size: int = 256, batch_delay: float = 0.0):
+        if workers < 0 or batch_size <= 0 or batch_delay < 0:
+            raise ValueError("workers・batch_delay は0以上、batch_size は1以上を指定してください")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        # 統計
+        self.requests = 0
+        self.batches = 0
+        self.max_batch = 0
+
+        self.address: Optional[Address] = None
+        self._executor: Optional[Executor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped: Optional[asyncio.Event] = None
+        # 待ち行列: (メソッド番号, 引数のJSON, 応答先の接続, 要求ID)
+        self._pending: List[Tuple[int, bytes, asyncio.StreamWriter, int]] = []
+        self._ready: Optional[asyncio.Event] = None
+
+    def _create_executor(self) -> Optional[Executor]:
+        if self.workers == 0:
+            return None  # イベントループ内で実行（検証は数µs なのでスレッドに渡すより速い）
+        import multiprocessing
+
+        # スレッドを持つプロセスからの fork を避ける
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_validator,
+        )
+
+    async def _serve(self, path: Optional[str], host: str, port: int,
+                     started: Callable[[], None]) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._ready = asyncio.Event()
+        if path is not None:
+            if os.path.exists(path):
+                os.unlink(path)  # 前回のソケットファイル
+            server = await asyncio.start_unix_server(self._handle, path)
+            self.address = path
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+            self.address = server.sockets[0].getsockname()[:2]
+        batcher = asyncio.create_task(self._batcher())
+        started()
+        try:
+            async with server:
+                await self._stopped.wait()
+        finally:
+            batcher.cancel()
+            if path is not None and os.path.exists(path):
+                os.unlink(path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """1接続分の要求を読み、待ち行列に入れる"""
+        sock = writer.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                # 受信済みの完全なフレームをまとめて取り出す（フレームごとに待たない）
+                offset = 0
+                while len(buffer) - offset >= REQUEST.size:
+                    length, request_id, method = REQUEST.unpack_from(buffer, offset)
+                    if length > MAX_PAYLOAD:
+                        return  # 不正なフレーム。接続を切る
+                    end = offset + REQUEST.size + length
+                    if end > len(buffer):
+                        break
+                    payload = bytes(buffer[offset + REQUEST.size:end])
+                    offset = end
+                    if method >= len(METHODS):
+                        message = json.dumps(f"未対応のメソッド番号です: {method}", ensure_ascii=False)
+                        body = message.encode()
+                        writer.write(RESPONSE.pack(len(body), request_id, STATUS_ERROR) + body)
+                        continue
+                    self.requests += 1
+                    self._pending.append((method, payload, writer, request_id))
+                del buffer[:offset]
+                if self._pending:
+                    self._ready.set()
+                if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            pass  # 停止時に接続中だった。ここで終える（送出するとストリーム側がエラーを記録する）
+        finally:
+            writer.close()
+
+    async def _batcher(self) -> None:
+        """ワーカーが空くたびに、溜まっている要求を1バッチにして渡す"""
+        slots = asyncio.Semaphore(max(1, self.workers))
+        while True:
+            await self._ready.wait()
+            if self.batch_delay:
+                await asyncio.sleep(self.batch_delay)
+            await slots.acquire()
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            if not self._pending:
+                self._ready.clear()
+            if not batch:
+                slots.release()
+                continue
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+            if self._executor is None:
+                self._deliver(batch, _run_batch([(m, p) for m, p, _, _ in batch]))
+                slots.release()
+                await asyncio.sleep(0)  # 受信側に順番を回す
+                continue
+            future = self._loop.run_in_executor(
+                self._executor, _run_batch, [(method, payload) for method, payload, _, _ in batch]
+            )
+            future.add_done_callback(lambda f, batch=batch: self._finish(batch, f, slots))
+
+    def _finish(self, batch: List[Tuple[int, bytes, asyncio.StreamWriter, int]],
+                future: "asyncio.Future[List[Tuple[int, bytes]]]",
+                slots: asyncio.Semaphore) -> None:
+        slots.release()
+        try:
+            results = future.result()
+        except Exception as e:  # ワーカープロセスの異常終了など
+            error = json.dumps(f"{type(e).__name__}: {e}", ensure_ascii=False).encode()
+            results = [(STATUS_ERROR, error)] * len(batch)
+        self._deliver(batch, results)
+
+    @staticmethod
+    def _deliver(batch: List[Tuple[int, bytes, asyncio.StreamWriter, int]],
+                 results: List[Tuple[int, bytes]]) -> None:
+        """バッチの結果を接続ごとにまとめて書き込む（応答1件ごとに送信しない）"""
+        frames: Dict[asyncio.StreamWriter, List[bytes]] = {}
+        pack = RESPONSE.pack
+        for (_, _, writer, request_id), (status, body) in zip(batch, results):
+            frames.setdefault(writer, []).append(pack(len(body), request_id, status) + body)
+        for writer, chunks in frames.items():
+            if not writer.is_closing():
+                writer.write(b"".join(chunks))
+
+    def start(self, path: Optional[str] = None, host: str = "127.0.0.1", port: int = 0) -> Address:
+        """別スレッドでサーバーを起動し、待ち受けアドレスを返す（path 指定時は Unix ソケット）"""
+        self._executor = self._create_executor()
+        # 全ワーカーを起動して温めてから受け付けを始める
+        if self._executor is None:
+            _load_validator()
+        else:
+            for future in [self._executor.submit(_load_validator) for _ in range(self.workers)]:
+                future.result()
+        started = threading.Event()
+        errors: List[BaseException] = []
+
+        def run() -> None:
+            try:
+                asyncio.run(self._serve(path, host, port, started.set))
+            except BaseException as e:
+                errors.append(e)
+                started.set()
+
+        self._thread = threading.Thread(target=run, name="validation-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            if self._executor is not None:
+                self._executor.shutdown()
+            raise errors[0]
+        return self.address
+
+    def stop(self) -> None:
+        """サーバーを止め、ワーカーを終了する"""
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "ValidationServer":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, float]:
+        """受け付けた要求数・バッチ数・最大バッチサイズ・平均バッチサイズ"""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0,
+        }
+
+
+# ──────────────────────────────────────────────────
+# クライアント
+# ──────────────────────────────────────────────────
+class ValidationServerError(Exception):
+    """サーバー側で検証メソッドが例外を送出した"""
+
+
+class ValidationClient:
+    """ValidationServer のクライアント（スレッドセーフではない。スレッドごとに作る）"""
+
+    # map / call_many で応答を待たずに送る要求数
+    WINDOW = 512
+
+    def __init__(self, address: Address, timeout: Optional[float] = 10.0):
+        if isinstance(address, str):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.settimeout(timeout)
+        self._sock.connect(address)
+        self._reader = self._sock.makefile("rb")
+        self._next_id = 0
+
+    def close(self) -> None:
+        self._reader.close()
+        self._sock.close()
+
+    def __enter__(self) -> "ValidationClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _encode(self, method: str, args: Sequence[Any]) -> Tuple[int, bytes]:
+        if method not in METHOD_INDEX:
+            raise ValueError(f"サーバーで呼び出せないメソッドです: {method}")
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        body = json.dumps(list(args), ensure_ascii=False).encode()
+        return self._next_id, REQUEST.pack(len(body), self._next_id, METHOD_INDEX[method]) + body
+
+    def _receive(self) -> Tuple[int, int, Any]:
+        header = self._reader.read(RESPONSE.size)
+        if len(header) < RESPONSE.size:
+            raise ConnectionError("サーバーとの接続が切れました")
+        length, request_id, status = RESPONSE.unpack(header)
+        return request_id, status, json.loads(self._reader.read(length))
+
+    @staticmethod
+    def _result(status: int, value: Any) -> Any:
+        if status != STATUS_OK:
+            raise ValidationServerError(value)
+        return value
+
+    def call(self, method: str, *args: Any) -> Any:
+        """Validator.<method>(*args) をサーバーで実行して結果を返す"""
+        request_id, frame = self._encode(method, args)
+        self._sock.sendall(frame)
+        received_id, status, value = self._receive()
+        if received_id != request_id:
+            raise ConnectionError("応答の要求IDが一致しません")
+        return self._result(status, value)
+
+    def call_many(self, calls: Iterable[Tuple[str, Sequence[Any]]]) -> List[Any]:
+        """(メソッド名, 引数) の一覧を、応答を待たずに送って実行する（結果は入力順）
+
+        いずれかがサーバー側で失敗した場合は、全件の応答を受け取ってから
+        最初の失敗を ValidationServerError として送出する。
+        """
+        results: List[Any] = []
+        errors: List[str] = []
+        window: List[bytes] = []
+        positions: Dict[int, int] = {}
+
+        def flush() -> None:
+            self._sock.sendall(b"".join(window))
+            window.clear()
+            while positions:
+                request_id, status, value = self._receive()
+                index = positions.pop(request_id)
+                results[index] = value
+                if status != STATUS_OK:
+                    errors.append(value)
+
+        for method, args in calls:
+            request_id, frame = self._encode(method, args)
+            positions[request_id] = len(results)
+            results.append(None)
+            window.append(frame)
+            if len(window) >= self.WINDOW:
+                flush()
+        flush()
+        if errors:
+            raise ValidationServerError(errors[0])
+        return results
+
+    def map(self, method: str, values: Iterable[Any]) -> List[Any]:
+        """values の各要素を1引数として method を実行する（結果は入力順）"""
+        return self.call_many((method, (value,)) for value in values)
+
+
+# ──────────────────────────────────────────────────
+# CLI
+# ──────────────────────────────────────────────────
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="入力検証サーバー（マイクロバッチ）")
+    listen = parser.add_mutually_exclusive_group(required=True)
+    listen.add_argument("--socket", help="待ち受ける Unix ソケットのパス")
+    listen.add_argument("--port", type=int, help="待ち受ける TCP ポート（--host で指定したアドレス）")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP の待ち受けアドレス (default: 127.0.0.1)")
+    parser.add_argument(
+        "--workers", type=int, default=0,
+        help="ワーカープロセス数。0 ならサーバーのイベントループ内で実行 (default: 0)",
+    )
+    parser.add_argument("--batch-size", type=int, default=256, help="1バッチの最大要求数 (default: 256)")
+    parser.add_argument(
+        "--batch-delay", type=float, default=0.0,
+        help="最初の要求からバッチを集める待ち時間（秒） (default: 0 = 待たない)",
+    )
+    args = parser.parse_args(argv)
+
+    server = ValidationServer(args.workers, args.batch_size, args.batch_delay)
+    address = server.start(args.socket, args.host, args.port or 0)
+    print(f"入力検証サーバーを起動しました: {address}（ワーカー {args.workers}）", flush=True)
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    stop.wait()
+    server.stop()
+    print(f"停止しました: {server.stats()}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,292 @@
+"""
+プロファイリング共通ライブラリ（--profile / --trace-memory）
+
+各スクリプトの main から読み込むことを想定しています。
+遅い一括処理を手元で cProfile に包み直さなくても、同じオプションで
+計測結果をファイルに残せるようにするためのものです。
+重い cProfile・tracemalloc は計測を始めるときだけ読み込みます。
+オプションは argv に --profile / --trace-memory / --profile-output があるときだけ
+maybe_load が返すモジュールで追加し、それ以外では phase・session は何もしません。
+
+使用方法:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+    from script_profiling import maybe_load as _load_profiling, phase as _phase, session as _profiling_session
+
+    parser = argparse.ArgumentParser(...)
+    profiling = _load_profiling(argv)
+    if profiling is not None:
+        profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+    with _profiling_session(args, "script.py"):
+        with _phase("load"):
+            ...
+
+レポート（--profile-output、既定は <スクリプト名>-<日時>.profile.txt）の内容:
+- 区間（phase）ごとの回数・経過時間・割合（--trace-memory 時は区間中のピーク使用量）
+- --profile: cProfile の累積時間の上位。生データは <レポート>.pstats に保存する
+- --trace-memory: tracemalloc の確保元（行単位）の上位
+"""
+
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# レポートに載せる件数
+PROFILE_TOP = 40
+MEMORY_TOP = 25
+# tracemalloc で記録するスタックの深さ（確保元の行だけを見るので1で足りる）
+MEMORY_FRAMES = 1
+# 使用量を確認する間隔（秒）。それまでの最大を MEMORY_SNAPSHOT_GROWTH 倍超えたらスナップショットを取る
+MEMORY_SAMPLE_INTERVAL = 0.1
+MEMORY_SNAPSHOT_GROWTH = 1.1
+
+_active: Optional["Profiler"] = None
+
+
+class Profiler:
+    """cProfile・tracemalloc・区間ごとの経過時間を記録し、終了時にレポートを書く"""
+
+    def __init__(self, output: str, profile: bool = True, trace_memory: bool = False,
+                 command: str = ""):
+        self.output = output
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.command = command
+        # 区間名 -> [回数, 合計秒数, ピーク使用量（バイト）]
+        self.phases: Dict[str, List[float]] = {}
+        self.elapsed = 0.0
+        self.peak = 0
+        self._stack: List[List[float]] = []  # 入れ子の区間ごとの [開始時刻, ピーク]
+        self._profiler: Any = None
+        self._started_at: Optional[datetime] = None
+        self._start = 0.0
+        # 最も使用量が多かった時点のスナップショット（ラベル, 使用量, スナップショット）
+        self._snapshot: Optional[Tuple[str, int, Any]] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop_sampler = threading.Event()
+
+    def start(self) -> None:
+        global _active
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.start(MEMORY_FRAMES)
+        if self.profile:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+        self._started_at = datetime.now()
+        self._start = time.perf_counter()
+        if self.trace_memory:
+            self._sampler = threading.Thread(target=self._sample_memory, name="profiling-memory",
+                                             daemon=True)
+            self._sampler.start()
+        if self._profiler is not None:
+            self._profiler.enable()
+        _active = self
+
+    def stop(self) -> None:
+        global _active
+        _active = None
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.elapsed = time.perf_counter() - self._start
+        if self.trace_memory:
+            import tracemalloc
+
+            self._stop_sampler.set()
+            self._sampler.join()
+            self._take_snapshot("終了時")
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.write_report()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """name の区間の経過時間（と --trace-memory 時はピーク使用量）を記録"""
+        if self.trace_memory:
+            import tracemalloc
+
+            if self._stack:
+                # 親の区間のピークを確定させてから、この区間用にリセットする
+                parent = self._stack[-1]
+                parent[1] = max(parent[1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        entry = [time.perf_counter(), 0]
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            seconds = time.perf_counter() - entry[0]
+            peak = 0
+            if self.trace_memory:
+                import tracemalloc
+
+                peak = max(entry[1], tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+                else:
+                    self._take_snapshot(f"区間 {name} の終了時")
+            record = self.phases.setdefault(name, [0, 0.0, 0])
+            record[0] += 1
+            record[1] += seconds
+            record[2] = max(record[2], peak)
+
+    def _take_snapshot(self, label: str, growth: float = 1.0) -> None:
+        """使用量がそれまでの最大の growth 倍を超えていればスナップショットを残す
+
+        確保元は終了時には解放済みのことが多いため、使用量が最も多かった時点のものを報告する。
+        """
+        import tracemalloc
+
+        current = tracemalloc.get_traced_memory()[0]
+        if self._snapshot is None or current > self._snapshot[1] * growth:
+            self._snapshot = (label, current, tracemalloc.take_snapshot())
+
+    def _sample_memory(self) -> None:
+        while not self._stop_sampler.wait(MEMORY_SAMPLE_INTERVAL):
+            self._take_snapshot(f"開始から {time.perf_counter() - self._start:.1f}秒", MEMORY_SNAPSHOT_GROWTH)
+
+    def render(self) -> str:
+        """レポートの文字列"""
+        out = io.StringIO()
+        out.write(f"# プロファイル: {self.command}\n")
+        started = self._started_at.isoformat(timespec="seconds") if self._started_at else "-"
+        out.write(f"開始: {started}  経過時間: {self.elapsed:.3f}秒\n")
+        if self.trace_memory:
+            out.write(f"tracemalloc のピーク使用量: {self.peak / 1e6:.1f} MB\n")
+
+        out.write("\n## 区間ごとの経過時間\n")
+        if not self.phases:
+            out.write("（区間の記録なし）\n")
+        else:
+            header = _ljust("区間", 24) + _rjust("回数", 8) + _rjust("合計(秒)", 12) + _rjust("割合", 8)
+            if self.trace_memory:
+                header += _rjust("ピーク(MB)", 12)
+            out.write(header + "\n")
+            for name, (count, seconds, peak) in self.phases.items():
+                line = (_ljust(name, 24) + f"{int(count):>8}{seconds:>12.3f}"
+                        f"{seconds / max(self.elapsed, 1e-9):>8.1%}")
+                if self.trace_memory:
+                    line += f"{peak / 1e6:>12.1f}"
+                out.write(line + "\n")
+
+        if self._profiler is not None:
+            import pstats
+
+            out.write(f"\n## cProfile（累積時間の上位 {PROFILE_TOP}、メインスレッドのみ）\n")
+            out.write(f"生データ: {self.output}.pstats\n")
+            stats = pstats.Stats(self._profiler, stream=out)
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+
+        if self._snapshot is not None:
+            label, current, snapshot = self._snapshot
+            out.write(f"\n## メモリの確保元（{label}、{current / 1e6:.1f} MB 使用中の上位 {MEMORY_TOP}）\n")
+            for stat in snapshot.statistics("lineno")[:MEMORY_TOP]:
+                frame = stat.traceback[0]
+                out.write(f"{stat.size / 1e6:>10.2f} MB {stat.count:>10} 個  "
+                          f"{frame.filename}:{frame.lineno}\n")
+        return out.getvalue()
+
+    def write_report(self) -> None:
+        with open(self.output, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        if self._profiler is not None:
+            self._profiler.dump_stats(f"{self.output}.pstats")
+        print(f"プロファイルを {self.output} に書き出しました", file=sys.stderr)
+
+
+def _width(text: str) -> int:
+    """端末での表示幅（全角文字は2）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+
+
+def _ljust(text: str, width: int) -> str:
+    return text + " " * max(0, width - _width(text))
+
+
+def _rjust(text: str, width: int) -> str:
+    return " " * max(0, width - _width(text)) + text
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """計測中なら name の区間を記録する（計測していなければ何もしない）"""
+    if _active is None:
+        yield
+        return
+    with _active.phase(name):
+        yield
+
+
+def maybe_load(argv: Sequence[str]) -> Optional[ModuleType]:
+    """argv にプロファイリングのオプションがあればこのモジュールを返す（なければ None）"""
+    if not any(arg.startswith(("--profile", "--trace-memory")) for arg in argv):
+        return None
+    return sys.modules[__name__]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """--profile / --trace-memory / --profile-output を parser に追加"""
+    group = parser.add_argument_group("プロファイリング")
+    group.add_argument(
+        "--profile", action="store_true",
+        help="cProfile の結果と区間ごとの経過時間をレポートに書き出す",
+    )
+    group.add_argument(
+        "--trace-memory", action="store_true",
+        help="tracemalloc で確保元の上位と区間ごとのピーク使用量をレポートに書き出す",
+    )
+    group.add_argument(
+        "--profile-output", metavar="FILE",
+        help="レポートの出力先 (default: <スクリプト名>-<日時>.profile.txt)",
+    )
+
+
+def split_arguments(argv: Sequence[str],
+                    subcommands: Sequence[str] = ()) -> Tuple[argparse.Namespace, List[str]]:
+    """argv からプロファイリングのオプションを取り出し、(オプション, 残りの引数) を返す
+
+    subcommands のいずれかが現れたら、それ以降は取り出さない
+    （サブコマンドに同じ名前のオプションがある場合はサブコマンドの前に指定する）。
+    """
+    argv = list(argv)
+    end = next((i for i, arg in enumerate(argv) if arg in subcommands), len(argv))
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    add_arguments(parser)
+    options, rest = parser.parse_known_args(argv[:end])
+    return options, rest + argv[end:]
+
+
+def default_output(command: str) -> str:
+    name = os.path.splitext(os.path.basename(command.split()[0] if command else "profile"))[0]
+    return f"{name}-{datetime.now():%Y%m%d-%H%M%S}.profile.txt"
+
+
+@contextmanager
+def session(args: argparse.Namespace, command: str) -> Iterator[Optional[Profiler]]:
+    """args の指定に従って計測する（--profile・--trace-memory のどちらもなければ何もしない）
+
+    command はレポートの見出しと既定の出力先の名前に使う。
+    """
+    profile = getattr(args, "profile", False)
+    trace_memory = getattr(args, "trace_memory", False)
+    if not (profile or trace_memory):
+        yield None
+        return
+    output = getattr(args, "profile_output", None) or default_output(command)
+    profiler = Profiler(output, profile, trace_memory, command)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
@@ -1,92 +1,1404 @@
+import argparse
+import array
+import asyncio
+import errno
+import fcntl
+import ipaddress
+import json
+import os
+import random
+import select
+import shlex
+import signal
+import socket
+import stat
+import struct
 import subprocess
+import sys
+import tempfile
+import threading
 import time
 import logging
-from typing import List, Optional
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import netifaces as ni
 
 # ロギングの設定
-logging.basicConfig(filename="/tmp/wifilog.txt", level=logging.INFO, 
+logging.basicConfig(filename="/tmp/wifilog.txt", level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-# 安全なネットワークのリスト
+# 安全なネットワークのリスト（設定ファイルがない場合の既定値）
 SAFE_NETWORKS: List[str] = ["SSID1", "SSID2", "SSID3"]
 GATEWAY_IP: str = "<ゲートウェイIPアドレス>"  # 実際のIPアドレスに置き換える
 
-def get_known_networks() -> List[str]:
+# 拠点ごとの設定ファイル（JSON）。--config で上書き可能
+CONFIG_PATH: str = os.getenv("NETWORK_BUILD_CONFIG", "/etc/network-build.json")
+
+# ファイアウォールルールの読み書きに使うコマンド（テスト時は偽のバイナリに差し替え可能）
+IPTABLES_SAVE: str = os.getenv("IPTABLES_SAVE", "iptables-save")
+IPTABLES_RESTORE: str = os.getenv("IPTABLES_RESTORE", "iptables-restore")
+
+# このスクリプトが管理するルールに付けるコメント
+RULE_TAG: str = "network-build"
+
+# 状態ファイルの置き場所（root 所有・0700 で作成し、他のユーザーが書き換えられないようにする）
+STATE_DIR: str = os.getenv("NETWORK_BUILD_STATE_DIR", "/var/lib/network-build")
+
+# Wi-Fiスキャン結果のキャッシュと接続履歴（候補の順位付けに使う）
+SCAN_CACHE_PATH: str = os.path.join(STATE_DIR, "wifi_scan_cache.json")
+SCAN_CACHE_TTL: float = 30.0
+HISTORY_PATH: str = os.path.join(STATE_DIR, "wifi_history.json")
+# 最後にプロファイルを保存したSSIDと保存先（同じ内容を保存し直さないための記録）
+EXPORT_MARKER_PATH: str = os.path.join(STATE_DIR, "exported_profile.json")
+
+# 候補の評価: 信号強度(0-100) + 周波数帯ボーナス + 過去の接続成功率 × 重み
+BAND_BONUS: Dict[str, float] = {"2.4GHz": 0.0, "5GHz": 10.0, "6GHz": 15.0}
+HISTORY_WEIGHT: float = 30.0
+
+# 外部コマンド1回あたりのタイムアウト（秒）
+COMMAND_TIMEOUT: float = 30.0
+
+# 接続確認の待ち時間（状態が確認でき次第終了する）
+CONNECT_TIMEOUT: float = 15.0
+# イベントを取りこぼした場合に備えて状態を再確認する間隔
+RECHECK_INTERVAL: float = 1.0
+# 監視モードでフェイルオーバーに失敗した後、再試行するまでの待ち時間
+FAILOVER_RETRY_INTERVAL: float = 30.0
+
+# デーモンモード: 確認間隔・揺らぎ（±割合）・状態ファイル
+DAEMON_INTERVAL: float = 60.0
+DAEMON_JITTER: float = 0.1
+STATUS_PATH: str = os.path.join(STATE_DIR, "status.json")
+
+# rtnetlink のマルチキャストグループ（リンク・IPv4アドレス・IPv4ルートの変更）
+RTMGRP_LINK = 0x01
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+
+# 無線拡張の ioctl（iwgetid と同じ方法でSSIDを取得する）
+SIOCGIWESSID = 0x8B1B
+IW_ESSID_MAX_SIZE = 32
+
+
+# ──────────────────────────────────────────────────
+# 設定
+# ──────────────────────────────────────────────────
+@dataclass(frozen=True)
+class NetworkConfig:
+    """拠点ごとの設定（省略した項目は既定値）"""
+    safe_networks: Tuple[str, ...] = tuple(SAFE_NETWORKS)
+    gateway_ip: str = GATEWAY_IP
+    nat_interface: str = "eth0"
+    priority_connection: str = "SSID1"
+    priority: int = 1
+    profile_export_path: str = os.path.join(STATE_DIR, "current_network.xml")
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "NetworkConfig":
+        """JSONの内容を検証して設定を作成"""
+        if not isinstance(data, dict):
+            raise ValueError("設定はオブジェクトで記述してください")
+        unknown = set(data) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"未知の設定項目があります: {', '.join(sorted(unknown))}")
+        values = dict(data)
+        if "safe_networks" in values:
+            networks = values["safe_networks"]
+            if (not isinstance(networks, list) or not networks
+                    or not all(isinstance(n, str) and n for n in networks)):
+                raise ValueError("safe_networks は空でない文字列のリストで指定してください")
+            values["safe_networks"] = tuple(networks)
+        for name in ("gateway_ip", "nat_interface", "priority_connection", "profile_export_path"):
+            if name in values and not (isinstance(values[name], str) and values[name]):
+                raise ValueError(f"{name} は空でない文字列で指定してください")
+        if "gateway_ip" in values:
+            try:
+                ipaddress.IPv4Address(values["gateway_ip"])
+            except ValueError:
+                raise ValueError(f"gateway_ip がIPv4アドレスではありません: {values['gateway_ip']}") from None
+        if "priority" in values and (isinstance(values["priority"], bool)
+                                     or not isinstance(values["priority"], int)):
+            raise ValueError("priority は整数で指定してください")
+        return cls(**values)
+
+
+def load_config(path: Optional[str] = None) -> NetworkConfig:
+    """設定ファイルを読み込む（既定のパスにファイルがなければ既定値を使う）"""
+    if path is None and not os.path.exists(CONFIG_PATH):
+        logging.info(f"設定ファイル {CONFIG_PATH} がないため既定値を使います")
+        return NetworkConfig()
+    path = path or CONFIG_PATH
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: JSONとして読み込めません（{e}）") from None
+    config = NetworkConfig.from_dict(data)
+    logging.info(f"設定ファイル {path} を読み込みました")
+    return config
+
+
+# ──────────────────────────────────────────────────
+# 状態ファイル（シンボリックリンク・他のユーザーのファイルを信用しない）
+# ──────────────────────────────────────────────────
+def _ensure_private_dir(directory: str) -> None:
+    """directory がなければ 0700 で作成し、他のユーザーが書き換えられないことを確認"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    writable_by_others = st.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and not st.st_mode & stat.S_ISVTX
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.geteuid() or writable_by_others:
+        raise PermissionError(f"{directory} は現在のユーザー専用のディレクトリではありません")
+
+
+def read_state_file(path: str) -> Optional[str]:
+    """状態ファイルを読む（ない・シンボリックリンク・現在のユーザーの通常ファイルでなければ None）"""
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC)
+    except OSError:
+        return None
+    with os.fdopen(fd, encoding="utf-8") as f:
+        st = os.fstat(f.fileno())
+        if not stat.S_ISREG(st.st_mode) or st.st_uid != os.geteuid():
+            logging.warning(f"{path} は現在のユーザーが所有する通常ファイルではないため無視します")
+            return None
+        try:
+            return f.read()
+        except (OSError, ValueError):
+            return None
+
+
+def write_state_file(path: str, text: str) -> None:
+    """状態ファイルを置き換えで書き込む（一時ファイルは mkstemp で作成。失敗時は OSError）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    _ensure_private_dir(directory)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)  # path がシンボリックリンクでもリンク自体を置き換える
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# ──────────────────────────────────────────────────
+# ネットワーク状態のスナップショット
+# ──────────────────────────────────────────────────
+@dataclass
+class InterfaceInfo:
+    """インターフェース情報"""
+    name: str
+    addresses: List[str] = field(default_factory=list)  # IPv4アドレス
+    operstate: str = "unknown"
+    wireless: bool = False
+
+
+@dataclass
+class Route:
+    """IPv4ルート"""
+    interface: str
+    destination: str
+    gateway: str
+    mask: str
+    metric: int = 0
+
+    @property
+    def is_default(self) -> bool:
+        return self.destination == "0.0.0.0" and self.mask == "0.0.0.0"
+
+
+@dataclass
+class NetworkSnapshot:
+    """1回の実行で参照するネットワーク状態"""
+    backend: str
+    interfaces: Dict[str, InterfaceInfo] = field(default_factory=dict)
+    routes: List[Route] = field(default_factory=list)
+    ssid: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)  # 取得にかかった秒数
+
+    @property
+    def addresses(self) -> List[str]:
+        """全インターフェースのIPv4アドレス"""
+        return [addr for info in self.interfaces.values() for addr in info.addresses]
+
+    @property
+    def default_route(self) -> Optional[Route]:
+        defaults = [r for r in self.routes if r.is_default]
+        return min(defaults, key=lambda r: r.metric) if defaults else None
+
+
+@contextmanager
+def timed(timings: Dict[str, float], name: str) -> Iterator[None]:
+    """処理時間を timings[name] に記録"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def _hex_to_ipv4(value: str) -> str:
+    """/proc/net/route のリトルエンディアン16進表記をドット表記に変換"""
+    return socket.inet_ntoa(struct.pack("<L", int(value, 16)))
+
+
+def parse_proc_net_route(text: str) -> List[Route]:
+    """/proc/net/route の内容をパース"""
+    routes = []
+    for line in text.splitlines()[1:]:
+        cols = line.split()
+        if len(cols) < 8:
+            continue
+        routes.append(Route(
+            interface=cols[0],
+            destination=_hex_to_ipv4(cols[1]),
+            gateway=_hex_to_ipv4(cols[2]),
+            mask=_hex_to_ipv4(cols[7]),
+            metric=int(cols[6]),
+        ))
+    return routes
+
+
+def parse_ip_route(text: str) -> List[Route]:
+    """`ip -4 route show` の出力をパース（サブプロセス版）"""
+    routes = []
+    for line in text.splitlines():
+        cols = line.split()
+        if not cols:
+            continue
+        opts = dict(zip(cols[1::2], cols[2::2]))
+        if cols[0] == "default":
+            destination, mask = "0.0.0.0", "0.0.0.0"
+        else:
+            net, _, prefix = cols[0].partition("/")
+            bits = int(prefix or 32)
+            destination = net
+            mask = socket.inet_ntoa(struct.pack(">L", (0xFFFFFFFF << (32 - bits)) & 0xFFFFFFFF))
+        routes.append(Route(
+            interface=opts.get("dev", ""),
+            destination=destination,
+            gateway=opts.get("via", "0.0.0.0"),
+            mask=mask,
+            metric=int(opts.get("metric", 0)),
+        ))
+    return routes
+
+
+def _read_ipv4_addresses(iface: str) -> List[str]:
+    """インターフェースのIPv4アドレス（ifaddresses は1回だけ呼ぶ）"""
+    try:
+        return [a["addr"] for a in ni.ifaddresses(iface).get(ni.AF_INET, []) if "addr" in a]
+    except ValueError:
+        return []
+
+
+# SIOCGIWESSID に対応しないインターフェース（一度失敗したら以降は ioctl を呼ばない）
+_ssid_ioctl_unsupported: Set[str] = set()
+
+
+def _read_ssid_ioctl(iface: str) -> Optional[str]:
+    """SIOCGIWESSID でSSIDを取得（未接続・非対応なら None。非対応は _ssid_ioctl_unsupported に記録）"""
+    buf = array.array("B", bytes(IW_ESSID_MAX_SIZE + 1))
+    addr, _ = buf.buffer_info()
+    req = struct.pack("16sPHH4x", iface.encode()[:15], addr, len(buf), 0)
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            res = fcntl.ioctl(sock.fileno(), SIOCGIWESSID, req)
+    except OSError as e:
+        if e.errno in (errno.EOPNOTSUPP, errno.EINVAL):
+            _ssid_ioctl_unsupported.add(iface)
+        return None
+    length = struct.unpack_from("16sPHH", res)[2]
+    return bytes(buf[:length]).rstrip(b"\0").decode(errors="replace") or None
+
+
+class ProcfsBackend:
+    """/sys/class/net・/proc/net と ioctl でプロセス内から状態を取得"""
+
+    name = "procfs"
+
+    def __init__(self, sys_root: str = "/sys", proc_root: str = "/proc"):
+        self._net_dir = os.path.join(sys_root, "class", "net")
+        self._route_path = os.path.join(proc_root, "net", "route")
+
+    def available(self) -> bool:
+        return os.path.isdir(self._net_dir) and os.access(self._route_path, os.R_OK)
+
+    def _read_attr(self, iface: str, attr: str) -> str:
+        try:
+            with open(os.path.join(self._net_dir, iface, attr)) as f:
+                return f.read().strip()
+        except OSError:
+            return "unknown"
+
+    def interfaces(self) -> Dict[str, InterfaceInfo]:
+        result = {}
+        for iface in sorted(os.listdir(self._net_dir)):
+            result[iface] = InterfaceInfo(
+                name=iface,
+                addresses=_read_ipv4_addresses(iface),
+                operstate=self._read_attr(iface, "operstate"),
+                wireless=os.path.isdir(os.path.join(self._net_dir, iface, "wireless")),
+            )
+        return result
+
+    def routes(self) -> List[Route]:
+        with open(self._route_path) as f:
+            return parse_proc_net_route(f.read())
+
+    def ssid(self, interfaces: Dict[str, InterfaceInfo]) -> Optional[str]:
+        unsupported = False
+        for info in interfaces.values():
+            if not info.wireless:
+                continue
+            if info.name in _ssid_ioctl_unsupported:
+                unsupported = True
+                continue
+            ssid = _read_ssid_ioctl(info.name)
+            if ssid:
+                return ssid
+            unsupported = unsupported or info.name in _ssid_ioctl_unsupported
+        # 無線拡張の ioctl に対応しないドライバ向け（未接続なだけなら iwgetid は呼ばない）
+        return SubprocessBackend().ssid(interfaces) if unsupported else None
+
+
+class SubprocessBackend:
+    """外部コマンド（iwgetid / ip）で状態を取得するフォールバック"""
+
+    name = "subprocess"
+
+    def available(self) -> bool:
+        return True
+
+    def interfaces(self) -> Dict[str, InterfaceInfo]:
+        return {
+            iface: InterfaceInfo(name=iface, addresses=_read_ipv4_addresses(iface))
+            for iface in ni.interfaces()
+        }
+
+    def routes(self) -> List[Route]:
+        try:
+            output = subprocess.check_output(["ip", "-4", "route", "show"], universal_newlines=True,
+                                             timeout=COMMAND_TIMEOUT)
+        except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            logging.error("ルート情報の取得に失敗しました")
+            return []
+        return parse_ip_route(output)
+
+    def ssid(self, interfaces: Dict[str, InterfaceInfo]) -> Optional[str]:
+        try:
+            return subprocess.check_output(["iwgetid", "-r"], universal_newlines=True,
+                                           timeout=COMMAND_TIMEOUT).strip() or None
+        except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            return None
+
+
+def get_backend(name: str = "auto"):
+    """状態取得バックエンドを選択（auto: プロセス内で読めればprocfs）"""
+    if name == "subprocess":
+        return SubprocessBackend()
+    backend = ProcfsBackend()
+    if name == "procfs" or backend.available():
+        return backend
+    logging.info("procfsバックエンドが利用できないためサブプロセスで取得します")
+    return SubprocessBackend()
+
+
+def take_snapshot(backend=None) -> NetworkSnapshot:
+    """インターフェース・ルート・SSIDを1回だけ取得"""
+    backend = backend or get_backend()
+    snapshot = NetworkSnapshot(backend=backend.name)
+    with timed(snapshot.timings, "total"):
+        with timed(snapshot.timings, "interfaces"):
+            snapshot.interfaces = backend.interfaces()
+        with timed(snapshot.timings, "routes"):
+            snapshot.routes = backend.routes()
+        with timed(snapshot.timings, "ssid"):
+            snapshot.ssid = backend.ssid(snapshot.interfaces)
+    logging.info(
+        "ネットワーク状態を取得しました (%s): %s",
+        backend.name,
+        ", ".join(f"{k}={v * 1000:.2f}ms" for k, v in snapshot.timings.items()),
+    )
+    return snapshot
+
+
+# ──────────────────────────────────────────────────
+# ファイアウォール（iptables-restore による差分適用）
+# ──────────────────────────────────────────────────
+@dataclass(frozen=True)
+class FirewallRule:
+    """iptables ルール（iptables-save の -A 行と同じ表記）"""
+    table: str
+    chain: str
+    spec: Tuple[str, ...]  # "-A チェイン" 以降のトークン
+
+    @classmethod
+    def parse(cls, table: str, chain: str, spec: str) -> "FirewallRule":
+        # 引用符の有無（--comment "x" / --comment x）の差を吸収するためトークン化
+        return cls(table, chain, tuple(shlex.split(spec)))
+
+    @property
+    def managed(self) -> bool:
+        """このスクリプトが付けたコメントを持つか"""
+        return RULE_TAG in self.spec and "--comment" in self.spec
+
+    def render(self, action: str) -> str:
+        return " ".join([action, self.chain] + [shlex.quote(t) for t in self.spec])
+
+
+@dataclass
+class FirewallPlan:
+    """適用する差分"""
+    additions: List[FirewallRule] = field(default_factory=list)
+    deletions: List[FirewallRule] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.additions or self.deletions)
+
+    def render(self) -> str:
+        """iptables-restore --noflush に渡すトランザクション"""
+        lines = []
+        tables = sorted({r.table for r in self.additions + self.deletions})
+        for table in tables:
+            lines.append(f"*{table}")
+            lines += [r.render("-D") for r in self.deletions if r.table == table]
+            lines += [r.render("-A") for r in self.additions if r.table == table]
+            lines.append("COMMIT")
+        return "\n".join(lines) + "\n"
+
+
+def parse_iptables_save(text: str) -> List[FirewallRule]:
+    """iptables-save の出力からルールを読み込む"""
+    rules = []
+    table = ""
+    for line in text.splitlines():
+        if line.startswith("*"):
+            table = line[1:].strip()
+        elif line.startswith("-A "):
+            _, chain, spec = (line.split(None, 2) + [""])[:3]
+            rules.append(FirewallRule.parse(table, chain, spec))
+    return rules
+
+
+def desired_nat_rules(config: Optional[NetworkConfig] = None) -> List[FirewallRule]:
+    """設定すべきNATルール"""
+    interface = (config or NetworkConfig()).nat_interface
+    return [
+        FirewallRule.parse(
+            "nat", "POSTROUTING",
+            f"-o {shlex.quote(interface)} -m comment --comment {RULE_TAG} -j MASQUERADE",
+        ),
+    ]
+
+
+# 旧バージョンが -A で追加し続けていたルール。タグがなく手動で追加したルールと区別できないため、
+# --migrate-legacy-nat を指定したときだけ削除する
+LEGACY_NAT_RULES: List[FirewallRule] = [
+    FirewallRule.parse("nat", "POSTROUTING", "-o eth0 -j MASQUERADE"),
+]
+
+
+class FirewallManager:
+    """あるべきルールと現在のルールの差分を1回の iptables-restore で適用"""
+
+    def __init__(self, tables: Iterable[str] = ("nat",),
+                 legacy_rules: Iterable[FirewallRule] = (),
+                 timeout: float = 30.0):
+        self._tables = list(tables)
+        self._legacy = set(legacy_rules)
+        self._timeout = timeout
+
+    def current_rules(self) -> List[FirewallRule]:
+        """iptables-save で現在のルールを取得（管理対象のテーブルが1つなら -t で絞る）"""
+        cmd = [IPTABLES_SAVE]
+        if len(self._tables) == 1:
+            cmd += ["-t", self._tables[0]]
+        output = subprocess.run(
+            cmd, check=True, capture_output=True, text=True, timeout=self._timeout
+        ).stdout
+        return [r for r in parse_iptables_save(output) if r.table in self._tables]
+
+    def plan(self, desired: Iterable[FirewallRule],
+             current: Optional[List[FirewallRule]] = None) -> FirewallPlan:
+        """差分を計算（管理対象外のルールには、legacy_rules に含まれるものを除いて触れない）"""
+        current = self.current_rules() if current is None else current
+        plan = FirewallPlan()
+        wanted = list(dict.fromkeys(desired))  # 順序を保って重複除去
+        seen = set()
+        for rule in current:
+            if rule in wanted and rule not in seen:
+                seen.add(rule)  # あるべきルールは最初の1つだけ残す
+            elif rule.managed or rule in self._legacy or rule in seen:
+                plan.deletions.append(rule)
+        plan.additions = [r for r in wanted if r not in seen]
+        return plan
+
+    def execute(self, plan: FirewallPlan) -> None:
+        """計算済みの差分を iptables-restore --noflush で一括適用"""
+        if plan:
+            subprocess.run(
+                [IPTABLES_RESTORE, "--noflush"], input=plan.render(),
+                check=True, text=True, timeout=self._timeout,
+            )
+
+    def apply(self, desired: Iterable[FirewallRule]) -> FirewallPlan:
+        """差分があれば一括適用"""
+        plan = self.plan(desired)
+        self.execute(plan)
+        return plan
+
+
+# ──────────────────────────────────────────────────
+# ネットワーク状態の監視（イベント駆動）
+# ──────────────────────────────────────────────────
+class NetlinkEventSource:
+    """rtnetlink のマルチキャストでリンク・アドレス・ルートの変更を受信"""
+
+    name = "netlink"
+
+    def __init__(self, groups: int = RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE):
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self._sock.bind((0, groups))
+        self._sock.setblocking(False)
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    def drain(self) -> bool:
+        """溜まったイベントを読み捨てる（内容は見ずに状態を取り直す）"""
+        try:
+            while self._sock.recv(65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class NmcliMonitorSource:
+    """`nmcli monitor` の出力をイベントとして扱う（netlink が使えない環境向け）"""
+
+    name = "nmcli-monitor"
+
+    def __init__(self):
+        self._proc = subprocess.Popen(["nmcli", "monitor"], stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL)
+        os.set_blocking(self._proc.stdout.fileno(), False)
+
+    def fileno(self) -> int:
+        return self._proc.stdout.fileno()
+
+    def drain(self) -> bool:
+        """出力を読み捨てる（nmcli が終了していたら False）"""
+        try:
+            return bool(os.read(self.fileno(), 65536))
+        except BlockingIOError:
+            return True
+
+    def close(self) -> None:
+        self._proc.terminate()
+        try:
+            self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+        self._proc.stdout.close()
+
+
+def open_event_source():
+    """利用可能なイベントソースを開く（どちらも使えなければ None = 定期確認のみ）"""
+    for source_cls in (NetlinkEventSource, NmcliMonitorSource):
+        try:
+            return source_cls()
+        except OSError:
+            continue
+    logging.warning("ネットワークイベントを購読できないため定期確認で待機します")
+    return None
+
+
+class NetworkWatcher:
+    """ネットワーク状態の変化を待ち、条件を満たした時点で待機を終える"""
+
+    def __init__(self, source=None, recheck_interval: float = RECHECK_INTERVAL):
+        self._source = source if source is not None else open_event_source()
+        self._recheck_interval = recheck_interval
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: Optional[float]) -> bool:
+        """predicate() が真になるまで待つ（timeout=None なら無期限）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if predicate():
+                return True
+            wait = self._recheck_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            if self._source is None:
+                time.sleep(wait)
+                continue
+            ready, _, _ = select.select([self._source], [], [], wait)
+            if ready and not self._source.drain():
+                logging.warning("ネットワークイベントの購読が終了しました")
+                self._source.close()
+                self._source = None
+
+    def close(self) -> None:
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    def __enter__(self) -> "NetworkWatcher":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+# ──────────────────────────────────────────────────
+# 接続候補の選択（1回のスキャンで順位付け）
+# ──────────────────────────────────────────────────
+@dataclass
+class WifiNetwork:
+    """スキャンで見つかったアクセスポイント"""
+    ssid: str
+    signal: int
+    freq_mhz: int
+    security: str = ""
+
+    @property
+    def band(self) -> str:
+        if self.freq_mhz >= 5925:
+            return "6GHz"
+        if self.freq_mhz >= 4900:
+            return "5GHz"
+        return "2.4GHz"
+
+
+def _split_terse(line: str) -> List[str]:
+    """nmcli -t の1行を分割（値の中の ":" は "\\:" とエスケープされる）"""
+    fields, current, escaped = [], [], False
+    for ch in line:
+        if escaped:
+            current.append(ch)
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == ":":
+            fields.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    fields.append("".join(current))
+    return fields
+
+
+def parse_nmcli_wifi_list(text: str) -> List[WifiNetwork]:
+    """`nmcli -t -f SSID,SIGNAL,FREQ,SECURITY dev wifi list` の出力をパース"""
+    networks = []
+    for line in text.splitlines():
+        fields = _split_terse(line)
+        if len(fields) < 3 or not fields[0]:
+            continue  # 不正な行・SSID非公開のAP
+        try:
+            signal = int(fields[1])
+            freq = int(fields[2].split()[0])
+        except (ValueError, IndexError):
+            continue
+        networks.append(WifiNetwork(fields[0], signal, freq, fields[3] if len(fields) > 3 else ""))
+    return networks
+
+
+class ConnectionHistory:
+    """SSIDごとの接続成功・失敗回数（JSONファイルに保存）"""
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self._path = path
+        text = read_state_file(path)
+        try:
+            data = json.loads(text) if text is not None else {}
+        except ValueError:
+            data = {}
+        self._data: Dict[str, Dict[str, int]] = data if isinstance(data, dict) else {}
+
+    def success_rate(self, ssid: str) -> float:
+        """成功率（履歴がなければ0.5）"""
+        entry = self._data.get(ssid, {})
+        ok, ng = entry.get("success", 0), entry.get("failure", 0)
+        return (ok + 1) / (ok + ng + 2)
+
+    def record(self, ssid: str, success: bool) -> None:
+        entry = self._data.setdefault(ssid, {"success": 0, "failure": 0})
+        entry["success" if success else "failure"] += 1
+        try:
+            write_state_file(self._path, json.dumps(self._data))
+        except OSError:
+            logging.warning("接続履歴の保存に失敗しました")
+
+
+def scan_networks(cache_path: str = SCAN_CACHE_PATH, ttl: float = SCAN_CACHE_TTL) -> List[WifiNetwork]:
+    """Wi-Fiをスキャン（TTL以内のキャッシュがあれば再スキャンしない）"""
+    text = read_state_file(cache_path)
+    try:
+        cached = json.loads(text) if text is not None else None
+        if cached is not None and time.time() - cached["time"] < ttl:
+            return parse_nmcli_wifi_list(cached["output"])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    try:
+        output = subprocess.run(
+            ["nmcli", "-t", "-f", "SSID,SIGNAL,FREQ,SECURITY", "dev", "wifi", "list"],
+            check=True, capture_output=True, text=True, timeout=CONNECT_TIMEOUT,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        logging.error("Wi-Fiのスキャンに失敗しました")
+        return []
+    try:
+        write_state_file(cache_path, json.dumps({"time": time.time(), "output": output}))
+    except OSError:
+        logging.warning("スキャン結果のキャッシュ保存に失敗しました")
+    return parse_nmcli_wifi_list(output)
+
+
+def rank_candidates(networks: List[WifiNetwork], history: ConnectionHistory,
+                    allowed: Optional[List[str]] = None) -> List[Tuple[float, WifiNetwork]]:
+    """安全なネットワークを評価値の高い順に並べる（同一SSIDは最も良いAPで評価）"""
+    allowed = list(SAFE_NETWORKS if allowed is None else allowed)
+    best: Dict[str, Tuple[float, WifiNetwork]] = {}
+    for network in networks:
+        if network.ssid not in allowed:
+            continue
+        score = (network.signal + BAND_BONUS.get(network.band, 0.0)
+                 + HISTORY_WEIGHT * history.success_rate(network.ssid))
+        if network.ssid not in best or score > best[network.ssid][0]:
+            best[network.ssid] = (score, network)
+    # 同点なら SAFE_NETWORKS の並び順を優先
+    return sorted(best.values(), key=lambda item: (-item[0], allowed.index(item[1].ssid)))
+
+
+def select_candidates(history: ConnectionHistory,
+                      allowed: Optional[List[str]] = None) -> List[WifiNetwork]:
+    """スキャンして接続候補を決定し、判断にかかった時間を記録"""
+    timings: Dict[str, float] = {}
+    with timed(timings, "select"):
+        with timed(timings, "scan"):
+            networks = scan_networks()
+        ranked = rank_candidates(networks, history, allowed)
+    logging.info(
+        "接続候補: %s（スキャン %.1fms, 選択 %.1fms）",
+        ", ".join(f"{n.ssid}({score:.0f}, {n.signal}%, {n.band})" for score, n in ranked) or "なし",
+        timings["scan"] * 1000, timings["select"] * 1000,
+    )
+    return [network for _, network in ranked]
+
+
+# ──────────────────────────────────────────────────
+# 外部コマンドの並行実行（依存関係・タイムアウト付き）
+# ──────────────────────────────────────────────────
+@dataclass
+class CommandStep:
+    """実行する外部コマンド"""
+    name: str
+    argv: List[str]
+    timeout: float = COMMAND_TIMEOUT
+    depends_on: Tuple[str, ...] = ()
+    requires_success: bool = True  # False なら依存先が失敗しても順序だけ守って実行
+    input: Optional[str] = None
+
+
+@dataclass
+class StepResult:
+    """コマンドの実行結果"""
+    name: str
+    returncode: Optional[int] = None  # タイムアウト・起動失敗・スキップ時は None
+    elapsed: float = 0.0
+    started: float = 0.0  # time.monotonic() 基準
+    stdout: str = ""
+    stderr: str = ""
+    timed_out: bool = False
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+class CommandExecutor:
+    """依存関係のないコマンドを並行に、依存するものは順番に実行"""
+
+    def run(self, steps: List[CommandStep]) -> Dict[str, StepResult]:
+        self._validate(steps)
+        return asyncio.run(self._run_all(steps))
+
+    @staticmethod
+    def _validate(steps: List[CommandStep]) -> None:
+        """未定義の依存先・循環依存を検出"""
+        by_name = {step.name: step for step in steps}
+        if len(by_name) != len(steps):
+            raise ValueError("ステップ名が重複しています")
+        for step in steps:
+            unknown = set(step.depends_on) - set(by_name)
+            if unknown:
+                raise ValueError(f"{step.name}: 未定義の依存先 {sorted(unknown)}")
+
+        done: set = set()
+        visiting: set = set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"循環依存があります: {name}")
+            visiting.add(name)
+            for dep in by_name[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for step in steps:
+            visit(step.name)
+
+    async def _run_all(self, steps: List[CommandStep]) -> Dict[str, StepResult]:
+        loop = asyncio.get_running_loop()
+        futures: Dict[str, "asyncio.Future[StepResult]"] = {
+            step.name: loop.create_future() for step in steps
+        }
+
+        async def run_after_deps(step: CommandStep) -> None:
+            deps = [await futures[name] for name in step.depends_on]
+            failed = [d.name for d in deps if not d.ok]
+            if failed and step.requires_success:
+                logging.warning(f"{step.name}: 依存先 {', '.join(failed)} が失敗したためスキップします")
+                result = StepResult(step.name, skipped=True)
+            else:
+                result = await self._run_step(step)
+            futures[step.name].set_result(result)
+
+        await asyncio.gather(*(run_after_deps(step) for step in steps))
+        return {name: future.result() for name, future in futures.items()}
+
+    async def _run_step(self, step: CommandStep) -> StepResult:
+        result = StepResult(step.name, started=time.monotonic())
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *step.argv,
+                stdin=subprocess.PIPE if step.input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    proc.communicate(step.input.encode() if step.input is not None else None),
+                    timeout=step.timeout,
+                )
+                result.returncode = proc.returncode
+                result.stdout = stdout.decode(errors="replace")
+                result.stderr = stderr.decode(errors="replace")
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                result.timed_out = True
+        except OSError as e:
+            result.stderr = str(e)
+        result.elapsed = time.monotonic() - result.started
+
+        if result.timed_out:
+            logging.error(f"{step.name}: {step.timeout}秒でタイムアウトしました")
+        elif result.ok:
+            logging.info(f"{step.name}: 終了コード 0（{result.elapsed * 1000:.1f}ms）")
+        else:
+            logging.error(f"{step.name}: 終了コード {result.returncode}（{result.elapsed * 1000:.1f}ms） {result.stderr.strip()}")
+        return result
+
+
+# ──────────────────────────────────────────────────
+# ネットワーク設定
+# ──────────────────────────────────────────────────
+def get_known_networks(snapshot: Optional[NetworkSnapshot] = None) -> List[str]:
     """既知のネットワーク一覧を取得"""
-    return [ni.ifaddresses(iface)[ni.AF_INET][0]['addr'] 
-            for iface in ni.interfaces() 
-            if ni.AF_INET in ni.ifaddresses(iface)]
+    return (snapshot or take_snapshot()).addresses
 
-def get_current_network() -> Optional[str]:
+def _ssid_reader(backend=None) -> Callable[[], Optional[str]]:
+    """現在のSSIDを返す関数（待機中に繰り返し呼ぶため、バックエンドとインターフェース一覧は1回だけ取得する）"""
+    backend = backend or get_backend()
+    interfaces = backend.interfaces()
+    return lambda: backend.ssid(interfaces)
+
+def get_current_network(backend=None) -> Optional[str]:
     """現在接続されているネットワーク名を取得"""
-    try:
-        return subprocess.check_output(["iwgetid", "-r"], universal_newlines=True).strip()
-    except subprocess.CalledProcessError:
+    ssid = _ssid_reader(backend)()
+    if ssid is None:
         logging.error("現在のネットワーク取得に失敗しました")
-        return None
+    return ssid
 
-def connect_to_safe_network(known_networks: List[str]) -> None:
-    """安全なネットワークに接続"""
-    for network in SAFE_NETWORKS:
-        if network in known_networks:
+def connect_to_safe_network(candidates: Optional[List[WifiNetwork]] = None,
+                            watcher: Optional[NetworkWatcher] = None,
+                            history: Optional[ConnectionHistory] = None,
+                            config: Optional[NetworkConfig] = None,
+                            backend=None) -> bool:
+    """安全なネットワークに評価順で接続（接続を確認でき次第、次の処理へ進む）"""
+    history = history or ConnectionHistory()
+    current_ssid = _ssid_reader(backend)
+    if candidates is None:
+        candidates = select_candidates(history, list((config or NetworkConfig()).safe_networks))
+    own_watcher = watcher is None
+    watcher = watcher or NetworkWatcher()
+    start = time.monotonic()
+    try:
+        for candidate in candidates:
+            network = candidate.ssid
             try:
-                subprocess.run(["nmcli", "dev", "wifi", "connect", network], check=True)
-                time.sleep(5)
-                if network == get_current_network():
-                    logging.info(f"{network}に接続しました")
-                    return
-            except subprocess.CalledProcessError:
+                subprocess.run(["nmcli", "dev", "wifi", "connect", network], check=True,
+                               timeout=COMMAND_TIMEOUT)
+                if watcher.wait_for(lambda: current_ssid() == network, CONNECT_TIMEOUT):
+                    history.record(network, True)
+                    logging.info(f"{network}に接続しました（{time.monotonic() - start:.2f}秒）")
+                    return True
+                logging.error(f"{network}への接続を{CONNECT_TIMEOUT}秒以内に確認できませんでした")
+            except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
                 logging.error(f"{network}への接続に失敗しました")
-    logging.warning("安全なネットワークへの接続に失敗しました")
+            history.record(network, False)
+        logging.warning("安全なネットワークへの接続に失敗しました")
+        return False
+    finally:
+        if own_watcher:
+            watcher.close()
 
-def setup_nat() -> None:
-    """NATを設定"""
-    try:
-        subprocess.run(["iptables", "-t", "nat", "-A", "POSTROUTING", "-o", "eth0", "-j", "MASQUERADE"], check=True)
-        logging.info("NATの設定が完了しました")
-    except subprocess.CalledProcessError:
-        logging.error("NATの設定に失敗しました")
+def watch_networks(watcher: Optional[NetworkWatcher] = None,
+                   config: Optional[NetworkConfig] = None,
+                   backend=None) -> None:
+    """安全なネットワークから外れたらイベントを契機にフェイルオーバーする（監視モード）"""
+    config = config or NetworkConfig()
+    safe_networks = config.safe_networks
+    backend = backend or get_backend()
+    watcher = watcher or NetworkWatcher()
+    with watcher:
+        while True:
+            # インターフェースの増減に追従するため、待機のたびに一覧を取り直す
+            current_ssid = _ssid_reader(backend)
+            watcher.wait_for(lambda: current_ssid() not in safe_networks, timeout=None)
+            lost_at = time.monotonic()
+            logging.warning("安全なネットワークに接続されていません。フェイルオーバーを開始します")
+            if connect_to_safe_network(watcher=watcher, config=config, backend=backend):
+                logging.info(f"フェイルオーバー所要時間: {time.monotonic() - lost_at:.2f}秒")
+            else:
+                # 失敗時は再試行まで待つ（その間に安全なネットワークへ戻れば即再開）
+                current_ssid = _ssid_reader(backend)
+                watcher.wait_for(lambda: current_ssid() in safe_networks,
+                                 FAILOVER_RETRY_INTERVAL)
+
+def routing_command(config: Optional[NetworkConfig] = None) -> List[str]:
+    # route add は既存のデフォルトルートがあると失敗するか2本目を追加するため、置き換える
+    return ["ip", "route", "replace", "default", "via", (config or NetworkConfig()).gateway_ip]
+
+def priority_command(config: Optional[NetworkConfig] = None) -> List[str]:
+    config = config or NetworkConfig()
+    return ["nmcli", "connection", "modify", config.priority_connection,
+            "connection.priority", str(config.priority)]
+
+def export_command(current_network: str, config: Optional[NetworkConfig] = None) -> List[str]:
+    return ["nmcli", "connection", "export", current_network,
+            (config or NetworkConfig()).profile_export_path]
+
+
+# ──────────────────────────────────────────────────
+# 変更計画（plan: 副作用なしで差分を計算 / apply: 差分だけを実行）
+# ──────────────────────────────────────────────────
+@dataclass
+class SystemState:
+    """計画の入力になる現在の状態（1回だけ取得して使い回す）"""
+    snapshot: NetworkSnapshot
+    nat_rules: Optional[List[FirewallRule]] = None  # 取得できなければ None
+    priorities: Optional[Dict[str, int]] = None     # 接続名 → 自動接続の優先度
+    exported_ssid: Optional[str] = None             # 前回プロファイルを保存したSSID
+    timings: Dict[str, float] = field(default_factory=dict)
 
-def setup_routing() -> None:
-    """最適なルーティングを設定"""
+
+def parse_nmcli_priorities(text: str) -> Dict[str, int]:
+    """`nmcli -t -f NAME,AUTOCONNECT-PRIORITY connection show` の出力をパース"""
+    priorities = {}
+    for line in text.splitlines():
+        cols = _split_terse(line)
+        if len(cols) >= 2:
+            try:
+                priorities[cols[0]] = int(cols[1])
+            except ValueError:
+                continue
+    return priorities
+
+
+def read_exported_ssid(config: NetworkConfig) -> Optional[str]:
+    """最後にプロファイルを保存したSSID（保存先が設定と異なれば None）"""
+    text = read_state_file(EXPORT_MARKER_PATH)
     try:
-        subprocess.run(["route", "add", "default", "gw", GATEWAY_IP], check=True)
-        logging.info("ルーティングの設定が完了しました")
-    except subprocess.CalledProcessError:
-        logging.error("ルーティングの設定に失敗しました")
+        marker = json.loads(text) if text is not None else None
+    except ValueError:
+        return None
+    if not isinstance(marker, dict) or marker.get("path") != config.profile_export_path:
+        return None
+    return marker.get("ssid") or None
+
+
+def record_exported_ssid(ssid: str, config: NetworkConfig) -> None:
+    """プロファイルを保存したSSIDを記録（失敗時は OSError）"""
+    write_state_file(EXPORT_MARKER_PATH, json.dumps(
+        {"ssid": ssid, "path": config.profile_export_path}, ensure_ascii=False))
+
+
+def capture_state(config: NetworkConfig, backend=None,
+                  firewall: Optional[FirewallManager] = None) -> SystemState:
+    """スナップショット・NATルール・接続の優先度をまとめて取得（読み取りのみ）"""
+    state = SystemState(snapshot=take_snapshot(backend))
+    with timed(state.timings, "firewall"):
+        try:
+            state.nat_rules = (firewall or FirewallManager()).current_rules()
+        except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            logging.error("現在のNATルールを取得できませんでした")
+    with timed(state.timings, "priorities"):
+        try:
+            output = subprocess.run(
+                ["nmcli", "-t", "-f", "NAME,AUTOCONNECT-PRIORITY", "connection", "show"],
+                check=True, capture_output=True, text=True, timeout=COMMAND_TIMEOUT,
+            ).stdout
+            state.priorities = parse_nmcli_priorities(output)
+        except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            logging.warning("接続の優先度を取得できませんでした")
+    state.exported_ssid = read_exported_ssid(config)
+    return state
+
+
+@dataclass
+class Change:
+    """計画された変更1件"""
+    name: str
+    summary: str
+    step: Optional[CommandStep] = None  # None の場合は外部コマンド以外で適用（Wi-Fi接続）
+
+
+@dataclass
+class Plan:
+    """現在の状態と設定の差分"""
+    ssid: Optional[str]
+    changes: List[Change] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def __bool__(self) -> bool:
+        return bool(self.changes)
+
+    def change(self, name: str) -> Optional[Change]:
+        return next((c for c in self.changes if c.name == name), None)
+
+    def steps(self) -> List[CommandStep]:
+        return [c.step for c in self.changes if c.step is not None]
+
+    def render(self) -> str:
+        """人が読むための計画（--plan の出力）"""
+        lines = [f"計画（{self.elapsed * 1000:.2f}ms）:"]
+        if not self.changes:
+            lines.append("  変更はありません")
+        for change in self.changes:
+            lines.append(f"  ~ {change.name}: {change.summary}")
+            if change.step is not None:
+                lines.append(f"      $ {shlex.join(change.step.argv)}")
+                if change.step.input:
+                    lines += [f"      | {l}" for l in change.step.input.splitlines()]
+        lines += [f"  ! {w}" for w in self.warnings]
+        return "\n".join(lines) + "\n"
+
+
+def plan_changes(config: NetworkConfig, state: SystemState,
+                 legacy_rules: Iterable[FirewallRule] = ()) -> Plan:
+    """設定と現在の状態から必要な変更だけを計算（外部コマンドは実行しない）"""
+    start = time.perf_counter()
+    snapshot = state.snapshot
+    plan = Plan(ssid=snapshot.ssid)
 
-def set_connection_priority() -> None:
-    """接続順序を変更"""
+    if snapshot.ssid not in config.safe_networks:
+        plan.changes.append(Change(
+            "wifi", f"安全なネットワークに接続（現在: {snapshot.ssid or '未接続'}）"))
+
+    if state.nat_rules is None:
+        plan.warnings.append("現在のNATルールが不明なため、NATは計画に含めていません")
+    else:
+        nat = FirewallManager(legacy_rules=legacy_rules).plan(
+            desired_nat_rules(config), current=state.nat_rules)
+        if nat:
+            plan.changes.append(Change(
+                "nat", f"NATルールを更新（追加 {len(nat.additions)} 件, 削除 {len(nat.deletions)} 件）",
+                CommandStep("nat", [IPTABLES_RESTORE, "--noflush"], input=nat.render()),
+            ))
+
+    default = snapshot.default_route
+    if default is None or default.gateway != config.gateway_ip:
+        current = default.gateway if default else "なし"
+        plan.changes.append(Change(
+            "routing", f"デフォルトゲートウェイを {current} から {config.gateway_ip} に変更",
+            CommandStep("routing", routing_command(config)),
+        ))
+
+    current_priority = (state.priorities or {}).get(config.priority_connection)
+    if state.priorities is None or current_priority != config.priority:
+        plan.changes.append(Change(
+            "priority",
+            f"{config.priority_connection} の優先度を {config.priority} に設定"
+            f"（現在: {'不明' if current_priority is None else current_priority}）",
+            CommandStep("priority", priority_command(config)),
+        ))
+
+    if snapshot.ssid and snapshot.ssid != state.exported_ssid:
+        # 優先順位の変更後に保存する（優先順位の設定に失敗しても保存は行う）
+        depends_on = ("priority",) if plan.change("priority") else ()
+        plan.changes.append(Change(
+            "profile", f"{snapshot.ssid} のプロファイルを {config.profile_export_path} に保存",
+            CommandStep("profile", export_command(snapshot.ssid, config),
+                        depends_on=depends_on, requires_success=False),
+        ))
+
+    plan.elapsed = time.perf_counter() - start
+    logging.info(f"計画を作成しました: {', '.join(c.name for c in plan.changes) or '変更なし'}"
+                 f"（{plan.elapsed * 1000:.2f}ms）")
+    return plan
+
+
+def apply_plan(plan: Plan, config: NetworkConfig, backend=None,
+               firewall: Optional[FirewallManager] = None,
+               executor: Optional[CommandExecutor] = None,
+               legacy_rules: Iterable[FirewallRule] = ()) -> Dict[str, StepResult]:
+    """計画された差分だけを適用（Wi-Fiに接続し直した場合は状態を取り直して計画し直す）
+
+    Wi-Fiへの接続も "wifi" の結果として返す。
+    """
+    wifi: Optional[StepResult] = None
+    if plan.change("wifi"):
+        start = time.perf_counter()
+        connected = connect_to_safe_network(config=config, backend=backend)
+        wifi = StepResult("wifi", returncode=0 if connected else 1,
+                          elapsed=time.perf_counter() - start)
+        if connected:
+            plan = plan_changes(config, capture_state(config, backend, firewall), legacy_rules)
+
+    if plan.change("profile"):
+        # nmcli connection export は保存先のディレクトリを作らない（既定は STATE_DIR の中）
+        try:
+            _ensure_private_dir(os.path.dirname(os.path.abspath(config.profile_export_path)))
+        except OSError as e:
+            logging.warning(f"プロファイルの保存先を準備できませんでした: {e}")
+    results = (executor or CommandExecutor()).run(plan.steps())
+    if wifi is not None:
+        results = {"wifi": wifi, **results}
+    profile = results.get("profile")
+    if profile is not None and profile.ok and plan.ssid:
+        try:
+            record_exported_ssid(plan.ssid, config)
+        except OSError:
+            logging.warning("プロファイル保存の記録に失敗しました")
+    return results
+
+
+# ──────────────────────────────────────────────────
+# デーモンモード（差分だけを適用する調整ループ）
+# ──────────────────────────────────────────────────
+class Reconciler:
+    """毎サイクル状態を取得して計画し、ずれた項目だけを apply_plan で設定し直す"""
+
+    # 状態ファイルに記録する項目（計画に含まれなければ "noop"）
+    STEPS = ("wifi", "nat", "routing", "priority", "profile")
+
+    def __init__(self, backend=None, firewall: Optional[FirewallManager] = None,
+                 config: Optional[NetworkConfig] = None,
+                 executor: Optional[CommandExecutor] = None,
+                 legacy_rules: Iterable[FirewallRule] = ()):
+        self._config = config or NetworkConfig()
+        self._backend = backend or get_backend()
+        self._firewall = firewall or FirewallManager(legacy_rules=legacy_rules)
+        self._executor = executor or CommandExecutor()
+        self._legacy_rules = list(legacy_rules)
+        self.cycles = 0
+
+    @staticmethod
+    def _action(result: StepResult) -> str:
+        if result.ok:
+            return "applied"
+        if result.timed_out:
+            return "timeout"
+        return "skipped" if result.skipped else "failed"
+
+    def run_once(self) -> Dict[str, Any]:
+        """1サイクル分の確認と設定を行い、結果（手順ごとの動作と所要時間）を返す"""
+        self.cycles += 1
+        config = self._config
+        start = time.perf_counter()
+        state = capture_state(config, self._backend, self._firewall)
+        steps: Dict[str, Dict[str, Any]] = {
+            "snapshot": {"action": "read", "duration_ms": round((time.perf_counter() - start) * 1000, 2)},
+        }
+        plan = plan_changes(config, state, self._legacy_rules)
+        results: Dict[str, StepResult] = {}
+        if plan:
+            try:
+                results = apply_plan(plan, config, self._backend, self._firewall,
+                                     self._executor, self._legacy_rules)
+            except Exception:
+                logging.exception("差分の適用中にエラーが発生しました")
+                results = {c.name: StepResult(c.name) for c in plan.changes}
+        for name in self.STEPS:
+            result = results.get(name)
+            steps[name] = {
+                "action": "noop" if result is None else self._action(result),
+                "duration_ms": round(result.elapsed * 1000, 2) if result is not None else 0.0,
+            }
+
+        snapshot = state.snapshot
+        if "wifi" in results and results["wifi"].ok:
+            snapshot = take_snapshot(self._backend)  # 接続し直したので取り直す
+        default = snapshot.default_route
+        status = {
+            "cycle": self.cycles,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "ssid": snapshot.ssid,
+            "default_gateway": default.gateway if default else None,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "steps": steps,
+        }
+        logging.info(
+            "調整サイクル %d: %s（合計 %.1fms）", self.cycles,
+            ", ".join(f"{k}={v['action']}/{v['duration_ms']}ms" for k, v in steps.items()),
+            status["duration_ms"],
+        )
+        return status
+
+
+def write_status(path: str, status: Dict[str, Any]) -> None:
+    """状態ファイルを書き換え（読み手が途中の内容を見ないよう置き換えで更新）"""
     try:
-        subprocess.run(["nmcli", "connection", "modify", "SSID1", "connection.priority", "1"], check=True)
-        logging.info("接続優先順位の設定が完了しました")
-    except subprocess.CalledProcessError:
-        logging.error("接続優先順位の設定に失敗しました")
+        write_state_file(path, json.dumps(status, ensure_ascii=False, indent=2))
+    except OSError:
+        logging.warning(f"状態ファイル {path} の書き込みに失敗しました")
+
 
-def export_current_profile(current_network: str) -> None:
-    """現在接続しているプロファイルを保存"""
+def run_daemon(reconciler: Reconciler, interval: float = DAEMON_INTERVAL,
+               jitter: float = DAEMON_JITTER, status_path: str = STATUS_PATH,
+               stop: Optional[threading.Event] = None, max_cycles: Optional[int] = None) -> None:
+    """一定間隔（±jitter の揺らぎ付き）で調整を繰り返す。SIGTERM/SIGINT で終了"""
+    stop = stop or threading.Event()
+    previous_handlers = {}
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous_handlers[signum] = signal.signal(signum, lambda *_: stop.set())
+
+    logging.info(f"デーモンモードを開始します（間隔 {interval}秒 ±{jitter * 100:.0f}%）")
     try:
-        subprocess.run(["nmcli", "connection", "export", current_network, "/tmp/current_network.xml"], check=True)
-        logging.info("現在のネットワークプロファイルをエクスポートしました")
-    except subprocess.CalledProcessError:
-        logging.error("ネットワークプロファイルのエクスポートに失敗しました")
+        while not stop.is_set():
+            status = reconciler.run_once()
+            delay = interval * (1 + random.uniform(-jitter, jitter))
+            status["next_run_in_s"] = round(delay, 1)
+            write_status(status_path, status)
+            if max_cycles is not None and reconciler.cycles >= max_cycles:
+                break
+            stop.wait(delay)
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+    logging.info("デーモンモードを終了します")
+
+def compare_backends() -> None:
+    """procfs とサブプロセスでスナップショット取得時間を比較して表示"""
+    for backend in (ProcfsBackend(), SubprocessBackend()):
+        if not backend.available():
+            print(f"{backend.name}: 利用不可")
+            continue
+        snapshot = take_snapshot(backend)
+        detail = ", ".join(f"{k}={v * 1000:.2f}ms" for k, v in snapshot.timings.items())
+        print(f"{backend.name}: {detail}")
+
+# lib/script_profiling.py（cProfile・tracemalloc は --profile / --trace-memory 指定時だけ読み込む）
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from script_profiling import maybe_load as _load_profiling, phase as _phase, session as _profiling_session  # noqa: E402
 
-def main() -> None:
-    known_networks = get_known_networks()
-    current_network = get_current_network()
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="安全なネットワークへの接続とNAT/ルーティング設定",
+                                     epilog="プロファイリング: --profile / --trace-memory / --profile-output FILE")
+    parser.add_argument("--config", default=None,
+                        help=f"設定ファイル（JSON） (default: {CONFIG_PATH}、なければ既定値)")
+    parser.add_argument("--backend", choices=["auto", "procfs", "subprocess"], default="auto",
+                        help="ネットワーク状態の取得方法 (default: auto)")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="状態取得バックエンドごとの所要時間を表示して終了")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--plan", action="store_true",
+                      help="現在の状態との差分（実行予定の変更）を表示するだけで何も変更しない")
+    mode.add_argument("--watch", action="store_true",
+                      help="初回設定後もネットワーク変更イベントを監視してフェイルオーバーする")
+    mode.add_argument("--daemon", action="store_true",
+                      help="常駐し、一定間隔で状態を確認してずれた項目だけを設定し直す")
+    parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL,
+                        help=f"デーモンモードの確認間隔（秒） (default: {DAEMON_INTERVAL})")
+    parser.add_argument("--jitter", type=float, default=DAEMON_JITTER,
+                        help=f"確認間隔の揺らぎ（割合） (default: {DAEMON_JITTER})")
+    parser.add_argument("--status-file", default=STATUS_PATH,
+                        help=f"デーモンモードの状態ファイル (default: {STATUS_PATH})")
+    parser.add_argument("--migrate-legacy-nat", action="store_true",
+                        help="旧バージョンが追加したタグなしのNATルール（-o eth0 -j MASQUERADE）を削除する")
+    profiling = _load_profiling(argv)
+    if profiling is not None:
+        profiling.add_arguments(parser)
+    return parser.parse_args(argv)
 
-    if current_network not in SAFE_NETWORKS:
-        connect_to_safe_network(known_networks)
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    command = " ".join(["network,build.py", *(sys.argv[1:] if argv is None else argv)])
+    with _profiling_session(args, command):
+        run(args)
 
-    setup_nat()
-    setup_routing()
-    set_connection_priority()
+def run(args: argparse.Namespace) -> None:
+    if args.compare_backends:
+        with _phase("compare_backends"):
+            compare_backends()
+        return
+    try:
+        with _phase("load_config"):
+            config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        logging.error(f"設定ファイルの読み込みに失敗しました: {e}")
+        raise SystemExit(f"設定ファイルの読み込みに失敗しました: {e}")
+    backend = get_backend(args.backend)
+    legacy_rules = LEGACY_NAT_RULES if args.migrate_legacy_nat else []
+    firewall = FirewallManager(legacy_rules=legacy_rules)
+    if args.daemon:
+        with _phase("daemon"):
+            run_daemon(Reconciler(backend, firewall, config, legacy_rules=legacy_rules),
+                       args.interval, args.jitter, args.status_file)
+        return
+
+    with _phase("capture_state"):
+        state = capture_state(config, backend, firewall)
+    with _phase("plan"):
+        plan = plan_changes(config, state, legacy_rules)
+    if args.plan:
+        print(plan.render(), end="")
+        return
 
-    if current_network:
-        export_current_profile(current_network)
+    with _phase("apply"):
+        results = apply_plan(plan, config, backend, firewall, legacy_rules=legacy_rules)
+    failed = [r.name for r in results.values() if not r.ok]
+    if failed:
+        logging.warning(f"失敗した処理があります: {', '.join(failed)}")
 
     logging.info("全ての処理が完了しました")
 
+    if args.watch:
+        with _phase("watch"):
+            watch_networks(config=config, backend=backend)
+
 if __name__ == "__main__":
     main()
@@ -7,6 +7,10 @@ APIを使用してSaaSアカウントを一括作成し、結果をCSVに保存
 Usage:
     python saas_account_creator.py --count 10 --output accounts.csv
     python saas_account_creator.py --input users.csv
+    python saas_account_creator.py --tenant acme:3=acme.csv --tenant small=small.csv
+    python saas_account_creator.py generate --count 1000000 --profile production --seed 1 -o load.csv
+    python saas_account_creator.py reconcile --input users.csv --results saas_accounts.csv -o retry.csv
+    python saas_account_creator.py --profile --trace-memory generate --count 1000000 -o load.csv
 """
 
 from __future__ import annotations
@@ -14,20 +18,22 @@ from __future__ import annotations
 import argparse
 import csv
 import hashlib
+import json
 import logging
 import os
+import queue
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, asdict, replace
 from datetime import datetime
 from enum import Enum
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Any, Iterator
-
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from typing import Any, Callable, Iterable, Iterator
 
 # =============================================================================
 # Configuration
@@ -39,9 +45,27 @@ class ApiConfig:
     """API設定"""
 
     base_url: str
-    timeout: int = 30
+    timeout: float = 30  # 読み取りタイムアウト（秒）
+    connect_timeout: float = 5.0
+    deadline: float | None = None  # 1アカウントあたりの上限（リトライ・待機を含む秒数）
     max_retries: int = 3
     backoff_factor: float = 0.5
+    transport: str = "requests"
+    # サーキットブレーカー: 直近 breaker_window 件の失敗率が breaker_failure_ratio 以上で遮断
+    breaker_failure_ratio: float = 0.5
+    breaker_window: int = 20
+    breaker_min_calls: int = 10
+    breaker_open_seconds: float = 30.0
+    breaker_mode: str = "fail-fast"  # fail-fast: 送信せずスキップ / pause: 再開まで待つ
+    # リトライは全リクエスト数の retry_budget_ratio 倍（+ 最低 retry_budget_min 回）まで
+    retry_budget_ratio: float = 0.1
+    retry_budget_min: int = 10
+    # 既存アカウントの照会URL（例: https://api.example.com/accounts/{username}）
+    # 作成要求がタイムアウトしたとき、再送の前に作成済みかを確認する
+    lookup_url: str | None = None
+    # 照会（冪等なGET）だけをヘッジする。直近の照会のp95を過ぎたら2本目を送る
+    hedge: bool = False
+    hedge_delay: float = 1.0  # 照会の実績が少ないうちに使う待ち時間
 
     @classmethod
     def from_env(cls) -> ApiConfig:
@@ -52,8 +76,12 @@ class ApiConfig:
 
         return cls(
             base_url=base_url,
-            timeout=int(os.getenv("SAAS_API_TIMEOUT", "30")),
+            timeout=float(os.getenv("SAAS_API_TIMEOUT", "30")),
+            connect_timeout=float(os.getenv("SAAS_API_CONNECT_TIMEOUT", "5")),
+            deadline=float(os.environ["SAAS_API_DEADLINE"]) if os.getenv("SAAS_API_DEADLINE") else None,
             max_retries=int(os.getenv("SAAS_API_MAX_RETRIES", "3")),
+            transport=os.getenv("SAAS_API_TRANSPORT", "requests"),
+            lookup_url=os.getenv("SAAS_API_LOOKUP_URL") or None,
         )
 
 
@@ -141,6 +169,375 @@ class Sha256Hasher(PasswordHasher):
         return hashlib.sha256(password.encode()).hexdigest()
 
 
+# =============================================================================
+# Transport
+# =============================================================================
+
+class TransportError(Exception):
+    """レスポンスを受け取れなかったエラー（接続失敗・タイムアウト・リトライ上限など）
+
+    ambiguous: 要求がサーバーに届いた可能性がある（送信後の読み取りタイムアウトなど）
+    """
+
+    def __init__(self, message: str, ambiguous: bool = False) -> None:
+        super().__init__(message)
+        self.ambiguous = ambiguous
+
+
+@dataclass(frozen=True)
+class HttpResponse:
+    """トランスポート共通のレスポンス"""
+
+    status: int
+    reason: str
+    body: bytes
+    url: str
+    retry_after: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        """requests の Response.ok と同じ判定"""
+        return not 400 <= self.status < 600
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def error_text(self) -> str:
+        """requests の raise_for_status と同じ形式のエラーメッセージ"""
+        kind = "Client" if self.status < 500 else "Server"
+        return f"{self.status} {kind} Error: {self.reason} for url: {self.url}"
+
+
+class PayloadTemplate:
+    """キーが固定のJSONオブジェクトを、値の差し込みだけでバイト列にする
+
+    出力は json.dumps(dict) と同じバイト列になる。
+    """
+
+    def __init__(self, *keys: str) -> None:
+        self._format = "{" + ", ".join(f"{json.dumps(k)}: %s" for k in keys) + "}"
+
+    def encode(self, *values: str) -> bytes:
+        quote = json.encoder.encode_basestring_ascii
+        return (self._format % tuple(map(quote, values))).encode("ascii")
+
+
+class Transport(ABC):
+    """base_url のAPIに1回だけ要求を送るトランスポート（リトライは SaasApiClient が行う）
+
+    timeout は読み取りタイムアウトの上書き（接続タイムアウトは ApiConfig.connect_timeout）。
+    スレッドセーフではない。
+    """
+
+    @abstractmethod
+    def post_json(self, body: bytes, timeout: float | None = None) -> HttpResponse:
+        """エンコード済みのJSONを base_url にPOST（レスポンスを受け取れなければ TransportError）"""
+
+    @abstractmethod
+    def get(self, url: str, timeout: float | None = None) -> HttpResponse:
+        """GET（レスポンスを受け取れなければ TransportError）"""
+
+    def close(self) -> None:
+        """接続を閉じる"""
+
+
+class RequestsTransport(Transport):
+    """requests.Session で送信"""
+
+    def __init__(self, config: ApiConfig) -> None:
+        # requests / urllib3 は読み込みが重いため、トランスポートの作成時まで遅延させる
+        # （--help・--dry-run・小さなバッチの起動時間を短くするため）
+        import requests
+
+        self._requests = requests
+        self._config = config
+        self._session = requests.Session()
+        self._headers = {"Content-Type": "application/json"}
+
+    def _send(self, method: str, url: str, timeout: float | None, **kwargs: Any) -> HttpResponse:
+        exceptions = self._requests.exceptions
+        try:
+            response = self._session.request(
+                method,
+                url,
+                timeout=(self._config.connect_timeout, timeout or self._config.timeout),
+                **kwargs,
+            )
+        except exceptions.ConnectTimeout as e:
+            raise TransportError(str(e)) from e
+        except (exceptions.Timeout, exceptions.ChunkedEncodingError) as e:
+            raise TransportError(str(e), ambiguous=True) from e
+        except exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+        return HttpResponse(
+            response.status_code,
+            response.reason or "",
+            response.content,
+            response.url,
+            response.headers.get("Retry-After"),
+        )
+
+    def post_json(self, body: bytes, timeout: float | None = None) -> HttpResponse:
+        return self._send("POST", self._config.base_url, timeout, data=body, headers=self._headers)
+
+    def get(self, url: str, timeout: float | None = None) -> HttpResponse:
+        return self._send("GET", url, timeout)
+
+    def close(self) -> None:
+        self._session.close()
+
+
+class HttpClientTransport(Transport):
+    """http.client の1本の接続を使い回して送信（requests を経由しない軽量版）"""
+
+    def __init__(self, config: ApiConfig) -> None:
+        import http.client
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(config.base_url)
+        if parts.scheme == "https":
+            connection_class: Any = http.client.HTTPSConnection
+        elif parts.scheme == "http":
+            connection_class = http.client.HTTPConnection
+        else:
+            raise ValueError(f"未対応のURLスキームです: {config.base_url}")
+
+        self._config = config
+        self._urlsplit = urlsplit
+        self._origin = (parts.scheme, parts.netloc)
+        self._errors = (OSError, http.client.HTTPException)
+        self._path = self._path_of(parts)
+        self._conn = connection_class(parts.hostname, parts.port, timeout=config.connect_timeout)
+        self._headers = {
+            "Accept": "*/*",
+            "Connection": "keep-alive",
+        }
+
+    @staticmethod
+    def _path_of(parts: Any) -> str:
+        return (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    def _send(
+        self,
+        method: str,
+        path: str,
+        url: str,
+        body: bytes | None,
+        headers: dict[str, str],
+        timeout: float | None,
+    ) -> HttpResponse:
+        conn = self._conn
+        if conn.sock is None:
+            try:
+                conn.connect()  # 接続タイムアウトは connect_timeout
+            except self._errors as e:
+                conn.close()
+                raise TransportError(f"{type(e).__name__}: {e}") from e
+        conn.sock.settimeout(timeout or self._config.timeout)
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except self._errors as e:
+            conn.close()  # 切断された接続は次の送信で張り直される
+            raise TransportError(f"{type(e).__name__}: {e}", ambiguous=True) from e
+        if response.will_close:
+            conn.close()
+        return HttpResponse(response.status, response.reason, data, url, response.getheader("Retry-After"))
+
+    def post_json(self, body: bytes, timeout: float | None = None) -> HttpResponse:
+        headers = dict(self._headers)
+        headers["Content-Type"] = "application/json"
+        headers["Content-Length"] = str(len(body))
+        return self._send("POST", self._path, self._config.base_url, body, headers, timeout)
+
+    def get(self, url: str, timeout: float | None = None) -> HttpResponse:
+        parts = self._urlsplit(url)
+        if (parts.scheme, parts.netloc) != self._origin:
+            raise TransportError(f"base_url と異なるホストには送信できません: {url}")
+        return self._send("GET", self._path_of(parts), url, None, self._headers, timeout)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+TRANSPORTS: dict[str, type[Transport]] = {
+    "requests": RequestsTransport,
+    "http.client": HttpClientTransport,
+}
+
+
+def create_transport(config: ApiConfig) -> Transport:
+    """設定に応じたトランスポートを作成"""
+    try:
+        transport_class = TRANSPORTS[config.transport]
+    except KeyError:
+        raise ValueError(
+            f"未知のトランスポートです: {config.transport}（{', '.join(TRANSPORTS)}）"
+        ) from None
+    return transport_class(config)
+
+
+# =============================================================================
+# Resilience
+# =============================================================================
+
+# リトライ対象のステータス
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# バックオフの上限（urllib3 の Retry.DEFAULT_BACKOFF_MAX と同じ）
+BACKOFF_MAX = 120.0
+
+
+class CircuitState(Enum):
+    """サーキットブレーカーの状態"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(TransportError):
+    """サーキットブレーカーが遮断中のため送信しなかった"""
+
+
+class CircuitBreaker:
+    """直近の失敗率が閾値を超えたら送信を止め、一定時間後に試験送信で復旧を確認する"""
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        window: int = 20,
+        min_calls: int = 10,
+        open_seconds: float = 30.0,
+        clock: Any = time.monotonic,
+    ) -> None:
+        self._failure_ratio = failure_ratio
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._min_calls = min(min_calls, window)
+        self._open_seconds = open_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            if self._state is CircuitState.OPEN and self._probe_due():
+                return CircuitState.HALF_OPEN
+            return self._state
+
+    def _probe_due(self) -> bool:
+        return self._clock() - self._opened_at >= self._open_seconds
+
+    def seconds_until_probe(self) -> float:
+        """試験送信ができるまでの秒数（遮断中でなければ 0）"""
+        with self._lock:
+            if self._state is not CircuitState.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self._open_seconds - self._clock())
+
+    def allow(self) -> bool:
+        """送信してよいか（半開状態では試験送信を1件だけ許可）"""
+        with self._lock:
+            if self._state is CircuitState.OPEN and self._probe_due():
+                self._state = CircuitState.HALF_OPEN
+                self._probing = False
+            if self._state is CircuitState.CLOSED:
+                return True
+            if self._state is CircuitState.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, success: bool) -> CircuitState:
+        """送信結果を記録し、遷移後の状態を返す"""
+        with self._lock:
+            if self._state is CircuitState.HALF_OPEN:
+                self._probing = False
+                if success:
+                    self._state = CircuitState.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return self._state
+
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (
+                self._state is CircuitState.CLOSED
+                and len(self._outcomes) >= self._min_calls
+                and failures / len(self._outcomes) >= self._failure_ratio
+            ):
+                self._open()
+            return self._state
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = self._clock()
+        self.trips += 1
+
+
+class RetryBudget:
+    """リトライ回数を全リクエスト数の一定割合に抑える
+
+    障害時にリトライで負荷が何倍にもならないよう、実行全体で共有する。
+    """
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 10) -> None:
+        self._ratio = ratio
+        self._min_retries = min_retries
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire(self) -> bool:
+        """リトライ1回分を確保できれば True"""
+        with self._lock:
+            if self.retries < self._min_retries + self._ratio * self.requests:
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+
+def backoff_seconds(backoff_factor: float, consecutive_errors: int, retry_after: str | None = None) -> float:
+    """リトライ前の待ち時間（urllib3 の Retry と同じ計算。Retry-After があれば優先）"""
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    if consecutive_errors <= 1:
+        return 0.0
+    return min(BACKOFF_MAX, backoff_factor * 2 ** (consecutive_errors - 1))
+
+
+class LatencyTracker:
+    """直近の所要時間からパーセンタイルを求める"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self._min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """q 分位点（サンプル不足なら None）"""
+        with self._lock:
+            if len(self._samples) < self._min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
 # =============================================================================
 # API Client
 # =============================================================================
@@ -149,89 +546,251 @@ class Sha256Hasher(PasswordHasher):
 class SaasApiClient:
     """SaaS API クライアント"""
 
+    _PAYLOAD = PayloadTemplate("username", "email", "password")
+
     def __init__(
         self,
         config: ApiConfig,
         hasher: PasswordHasher | None = None,
         logger: logging.Logger | None = None,
+        transport: Transport | None = None,
+        breaker: CircuitBreaker | None = None,
+        retry_budget: RetryBudget | None = None,
     ) -> None:
         self._config = config
         self._hasher = hasher or Sha256Hasher()
         self._logger = logger or logging.getLogger(__name__)
-        self._session = self._create_session()
-
-    def _create_session(self) -> requests.Session:
-        """リトライ設定付きセッションを作成"""
-        session = requests.Session()
-
-        retry_strategy = Retry(
-            total=self._config.max_retries,
-            backoff_factor=self._config.backoff_factor,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "POST"],
+        self._transport = transport or create_transport(config)
+        # 照会用（ヘッジした要求は別スレッド・別接続で送る）
+        self._lookup_transports: queue.LifoQueue[Transport] = queue.LifoQueue()
+        self._lookup_pool: ThreadPoolExecutor | None = None
+        self.lookup_latency = LatencyTracker()
+        self.hedges = 0
+        self.breaker = breaker or CircuitBreaker(
+            failure_ratio=config.breaker_failure_ratio,
+            window=config.breaker_window,
+            min_calls=config.breaker_min_calls,
+            open_seconds=config.breaker_open_seconds,
+        )
+        self.retry_budget = retry_budget or RetryBudget(
+            config.retry_budget_ratio, config.retry_budget_min
         )
-
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-
-        return session
 
     def create_account(self, request: AccountRequest) -> AccountResult:
         """アカウントを作成"""
-        payload = {
-            "username": request.username,
-            "email": request.email,
-            "password": self._hasher.hash(request.password),
-        }
+        body = self._PAYLOAD.encode(
+            request.username,
+            request.email,
+            self._hasher.hash(request.password),
+        )
 
         try:
-            response = self._session.post(
-                self._config.base_url,
-                json=payload,
-                timeout=self._config.timeout,
-            )
-            response.raise_for_status()
-
-            data = response.json()
+            response = self._post(body, request.username)
+            if response.ok:
+                data = response.json()
+        except CircuitOpenError as e:
+            self._logger.debug("送信せずスキップ (%s): %s", request.username, e)
             return AccountResult(
                 username=request.username,
                 email=request.email,
-                status=AccountStatus.SUCCESS,
-                account_id=data.get("id") or data.get("account_id"),
-                created_at=datetime.now().isoformat(),
+                status=AccountStatus.SKIPPED,
+                error_message=str(e),
             )
-
-        except requests.exceptions.HTTPError as e:
-            error_msg = self._extract_error_message(e)
-            self._logger.warning("HTTP エラー (%s): %s", request.username, error_msg)
+        except (TransportError, ValueError) as e:
+            self._logger.warning("リクエストエラー (%s): %s", request.username, e)
             return AccountResult(
                 username=request.username,
                 email=request.email,
                 status=AccountStatus.FAILED,
-                error_message=error_msg,
+                error_message=str(e),
             )
 
-        except requests.exceptions.RequestException as e:
-            self._logger.warning("リクエストエラー (%s): %s", request.username, e)
+        if not response.ok:
+            error_msg = self._extract_error_message(response)
+            self._logger.warning("HTTP エラー (%s): %s", request.username, error_msg)
             return AccountResult(
                 username=request.username,
                 email=request.email,
                 status=AccountStatus.FAILED,
-                error_message=str(e),
+                error_message=error_msg,
             )
 
-    def _extract_error_message(self, error: requests.exceptions.HTTPError) -> str:
-        """HTTPエラーからメッセージを抽出"""
+        return AccountResult(
+            username=request.username,
+            email=request.email,
+            status=AccountStatus.SUCCESS,
+            account_id=data.get("id") or data.get("account_id"),
+            created_at=datetime.now().isoformat(),
+        )
+
+    def _acquire_circuit(self, deadline: float | None = None) -> None:
+        """送信の可否を確認（pause モードでは試験送信できるまで、期限の範囲で待つ）"""
+        while not self.breaker.allow():
+            wait = self.breaker.seconds_until_probe()
+            if self._config.breaker_mode != "pause":
+                raise CircuitOpenError(f"サーキットブレーカー遮断中（再試行まで {wait:.0f}秒）")
+            wait = max(wait, 0.05)
+            remaining = self._remaining(deadline)
+            if remaining is not None:
+                wait = min(wait, remaining)
+            self._logger.warning("API障害のため %.1f 秒待機します", wait)
+            time.sleep(wait)
+
+    def _record(self, success: bool) -> None:
+        before = self.breaker.state
+        after = self.breaker.record(success)
+        if after is not before:
+            if after is CircuitState.OPEN:
+                self._logger.error(
+                    "サーキットブレーカーを遮断しました（%.0f 秒後に試験送信）",
+                    self._config.breaker_open_seconds,
+                )
+            elif after is CircuitState.CLOSED:
+                self._logger.info("APIの復旧を確認しました（サーキットブレーカー復帰）")
+
+    def _remaining(self, deadline: float | None) -> float | None:
+        """期限までの残り秒数（期限なしなら None、超過していれば TransportError）"""
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TransportError(f"期限 {self._config.deadline} 秒を超過しました")
+        return remaining
+
+    def _post(self, body: bytes, username: str) -> HttpResponse:
+        """サーキットブレーカー・リトライ予算・期限の範囲でリトライしながら送信
+
+        送信後にタイムアウトした場合は、照会URLがあれば再送の前に作成済みかを確認し、
+        作成済みならそのレコードをレスポンスとして返す（重複作成を防ぐ）。
+        """
+        self.retry_budget.record_request()
+        deadline = (
+            time.monotonic() + self._config.deadline if self._config.deadline else None
+        )
+        errors = 0
+        while True:
+            self._acquire_circuit(deadline)
+            retry_after = None
+            timeout = self._read_timeout(deadline)
+            try:
+                response = self._transport.post_json(body, timeout=timeout)
+            except TransportError as e:
+                self._record(False)
+                reason = str(e)
+                if e.ambiguous and self._config.lookup_url:
+                    existing = self._find_after_timeout(username, deadline)
+                    if existing is not None:
+                        return HttpResponse(200, "OK", json.dumps(existing).encode(), self._config.base_url)
+            else:
+                retryable = response.status in RETRY_STATUSES
+                self._record(not retryable)
+                if not retryable:
+                    return response
+                retry_after = response.retry_after
+                reason = f"too many {response.status} error responses"
+
+            errors += 1
+            if errors > self._config.max_retries:
+                raise TransportError(f"Max retries exceeded ({reason})")
+            wait_seconds = backoff_seconds(self._config.backoff_factor, errors, retry_after)
+            remaining = self._remaining(deadline)
+            if remaining is not None and wait_seconds >= remaining:
+                raise TransportError(f"期限 {self._config.deadline} 秒内に完了できません ({reason})")
+            if not self.retry_budget.try_acquire():
+                raise TransportError(f"リトライ予算を使い切りました ({reason})")
+            time.sleep(wait_seconds)
+
+    def _read_timeout(self, deadline: float | None) -> float:
+        remaining = self._remaining(deadline)
+        return self._config.timeout if remaining is None else min(self._config.timeout, remaining)
+
+    def _find_after_timeout(self, username: str, deadline: float | None) -> dict[str, Any] | None:
+        try:
+            existing = self.find_account(username, timeout=self._read_timeout(deadline))
+        except (TransportError, ValueError) as e:
+            self._logger.warning("作成済みかを確認できませんでした (%s): %s", username, e)
+            return None
+        if existing is not None:
+            self._logger.info("タイムアウトしたが作成済みでした: %s", username)
+        return existing
+
+    # -------------------------------------------------------------------------
+    # 照会（冪等なGETのみヘッジする）
+    # -------------------------------------------------------------------------
+
+    def find_account(self, username: str, timeout: float | None = None) -> dict[str, Any] | None:
+        """既存アカウントを照会（存在しなければ None）"""
+        from urllib.parse import quote
+
+        if not self._config.lookup_url:
+            raise ValueError("照会URL（lookup_url）が設定されていません")
+        url = self._config.lookup_url.format(username=quote(username, safe=""))
+        response = self._hedged_get(url, timeout)
+        if response.status == 404:
+            return None
+        if not response.ok:
+            raise TransportError(response.error_text())
+        data = response.json()
+        if not isinstance(data, dict):
+            raise ValueError("照会結果がJSONオブジェクトではありません")
+        return data
+
+    def _timed_get(self, url: str, timeout: float | None) -> HttpResponse:
+        """照会用の接続を借りてGET（ヘッジの各要求が別々の接続を使う）"""
+        try:
+            transport = self._lookup_transports.get_nowait()
+        except queue.Empty:
+            transport = create_transport(self._config)
+        start = time.monotonic()
+        try:
+            response = transport.get(url, timeout)
+        except TransportError:
+            transport.close()
+            raise
+        self._lookup_transports.put(transport)
+        self.lookup_latency.record(time.monotonic() - start)
+        return response
+
+    def _hedged_get(self, url: str, timeout: float | None) -> HttpResponse:
+        if not self._config.hedge:
+            return self._timed_get(url, timeout)
+
+        if self._lookup_pool is None:
+            self._lookup_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="saas-lookup")
+        delay = self.lookup_latency.percentile(0.95) or self._config.hedge_delay
+        pending: set[Future[HttpResponse]] = {self._lookup_pool.submit(self._timed_get, url, timeout)}
+        done, pending = wait(pending, timeout=delay)
+        if not done:
+            self.hedges += 1
+            self._logger.debug("照会が %.3f 秒を超えたため2本目を送信: %s", delay, url)
+            pending.add(self._lookup_pool.submit(self._timed_get, url, timeout))
+
+        error: TransportError | None = None
+        while done or pending:
+            for future in done:
+                try:
+                    return future.result()  # 先に返った方を使い、遅い方は放置する
+                except TransportError as e:
+                    error = e
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        assert error is not None
+        raise error
+
+    def _extract_error_message(self, response: HttpResponse) -> str:
+        """エラーレスポンスからメッセージを抽出"""
         try:
-            data = error.response.json()
-            return data.get("message") or data.get("error") or str(error)
+            data = response.json()
+            return data.get("message") or data.get("error") or response.error_text()
         except (ValueError, AttributeError):
-            return f"HTTP {error.response.status_code}"
+            return f"HTTP {response.status}"
 
     def close(self) -> None:
-        """セッションを閉じる"""
-        self._session.close()
+        """接続を閉じる"""
+        self._transport.close()
+        if self._lookup_pool is not None:
+            self._lookup_pool.shutdown(wait=False)  # 遅れている照会の完了は待たない
+        while not self._lookup_transports.empty():
+            self._lookup_transports.get_nowait().close()
 
     def __enter__(self) -> SaasApiClient:
         return self
@@ -245,26 +804,240 @@ class SaasApiClient:
 # =============================================================================
 
 
-def generate_accounts(count: int, prefix: str = "user") -> Iterator[AccountRequest]:
-    """テスト用アカウントを生成"""
-    for i in range(count):
-        yield AccountRequest(
-            username=f"{prefix}{i}",
-            email=f"{prefix}{i}@example.com",
-            password=f"SecurePass{i}!@#",
-        )
+@dataclass(frozen=True)
+class WorkloadProfile:
+    """合成ワークロードの分布（各 rate は全行に対する割合）"""
+
+    duplicate_rate: float = 0.0  # 既出の行をそのまま再出現させる
+    invalid_email_rate: float = 0.0  # @なし・@重複・TLDなし等の不正なメールアドレス
+    long_field_rate: float = 0.0  # ユーザー名・メールのローカル部を long_field_length 文字に伸ばす
+    long_field_length: int = 256
+    domains: tuple[str, ...] = ("example.com",)
+    domain_skew: float = 0.0  # ドメインの偏り（Zipf の指数。0 なら一様）
+
+    def __post_init__(self) -> None:
+        for name in ("duplicate_rate", "invalid_email_rate", "long_field_rate"):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f"{name} は 0〜1 で指定してください")
+        if not self.domains:
+            raise ValueError("domains は1つ以上必要です")
+        if self.domain_skew < 0:
+            raise ValueError("domain_skew は 0 以上で指定してください")
+
+
+WORKLOAD_PROFILES: dict[str, WorkloadProfile] = {
+    # generate_accounts と同じ連番の行
+    "sequential": WorkloadProfile(),
+    # 本番に近い混在（重複・不正なメール・長いフィールド・偏ったドメイン）
+    "production": WorkloadProfile(
+        duplicate_rate=0.02,
+        invalid_email_rate=0.01,
+        long_field_rate=0.001,
+        domains=(
+            "gmail.com", "yahoo.co.jp", "outlook.com", "icloud.com", "docomo.ne.jp",
+            "ezweb.ne.jp", "softbank.ne.jp", "hotmail.com", "example.co.jp", "nifty.com",
+            "biglobe.ne.jp", "ocn.ne.jp", "so-net.ne.jp", "yahoo.com", "example.com",
+        ),
+        domain_skew=1.2,
+    ),
+    # 検証・APIに負荷をかける入力の多い分布
+    "adversarial": WorkloadProfile(
+        duplicate_rate=0.2,
+        invalid_email_rate=0.2,
+        long_field_rate=0.1,
+        long_field_length=4096,
+        domains=("example.com", "example.co.jp", "xn--r8jz45g.jp"),
+        domain_skew=2.0,
+    ),
+}
+
+# 不正なメールアドレスの作り方（ユーザー名・ドメインから作る。CSVの区切り文字や引用符は含めない）
+_INVALID_EMAIL_FORMS = (
+    "{u}{d}",  # @なし
+    "{u}@@{d}",
+    "@{d}",
+    "{u}@",
+    "{u}@localhost",
+    "{u}@{d}.",
+    "{u} @{d}",
+    "{u}@{d}@{d}",
+)
+
+WORKLOAD_CHUNK = 65536
+WORKLOAD_FIELDS = ("username", "email", "password")
+# CSV で引用符が必要になる文字（csv モジュールの QUOTE_MINIMAL と同じ）
+_CSV_SPECIAL = frozenset(',"\r\n')
+
+
+def _csv_quote(field: str) -> str:
+    """csv.writer と同じ規則で1フィールドを引用する"""
+    if _CSV_SPECIAL.isdisjoint(field):
+        return field
+    return '"' + field.replace('"', '""') + '"'
+
+
+def _workload_chunks(
+    count: int,
+    profile: WorkloadProfile,
+    seed: int,
+    prefix: str,
+    chunk_size: int,
+) -> Iterator[tuple[range, list[str], dict[int, tuple[str, str, str]]]]:
+    """チャンクごとに (通し番号の範囲, 各行のドメイン, 書き換える行) を生成
+
+    書き換えのない行は通し番号 i とドメイン d から
+    (f"{prefix}{i}", f"{prefix}{i}@{d}", f"SecurePass{i}!@#") として組み立てる。
+    """
+    import random
+    from itertools import accumulate
+
+    rng = random.Random(seed)
+    domains = list(profile.domains)
+    cum_weights = list(accumulate(1 / rank**profile.domain_skew for rank in range(1, len(domains) + 1)))
+
+    for start in range(0, count, chunk_size):
+        numbers = range(start, min(start + chunk_size, count))
+        n = len(numbers)
+        if len(domains) == 1:
+            picked = domains * n
+        else:
+            picked = rng.choices(domains, cum_weights=cum_weights, k=n)
+
+        overrides: dict[int, tuple[str, str, str]] = {}
+
+        def row(j: int) -> tuple[str, str, str]:
+            if j in overrides:
+                return overrides[j]
+            name = f"{prefix}{numbers[j]}"
+            return name, f"{name}@{picked[j]}", f"SecurePass{numbers[j]}!@#"
+
+        # 割合どおりの件数だけ位置を選んで書き換える（行ごとに乱数を引くより速い）
+        for j in rng.sample(range(n), round(n * profile.long_field_rate)):
+            name, email, password = row(j)
+            pad = "x" * max(0, profile.long_field_length - len(name))
+            overrides[j] = (name + pad, email.replace("@", pad + "@", 1), password)
+        for j in rng.sample(range(n), round(n * profile.invalid_email_rate)):
+            name, _, password = row(j)
+            email = rng.choice(_INVALID_EMAIL_FORMS).format(u=name, d=picked[j])
+            overrides[j] = (name, email, password)
+        for j in rng.sample(range(1, n), min(max(n - 1, 0), round(n * profile.duplicate_rate))):
+            overrides[j] = row(rng.randrange(j))
+
+        yield numbers, picked, overrides
+
+
+def generate_workload(
+    count: int,
+    profile: WorkloadProfile | None = None,
+    seed: int = 0,
+    prefix: str = "user",
+    chunk_size: int = WORKLOAD_CHUNK,
+) -> Iterator[list[tuple[str, str, str]]]:
+    """(username, email, password) の行をチャンク単位で生成
+
+    同じ seed・profile からは常に同じ行が生成される。
+    """
+    for numbers, picked, overrides in _workload_chunks(
+        count, profile or WorkloadProfile(), seed, prefix, chunk_size
+    ):
+        rows = [
+            (f"{prefix}{i}", f"{prefix}{i}@{d}", f"SecurePass{i}!@#")
+            for i, d in zip(numbers, picked)
+        ]
+        for j, overridden in overrides.items():
+            rows[j] = overridden
+        yield rows
+
+
+def write_workload(
+    path: Path,
+    count: int,
+    profile: WorkloadProfile | None = None,
+    seed: int = 0,
+    prefix: str = "user",
+    fmt: str = "csv",
+) -> int:
+    """合成ワークロードを CSV（load_accounts_from_csv で読める形式）または JSONL に書き出す
+
+    generate_workload と同じ行を、タプルを作らず1行ずつ直接文字列にする。
+    prefix・ドメインに引用が必要な文字があれば、書き換えのない行も1行ずつ引用する。
+    """
+    profile = profile or WorkloadProfile()
+    if fmt == "csv":
+        header = ",".join(WORKLOAD_FIELDS) + "\n"
+        line = "%s,%s,%s\n"
+        quote = _csv_quote
+        # 引用が必要なら高速経路は使えない（フィールド全体を引用するため）
+        fast = _CSV_SPECIAL.isdisjoint(prefix + "".join(profile.domains))
+    elif fmt == "jsonl":
+        header = ""
+        line = "{" + ", ".join(f'"{k}": %s' for k in WORKLOAD_FIELDS) + "}\n"
+        quote = json.encoder.encode_basestring_ascii
+        fast = True
+    else:
+        raise ValueError(f"未対応の形式です: {fmt}")
+
+    # JSON のエスケープは1文字ごとなので、部分ごとにエスケープして連結してよい
+    escaped = {d: json.encoder.encode_basestring_ascii(d)[1:-1] for d in profile.domains}
+    name = json.encoder.encode_basestring_ascii(prefix)[1:-1]
+
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(header)
+        for numbers, picked, overrides in _workload_chunks(
+            count, profile, seed, prefix, WORKLOAD_CHUNK
+        ):
+            if not fast:
+                lines = [
+                    line % tuple(map(quote, (f"{prefix}{i}", f"{prefix}{i}@{d}", f"SecurePass{i}!@#")))
+                    for i, d in zip(numbers, picked)
+                ]
+            elif fmt == "csv":
+                lines = [
+                    f"{prefix}{i},{prefix}{i}@{d},SecurePass{i}!@#\n"
+                    for i, d in zip(numbers, picked)
+                ]
+            else:
+                lines = [
+                    f'{{"username": "{name}{i}", "email": "{name}{i}@{escaped[d]}", '
+                    f'"password": "SecurePass{i}!@#"}}\n'
+                    for i, d in zip(numbers, picked)
+                ]
+            for j, row in overrides.items():
+                lines[j] = line % tuple(map(quote, row))
+            f.write("".join(lines))
+            written += len(lines)
+    return written
 
 
-def load_accounts_from_csv(path: Path) -> Iterator[AccountRequest]:
-    """CSVからアカウント情報を読み込み"""
+def generate_accounts(count: int, prefix: str = "user") -> Iterator[AccountRequest]:
+    """テスト用アカウントを生成（sequential プロファイルの合成ワークロード）"""
+    for rows in generate_workload(count, WORKLOAD_PROFILES["sequential"], prefix=prefix):
+        for username, email, password in rows:
+            yield AccountRequest(username=username, email=email, password=password)
+
+
+def load_accounts_from_csv(
+    path: Path,
+    skip_invalid: bool = False,
+    logger: logging.Logger | None = None,
+) -> Iterator[AccountRequest]:
+    """CSVからアカウント情報を読み込み（skip_invalid なら不正な行を警告して飛ばす）"""
     with open(path, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            yield AccountRequest(
-                username=row["username"],
-                email=row["email"],
-                password=row["password"],
-            )
+            try:
+                yield AccountRequest(
+                    username=row["username"],
+                    email=row["email"],
+                    password=row["password"],
+                )
+            except ValueError as e:
+                if not skip_invalid:
+                    raise
+                (logger or logging.getLogger(__name__)).warning(
+                    "不正な行をスキップ (%d行目): %s", reader.line_num, e
+                )
 
 
 # =============================================================================
@@ -290,6 +1063,56 @@ class ProcessingStats:
         )
 
 
+# テナント名（結果ファイル名に使うため英数字と . _ - のみ）
+TENANT_NAME_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._-")
+
+
+class FairScheduler:
+    """複数テナントの要求を重み付き公平キューイングで1列に並べる
+
+    各要求に 終了タグ = 同じテナントの前回の終了タグ + 1 / 重み を付け、終了タグの
+    小さい順に取り出す（全テナントの要求が最初から揃っているため、WFQ の仮想時刻は
+    前回の終了タグを超えない）。重み 3 と 1 のテナントは 3:1 で交互に送られ、
+    件数の多いテナントがあっても少ないテナントは最初から順番が回ってくる。
+    """
+
+    def __init__(
+        self,
+        sources: dict[str, Iterable[AccountRequest]],
+        weights: dict[str, float] | None = None,
+    ) -> None:
+        weights = weights or {}
+        for name in sources:
+            if not name or not set(name) <= TENANT_NAME_CHARS:
+                raise ValueError(f"テナント名には英数字と . _ - のみ使えます: {name!r}")
+            if weights.get(name, 1.0) <= 0:
+                raise ValueError(f"テナント {name} の重みは正の数を指定してください")
+        self._sources = {name: iter(source) for name, source in sources.items()}
+        self._weights = {name: float(weights.get(name, 1.0)) for name in sources}
+
+    def __iter__(self) -> Iterator[tuple[str, AccountRequest]]:
+        import heapq
+
+        # (終了タグ, テナントの順番, テナント名, 先読みした要求)
+        heap: list[tuple[float, int, str, AccountRequest]] = []
+        order = {name: i for i, name in enumerate(self._sources)}
+        for name, source in self._sources.items():
+            request = next(source, None)
+            if request is not None:
+                heap.append((1.0 / self._weights[name], order[name], name, request))
+        heapq.heapify(heap)
+
+        while heap:
+            finish, _, name, request = heap[0]
+            yield name, request
+            following = next(self._sources[name], None)
+            if following is None:
+                heapq.heappop(heap)
+            else:
+                finish += 1.0 / self._weights[name]
+                heapq.heapreplace(heap, (finish, order[name], name, following))
+
+
 class AccountProcessor:
     """アカウント一括作成プロセッサー"""
 
@@ -304,6 +1127,9 @@ class AccountProcessor:
         self._logger = logger or logging.getLogger(__name__)
         self._results: list[AccountResult] = []
         self._stats = ProcessingStats()
+        # process_tenants で処理したテナントごとの結果・統計
+        self._tenant_results: dict[str, list[AccountResult]] = {}
+        self._tenant_stats: dict[str, ProcessingStats] = {}
 
     def process(self, requests: Iterator[AccountRequest]) -> ProcessingStats:
         """アカウントを一括作成"""
@@ -314,27 +1140,78 @@ class AccountProcessor:
         self._logger.info("アカウント作成開始: %d 件", total)
 
         for i, request in enumerate(request_list, 1):
-            self._process_single(request, i, total)
+            status = self._process_single(request, i, total)
 
-            # レート制限
-            if i < total:
+            # レート制限（送信しなかった場合は待たない）
+            if i < total and status is not AccountStatus.SKIPPED:
                 time.sleep(self._config.rate_limit_seconds)
 
         self._logger.info("処理完了: %s", self._stats)
+        self._log_client_summary()
         return self._stats
 
+    def process_tenants(
+        self,
+        sources: dict[str, Iterable[AccountRequest]],
+        weights: dict[str, float] | None = None,
+    ) -> dict[str, ProcessingStats]:
+        """複数テナントのアカウントを公平に交互に作成し、テナントごとの統計を返す
+
+        送信間隔（rate_limit_seconds）は全テナントで共有する。送る順番は
+        FairScheduler（重み付き公平キューイング）で決める。
+        """
+        request_lists = {name: list(requests) for name, requests in sources.items()}
+        scheduler = FairScheduler(request_lists, weights)
+        total = sum(len(requests) for requests in request_lists.values())
+        self._stats.total += total
+        for name, requests in request_lists.items():
+            self._tenant_results.setdefault(name, [])
+            self._tenant_stats.setdefault(name, ProcessingStats()).total += len(requests)
+
+        self._logger.info(
+            "アカウント作成開始: %d 件（%s）",
+            total,
+            ", ".join(f"{name}: {len(requests)}件" for name, requests in request_lists.items()),
+        )
+
+        for i, (name, request) in enumerate(scheduler, 1):
+            status = self._process_single(request, i, total, name)
+            result = self._results[-1]
+            self._tenant_results[name].append(result)
+            self._update_stats(result.status, self._tenant_stats[name])
+
+            # レート制限は全テナントで共有（送信しなかった場合は待たない）
+            if i < total and status is not AccountStatus.SKIPPED:
+                time.sleep(self._config.rate_limit_seconds)
+
+        self._logger.info("処理完了: %s", self._stats)
+        for name, stats in self._tenant_stats.items():
+            self._logger.info("  %s: %s", name, stats)
+        self._log_client_summary()
+        return dict(self._tenant_stats)
+
+    def _log_client_summary(self) -> None:
+        budget = self._client.retry_budget
+        self._logger.info(
+            "リトライ: %d 回（予算超過で打ち切り %d 回）, サーキットブレーカー遮断: %d 回",
+            budget.retries,
+            budget.denied,
+            self._client.breaker.trips,
+        )
+
     def _process_single(
         self,
         request: AccountRequest,
         current: int,
         total: int,
-    ) -> None:
+        tenant: str | None = None,
+    ) -> AccountStatus:
         """単一アカウントを処理"""
         self._logger.info(
             "処理中 [%d/%d]: %s",
             current,
             total,
-            request.username,
+            f"{tenant}/{request.username}" if tenant else request.username,
         )
 
         try:
@@ -344,12 +1221,19 @@ class AccountProcessor:
 
             if result.status == AccountStatus.SUCCESS:
                 self._logger.info("✓ 作成成功: %s", request.username)
+            elif result.status == AccountStatus.SKIPPED:
+                self._logger.warning(
+                    "- スキップ: %s - %s",
+                    request.username,
+                    result.error_message,
+                )
             else:
                 self._logger.warning(
                     "✗ 作成失敗: %s - %s",
                     request.username,
                     result.error_message,
                 )
+            return result.status
 
         except Exception as e:
             self._logger.error("予期しないエラー (%s): %s", request.username, e)
@@ -365,63 +1249,510 @@ class AccountProcessor:
 
             if not self._config.continue_on_error:
                 raise
+            return AccountStatus.FAILED
 
-    def _update_stats(self, status: AccountStatus) -> None:
-        """統計を更新"""
+    def _update_stats(self, status: AccountStatus, stats: ProcessingStats | None = None) -> None:
+        """統計を更新（stats 省略時は全体の統計）"""
+        stats = stats or self._stats
         if status == AccountStatus.SUCCESS:
-            self._stats.success += 1
+            stats.success += 1
         elif status == AccountStatus.FAILED:
-            self._stats.failed += 1
+            stats.failed += 1
         elif status == AccountStatus.SKIPPED:
-            self._stats.skipped += 1
+            stats.skipped += 1
 
     def save_results(self, path: Path | None = None) -> Path:
         """結果をCSVに保存"""
         output_path = path or self._config.output_path
+        self._write_results(output_path, self._results)
+        self._logger.info("結果を保存: %s", output_path)
+        return output_path
 
-        with open(output_path, "w", newline="", encoding="utf-8") as f:
-            if not self._results:
-                return output_path
+    def save_tenant_results(self, path: Path | None = None) -> dict[str, Path]:
+        """テナントごとの結果を <出力ファイル名>-<テナント名>.csv に保存
 
-            fieldnames = list(self._results[0].to_dict().keys())
+        各ファイルはそのテナントの入力CSVと reconcile で突き合わせられる。
+        """
+        output_path = path or self._config.output_path
+        paths = {}
+        for name, results in self._tenant_results.items():
+            paths[name] = output_path.with_name(f"{output_path.stem}-{name}{output_path.suffix}")
+            self._write_results(paths[name], results)
+            self._logger.info("結果を保存 (%s): %s", name, paths[name])
+        return paths
+
+    @staticmethod
+    def _write_results(path: Path, results: list[AccountResult]) -> None:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            if not results:
+                return
+
+            fieldnames = list(results[0].to_dict().keys())
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
-            writer.writerows(r.to_dict() for r in self._results)
-
-        self._logger.info("結果を保存: %s", output_path)
-        return output_path
+            writer.writerows(r.to_dict() for r in results)
 
     @property
     def results(self) -> list[AccountResult]:
         return self._results.copy()
 
+    @property
+    def stats(self) -> ProcessingStats:
+        """全体（全テナント合計）の統計"""
+        return self._stats
+
+    @property
+    def tenant_results(self) -> dict[str, list[AccountResult]]:
+        return {name: results.copy() for name, results in self._tenant_results.items()}
+
+    @property
+    def tenant_stats(self) -> dict[str, ProcessingStats]:
+        return dict(self._tenant_stats)
+
+
+# =============================================================================
+# Reconcile
+# =============================================================================
+
+
+# 再実行用CSVの列（load_accounts_from_csv でそのまま読める）
+RETRY_FIELDS = ("username", "email", "password", "reason", "error_message")
+RESULT_FIELDS = ("username", "email", "status", "account_id", "error_message", "created_at")
+RECONCILE_KEYS = ("username", "email", "both")
+# 索引1件あたりのメモリ量の見積もり（CSV上のバイト数に対する倍率）
+_RESULT_INDEX_OVERHEAD = 8
+_INPUT_INDEX_OVERHEAD = 2
+_MAX_PARTITIONS = 256
+# 分割時に書き込み待ちでメモリに置く行数（全パーティションの合計）
+_PARTITION_BUFFER_ROWS = 200_000
+
+
+@dataclass
+class ReconcileStats:
+    """突き合わせ結果の件数"""
+
+    input_rows: int = 0
+    result_rows: int = 0
+    succeeded: int = 0
+    missing: int = 0
+    failed: int = 0
+    extra: int = 0
+    duplicate_inputs: int = 0
+    partitions: int = 1
+
+    @property
+    def retry(self) -> int:
+        return self.missing + self.failed
+
+    def __str__(self) -> str:
+        return (
+            f"入力: {self.input_rows}, 結果: {self.result_rows}, 成功: {self.succeeded}, "
+            f"未処理: {self.missing}, 失敗: {self.failed}, 入力にない結果: {self.extra}, "
+            f"入力の重複: {self.duplicate_inputs}"
+        )
+
+
+def _read_csv_rows(
+    path: Path, fields: tuple[str, ...], required: tuple[str, ...]
+) -> Iterator[tuple[int, list[str]]]:
+    """CSVを (行番号, fields の順に並べた値) で読む。空ファイルは0行として扱う"""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        missing = [name for name in required if name not in header]
+        if missing:
+            raise ValueError(f"{path}: 列がありません: {', '.join(missing)}")
+        width = len(fields)
+        if header[:width] == list(fields):
+            for row in reader:
+                if len(row) >= width:
+                    yield reader.line_num, row[:width]
+                elif row:
+                    yield reader.line_num, row + [""] * (width - len(row))
+            return
+        columns = [header.index(name) if name in header else None for name in fields]
+        for row in reader:
+            if row:
+                yield reader.line_num, [
+                    row[i] if i is not None and i < len(row) else "" for i in columns
+                ]
+
+
+def _key_function(key: str) -> Callable[[list[str]], str]:
+    """行（username, email, ...）から突き合わせキーを作る関数"""
+    if key == "username":
+        return lambda row: row[0]
+    if key == "email":
+        return lambda row: row[1].lower()
+    if key == "both":
+        return lambda row: f"{row[0]}\x1f{row[1].lower()}"
+    raise ValueError(f"未対応のキーです: {key}")
+
+
+def _reconcile_partition(
+    inputs: Iterator[tuple[int, list[str]]],
+    results: Iterator[tuple[int, list[str]]],
+    key_of: Callable[[list[str]], str],
+    stats: ReconcileStats,
+    emit_retry: Callable[[int, list[str]], None],
+    emit_extra: Callable[[int, list[str]], None],
+) -> None:
+    """結果の索引を作り、入力を流して再実行対象・入力にない結果を emit する
+
+    同じキーの結果が複数あれば、成功を優先し、それ以外は後の行で上書きする
+    （再実行の結果ファイルを後ろに並べれば最新の状態になる）。
+    入力・結果とも行番号順に渡し、emit も行番号順に呼ぶ。
+    """
+    success = AccountStatus.SUCCESS.value
+    index: dict[str, tuple[int, list[str]]] = {}
+    for line, row in results:
+        stats.result_rows += 1
+        key = key_of(row)
+        current = index.get(key)
+        if current is None or current[1][2] != success:
+            # 入れ直して索引の順序を採用した行の行番号順に保つ
+            index.pop(key, None)
+            index[key] = (line, row)
+
+    seen: set[str] = set()
+    for line, row in inputs:
+        stats.input_rows += 1
+        key = key_of(row)
+        if key in seen:
+            stats.duplicate_inputs += 1
+            continue
+        seen.add(key)
+        found = index.get(key)
+        if found is None:
+            stats.missing += 1
+            emit_retry(line, [*row, "missing", ""])
+        elif found[1][2] == success:
+            stats.succeeded += 1
+        else:
+            stats.failed += 1
+            emit_retry(line, [*row, found[1][2] or AccountStatus.FAILED.value, found[1][4]])
+
+    for key, (line, row) in index.items():
+        if key not in seen:
+            stats.extra += 1
+            emit_extra(line, row)
+
+
+def _partition_rows(
+    rows: Iterator[tuple[int, list[str]]],
+    key_of: Callable[[list[str]], str],
+    directory: Path,
+    name: str,
+    partitions: int,
+) -> list[Path]:
+    """キーのハッシュで (行番号, 行) を partitions 個の一時ファイルに振り分ける
+
+    一時ファイルは CSV ではなく pickle したバッチの列で、書き込み・読み戻しが速い。
+    """
+    import pickle
+    import zlib
+
+    batch = max(256, _PARTITION_BUFFER_ROWS // partitions)
+    paths = [directory / f"{name}-{i}.bin" for i in range(partitions)]
+    files = [open(p, "wb") for p in paths]
+    buffers: list[list[tuple[int, list[str]]]] = [[] for _ in range(partitions)]
+    try:
+        for item in rows:
+            i = zlib.crc32(key_of(item[1]).encode()) % partitions
+            buffer = buffers[i]
+            buffer.append(item)
+            if len(buffer) >= batch:
+                pickle.dump(buffer, files[i], pickle.HIGHEST_PROTOCOL)
+                buffer.clear()
+        for buffer, f in zip(buffers, files):
+            if buffer:
+                pickle.dump(buffer, f, pickle.HIGHEST_PROTOCOL)
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def _read_partition(path: Path) -> Iterator[tuple[int, list[str]]]:
+    import pickle
+
+    with open(path, "rb") as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def _merge_partitions(paths: list[Path], writer: Any) -> None:
+    """行番号順に並んだ各パーティションの出力を、元の行番号順に併合して書く"""
+    import heapq
+
+    files = [open(p, newline="", encoding="utf-8") for p in paths]
+    try:
+        readers = [csv.reader(f) for f in files]
+        for row in heapq.merge(*readers, key=lambda row: int(row[0])):
+            writer.writerow(row[1:])
+    finally:
+        for f in files:
+            f.close()
+
+
+def reconcile(
+    input_path: Path,
+    result_paths: list[Path],
+    output_path: Path,
+    extra_path: Path | None = None,
+    key: str = "username",
+    memory_limit: int = 256 * 1024 * 1024,
+    temp_dir: Path | None = None,
+) -> ReconcileStats:
+    """--input のCSVと save_results の出力を突き合わせ、再実行用CSVを書き出す
+
+    output_path には未処理（結果にない）・失敗した入力行を入力の順で、
+    extra_path には入力にない結果行を書く。索引の見積もりが memory_limit を
+    超えるときは、両方のファイルをキーのハッシュで一時ファイルに分割し、
+    分割ごとに索引を作ってから行番号順に併合する。
+    """
+    key_of = _key_function(key)
+    stats = ReconcileStats()
+    estimate = (
+        sum(p.stat().st_size for p in result_paths) * _RESULT_INDEX_OVERHEAD
+        + input_path.stat().st_size * _INPUT_INDEX_OVERHEAD
+    )
+    stats.partitions = min(_MAX_PARTITIONS, max(1, -(-estimate // max(memory_limit, 1))))
+
+    def inputs() -> Iterator[tuple[int, list[str]]]:
+        return _read_csv_rows(input_path, WORKLOAD_FIELDS, WORKLOAD_FIELDS)
+
+    def results() -> Iterator[tuple[int, list[str]]]:
+        # 行番号は複数ファイルを通した通し番号にする（extra の出力順・後勝ちの判定に使う）
+        offset = 0
+        for path in result_paths:
+            line = 0
+            for line, row in _read_csv_rows(path, RESULT_FIELDS, ("username", "email", "status")):
+                yield offset + line, row
+            offset += line
+
+    with open(output_path, "w", newline="", encoding="utf-8") as out, \
+            open(extra_path or os.devnull, "w", newline="", encoding="utf-8") as extra:
+        retry_writer = csv.writer(out)
+        extra_writer = csv.writer(extra)
+        retry_writer.writerow(RETRY_FIELDS)
+        extra_writer.writerow(RESULT_FIELDS)
+
+        if stats.partitions == 1:
+            with _phase("reconcile"):
+                _reconcile_partition(
+                    inputs(), results(), key_of, stats,
+                    lambda line, row: retry_writer.writerow(row),
+                    lambda line, row: extra_writer.writerow(row),
+                )
+            return stats
+
+        import tempfile
+
+        with tempfile.TemporaryDirectory(prefix="reconcile-", dir=temp_dir) as tmp:
+            directory = Path(tmp)
+            with _phase("partition"):
+                input_parts = _partition_rows(inputs(), key_of, directory, "input", stats.partitions)
+                result_parts = _partition_rows(results(), key_of, directory, "result", stats.partitions)
+            retry_parts, extra_parts = [], []
+            for i, (input_part, result_part) in enumerate(zip(input_parts, result_parts)):
+                retry_parts.append(directory / f"retry-{i}.csv")
+                extra_parts.append(directory / f"extra-{i}.csv")
+                with _phase("reconcile"), \
+                        open(retry_parts[-1], "w", newline="", encoding="utf-8") as rf, \
+                        open(extra_parts[-1], "w", newline="", encoding="utf-8") as ef:
+                    retry_part, extra_part = csv.writer(rf), csv.writer(ef)
+                    _reconcile_partition(
+                        _read_partition(input_part), _read_partition(result_part), key_of, stats,
+                        lambda line, row: retry_part.writerow([line, *row]),
+                        lambda line, row: extra_part.writerow([line, *row]),
+                    )
+                input_part.unlink()
+                result_part.unlink()
+            with _phase("merge"):
+                _merge_partitions(retry_parts, retry_writer)
+                if extra_path is not None:
+                    _merge_partitions(extra_parts, extra_writer)
+    return stats
+
 
 # =============================================================================
 # Logging Setup
 # =============================================================================
 
 
-def setup_logging(verbose: bool = False) -> logging.Logger:
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1オブジェクトのJSON形式で出力するフォーマッター"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, LOG_DATEFMT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _create_log_handler(json_format: bool = False) -> logging.Handler:
+    """標準エラー出力へのハンドラーを作成"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT, LOG_DATEFMT)
+    )
+    return handler
+
+
+class BoundedQueueHandler(QueueHandler):
+    """キューが満杯でも待たないQueueHandler
+
+    キューの使用率が高水位を超えたら WARNING 未満のレコードを
+    sample_every 件に1件だけ残し、満杯なら破棄して件数を数える。
+    """
+
+    def __init__(
+        self,
+        log_queue: queue.Queue,
+        sample_every: int = 10,
+        high_watermark: float = 0.5,
+    ) -> None:
+        super().__init__(log_queue)
+        self._threshold = max(1, int(log_queue.maxsize * high_watermark))
+        self._sample_every = max(1, sample_every)
+        self._pressure_count = 0
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.levelno < logging.WARNING and self.queue.qsize() >= self._threshold:
+            self._pressure_count += 1
+            if self._pressure_count % self._sample_every:
+                self.sampled_out += 1
+                return
+        super().emit(record)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BlockingStopListener(QueueListener):
+    """停止用の番兵だけは空きを待って投入するQueueListener"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class QueuedLogging:
+    """バックグラウンドスレッドで書き出すロギング（要求処理の経路でI/Oを待たない）"""
+
+    def __init__(
+        self,
+        target: logging.Handler,
+        queue_size: int = 10000,
+        sample_every: int = 10,
+    ) -> None:
+        self._target = target
+        self.handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size), sample_every)
+        # 書式は書き出し側のハンドラーで適用する（キューにはメッセージだけを載せる）
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = _BlockingStopListener(
+            self.handler.queue, target, respect_handler_level=True
+        )
+
+    @property
+    def lost(self) -> int:
+        """出力されなかった行数（満杯による破棄 + 間引き）"""
+        return self.handler.dropped + self.handler.sampled_out
+
+    def start(self) -> None:
+        self._listener.start()
+
+    def stop(self) -> int:
+        """残りを書き出して停止し、出力されなかった行数を報告"""
+        self._listener.stop()
+        level = logging.WARNING if self.lost else logging.INFO
+        self._target.handle(logging.LogRecord(
+            __name__, level, __file__, 0,
+            "ログ出力の破棄: %d 行（キュー満杯 %d, 間引き %d）",
+            (self.lost, self.handler.dropped, self.handler.sampled_out), None,
+        ))
+        self._target.flush()
+        return self.lost
+
+
+def setup_logging(verbose: bool = False, json_format: bool = False) -> logging.Logger:
     """ロガーをセットアップ"""
     level = logging.DEBUG if verbose else logging.INFO
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    logging.basicConfig(level=level, handlers=[_create_log_handler(json_format)])
     return logging.getLogger(__name__)
 
 
+def setup_queued_logging(
+    verbose: bool = False,
+    json_format: bool = False,
+    queue_size: int = 10000,
+    sample_every: int = 10,
+) -> tuple[logging.Logger, QueuedLogging]:
+    """キュー経由のロガーをセットアップ（終了時に QueuedLogging.stop() を呼ぶ）"""
+    queued = QueuedLogging(_create_log_handler(json_format), queue_size, sample_every)
+    level = logging.DEBUG if verbose else logging.INFO
+    logging.basicConfig(level=level, handlers=[queued.handler])
+    queued.start()
+    return logging.getLogger(__name__), queued
+
+
+# =============================================================================
+# Profiling
+# =============================================================================
+
+
+# lib/script_profiling.py（cProfile・tracemalloc は --profile / --trace-memory 指定時だけ読み込む）
+sys.path.append(str(Path(__file__).resolve().parent.parent / "lib"))
+from script_profiling import maybe_load as _load_profiling, phase as _phase, session as _profiling_session  # noqa: E402
+
+
 # =============================================================================
 # CLI
 # =============================================================================
 
 
-def parse_args() -> argparse.Namespace:
+def parse_tenant_spec(spec: str) -> tuple[str, float, Path]:
+    """--tenant の値 NAME[:WEIGHT]=CSV を (名前, 重み, パス) に分解"""
+    name, sep, path = spec.partition("=")
+    name, _, weight = name.partition(":")
+    try:
+        value = float(weight) if weight else 1.0
+    except ValueError:
+        value = 0.0
+    if not sep or not path or not name or value <= 0:
+        raise argparse.ArgumentTypeError(f"NAME[:WEIGHT]=CSV の形式で指定してください: {spec}")
+    return name, value, Path(path)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     """コマンドライン引数をパース"""
     parser = argparse.ArgumentParser(
         description="SaaSアカウント一括作成ツール",
         formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            "プロファイリング: --profile / --trace-memory / --profile-output FILE\n"
+            "  （generate・reconcile ではサブコマンドの前に指定する）"
+        ),
     )
 
     source_group = parser.add_mutually_exclusive_group(required=True)
@@ -435,6 +1766,14 @@ def parse_args() -> argparse.Namespace:
         type=Path,
         help="アカウント情報のCSVファイル",
     )
+    source_group.add_argument(
+        "--tenant",
+        action="append",
+        type=parse_tenant_spec,
+        metavar="NAME[:WEIGHT]=CSV",
+        help="テナントごとの入力CSV（複数指定可）。重みの比で交互に作成し、"
+             "結果は <--output>-<NAME>.csv にも保存する (default 重み: 1)",
+    )
 
     parser.add_argument(
         "--output", "-o",
@@ -453,6 +1792,11 @@ def parse_args() -> argparse.Namespace:
         default="user",
         help="生成ユーザー名のプレフィックス (default: user)",
     )
+    parser.add_argument(
+        "--skip-invalid",
+        action="store_true",
+        help="--input の不正な行を警告して飛ばす（既定では最初の不正な行で終了）",
+    )
     parser.add_argument(
         "--verbose", "-v",
         action="store_true",
@@ -463,51 +1807,318 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="実際のAPI呼び出しを行わない",
     )
+    parser.add_argument(
+        "--transport",
+        choices=sorted(TRANSPORTS),
+        help="HTTPの送信方式 (default: 環境変数 SAAS_API_TRANSPORT または requests)",
+    )
+    parser.add_argument(
+        "--breaker-mode",
+        choices=["fail-fast", "pause"],
+        default="fail-fast",
+        help="API障害でサーキットブレーカーが遮断したときの動作: 送信せずスキップ / 復旧確認まで待機 (default: fail-fast)",
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        type=float,
+        default=0.5,
+        help="遮断する直近の失敗率 (default: 0.5)",
+    )
+    parser.add_argument(
+        "--retry-budget",
+        type=float,
+        default=0.1,
+        help="リトライ回数の上限（全リクエスト数に対する割合） (default: 0.1)",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        help="接続タイムアウト（秒） (default: 環境変数 SAAS_API_CONNECT_TIMEOUT または 5)",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        help="1アカウントあたりの上限時間（リトライを含む秒数）",
+    )
+    parser.add_argument(
+        "--lookup-url",
+        help="既存アカウントの照会URL（{username} を置換）。タイムアウト時の重複作成を防ぐ",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="照会（GET）が遅いとき、直近のp95を過ぎたら2本目を送る（作成要求には適用しない）",
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="ログを1行1件のJSONで出力",
+    )
+    parser.add_argument(
+        "--queued-logging",
+        action="store_true",
+        help="ログをバックグラウンドで書き出す（混雑時は間引き・破棄し、件数を最後に報告）",
+    )
+    parser.add_argument(
+        "--log-queue-size",
+        type=int,
+        default=10000,
+        help="--queued-logging のキュー長 (default: 10000)",
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=int,
+        default=10,
+        help="キューの混雑時に残すINFO以下のログの割合 1/N (default: 10)",
+    )
+
+    return parser.parse_args(argv)
+
+
+def parse_generate_args(argv: list[str]) -> argparse.Namespace:
+    """generate サブコマンドの引数をパース"""
+    parser = argparse.ArgumentParser(
+        prog="automatic.py generate",
+        description="負荷試験用の合成アカウントを生成（同じ seed なら同じ内容）",
+    )
+    parser.add_argument("--count", "-n", type=int, required=True, help="生成する行数")
+    parser.add_argument(
+        "--profile",
+        choices=sorted(WORKLOAD_PROFILES),
+        default="sequential",
+        help="行の分布 (default: sequential)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード (default: 0)")
+    parser.add_argument(
+        "--format",
+        choices=["csv", "jsonl"],
+        default="csv",
+        help="出力形式 (default: csv)",
+    )
+    parser.add_argument(
+        "--output", "-o",
+        type=Path,
+        default=Path("workload.csv"),
+        help="出力ファイル (default: workload.csv)",
+    )
+    parser.add_argument(
+        "--prefix",
+        default="user",
+        help="生成ユーザー名のプレフィックス (default: user)",
+    )
+    overrides = parser.add_argument_group("プロファイルの上書き")
+    overrides.add_argument("--duplicate-rate", type=float, help="重複行の割合")
+    overrides.add_argument("--invalid-email-rate", type=float, help="不正なメールアドレスの割合")
+    overrides.add_argument("--long-field-rate", type=float, help="長いフィールドの割合")
+    overrides.add_argument("--long-field-length", type=int, help="長いフィールドの文字数")
+    overrides.add_argument("--domains", help="メールのドメイン（カンマ区切り、先頭ほど多い）")
+    overrides.add_argument("--domain-skew", type=float, help="ドメインの偏り（Zipf の指数）")
+    return parser.parse_args(argv)
+
+
+def run_generate(args: argparse.Namespace) -> int:
+    """generate サブコマンドを実行"""
+    changes = {
+        name: getattr(args, name)
+        for name in (
+            "duplicate_rate", "invalid_email_rate", "long_field_rate",
+            "long_field_length", "domain_skew",
+        )
+        if getattr(args, name) is not None
+    }
+    if args.domains:
+        changes["domains"] = tuple(d.strip() for d in args.domains.split(",") if d.strip())
+    try:
+        profile = replace(WORKLOAD_PROFILES[args.profile], **changes)
+        start = time.perf_counter()
+        with _phase("generate"):
+            written = write_workload(
+                args.output, args.count, profile, args.seed, args.prefix, args.format
+            )
+    except (ValueError, OSError) as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    print(
+        f"{written}行を {args.output} に出力しました "
+        f"({elapsed:.1f}秒, {written / max(elapsed, 1e-9):,.0f}行/秒)"
+    )
+    return 0
+
+
+def parse_reconcile_args(argv: list[str]) -> argparse.Namespace:
+    """reconcile サブコマンドの引数をパース"""
+    parser = argparse.ArgumentParser(
+        prog="automatic.py reconcile",
+        description="入力CSVと結果CSVを突き合わせ、未処理・失敗の行を再実行用CSVに書き出す",
+    )
+    parser.add_argument("--input", "-i", type=Path, required=True, help="作成に使った入力CSV")
+    parser.add_argument(
+        "--results", "-r",
+        type=Path,
+        nargs="+",
+        required=True,
+        help="結果CSV（複数可。同じアカウントは成功を優先し、それ以外は後のファイルが優先）",
+    )
+    parser.add_argument(
+        "--output", "-o",
+        type=Path,
+        default=Path("retry.csv"),
+        help="再実行用CSV（--input にそのまま渡せる） (default: retry.csv)",
+    )
+    parser.add_argument("--extra-output", type=Path, help="入力にない結果行の出力先")
+    parser.add_argument(
+        "--key",
+        choices=RECONCILE_KEYS,
+        default="username",
+        help="突き合わせるキー (default: username)",
+    )
+    parser.add_argument(
+        "--memory-mb",
+        type=int,
+        default=256,
+        help="索引に使うメモリの目安。超えそうなら一時ファイルに分割する (default: 256)",
+    )
+    parser.add_argument("--temp-dir", type=Path, help="分割時の一時ディレクトリ")
+    return parser.parse_args(argv)
 
-    return parser.parse_args()
+
+def run_reconcile(args: argparse.Namespace) -> int:
+    """reconcile サブコマンドを実行"""
+    try:
+        start = time.perf_counter()
+        stats = reconcile(
+            args.input,
+            args.results,
+            args.output,
+            args.extra_output,
+            key=args.key,
+            memory_limit=args.memory_mb * 1024 * 1024,
+            temp_dir=args.temp_dir,
+        )
+    except (ValueError, OSError) as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    print(stats)
+    print(
+        f"再実行用: {stats.retry}件 -> {args.output} "
+        f"({time.perf_counter() - start:.1f}秒, 分割数 {stats.partitions})"
+    )
+    if args.extra_output:
+        print(f"入力にない結果: {stats.extra}件 -> {args.extra_output}")
+    return 0
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     """メインエントリーポイント"""
-    args = parse_args()
-    logger = setup_logging(args.verbose)
+    argv = sys.argv[1:] if argv is None else argv
+    # generate の --profile（ワークロードの種類）と区別するため、サブコマンドより前だけを見る
+    subcommands = ("generate", "reconcile")
+    end = next((i for i, arg in enumerate(argv) if arg in subcommands), len(argv))
+    profiling = _load_profiling(argv[:end])
+    if profiling is None:
+        return _dispatch(argv)
+    options, argv = profiling.split_arguments(argv, subcommands)
+    with _profiling_session(options, " ".join(["automatic.py", *argv])):
+        return _dispatch(argv)
+
+
+def _dispatch(argv: list[str]) -> int:
+    """サブコマンド、または一括作成を実行"""
+    if argv[:1] == ["generate"]:
+        return run_generate(parse_generate_args(argv[1:]))
+    if argv[:1] == ["reconcile"]:
+        return run_reconcile(parse_reconcile_args(argv[1:]))
+
+    args = parse_args(argv)
+    if not args.queued_logging:
+        return run(args, setup_logging(args.verbose, args.log_json))
+
+    logger, queued = setup_queued_logging(
+        args.verbose, args.log_json, args.log_queue_size, args.log_sample
+    )
+    try:
+        return run(args, logger)
+    finally:
+        queued.stop()
+
 
+def run(args: argparse.Namespace, logger: logging.Logger) -> int:
+    """引数に従って処理を実行"""
     try:
         # 設定読み込み
         api_config = ApiConfig.from_env()
+        api_config = replace(
+            api_config,
+            transport=args.transport or api_config.transport,
+            breaker_mode=args.breaker_mode,
+            breaker_failure_ratio=args.breaker_threshold,
+            retry_budget_ratio=args.retry_budget,
+            connect_timeout=args.connect_timeout or api_config.connect_timeout,
+            deadline=args.deadline or api_config.deadline,
+            lookup_url=args.lookup_url or api_config.lookup_url,
+            hedge=args.hedge,
+        )
         process_config = ProcessConfig(
             rate_limit_seconds=args.rate_limit,
             output_path=args.output,
         )
 
         # アカウントソース決定
+        tenants: dict[str, Iterable[AccountRequest]] = {}
+        weights: dict[str, float] = {}
         if args.count:
             accounts = generate_accounts(args.count, args.prefix)
+        elif args.tenant:
+            for name, weight, path in args.tenant:
+                if name in tenants:
+                    logger.error("テナント名が重複しています: %s", name)
+                    return 1
+                if not path.exists():
+                    logger.error("入力ファイルが見つかりません: %s", path)
+                    return 1
+                tenants[name] = load_accounts_from_csv(path, args.skip_invalid, logger)
+                weights[name] = weight
         else:
             if not args.input.exists():
                 logger.error("入力ファイルが見つかりません: %s", args.input)
                 return 1
-            accounts = load_accounts_from_csv(args.input)
+            accounts = load_accounts_from_csv(args.input, args.skip_invalid, logger)
 
-        # Dry-runモード
+        # Dry-runモード（テナント指定時は送信する順に表示）
         if args.dry_run:
             logger.info("=== Dry-run モード ===")
-            for i, acc in enumerate(accounts, 1):
-                logger.info("[%d] %s <%s>", i, acc.username, acc.email)
+            if tenants:
+                for i, (name, acc) in enumerate(FairScheduler(tenants, weights), 1):
+                    logger.info("[%d] %s: %s <%s>", i, name, acc.username, acc.email)
+            else:
+                for i, acc in enumerate(accounts, 1):
+                    logger.info("[%d] %s <%s>", i, acc.username, acc.email)
             return 0
 
-        # 処理実行
+        # 処理実行（入力は逐次読み込むため、読み込み時間は process に含まれる）
         with SaasApiClient(api_config, logger=logger) as client:
             processor = AccountProcessor(client, process_config, logger)
-            stats = processor.process(accounts)
-            processor.save_results()
+            with _phase("process"):
+                if tenants:
+                    processor.process_tenants(tenants, weights)
+                    stats = processor.stats
+                else:
+                    stats = processor.process(accounts)
+            with _phase("save"):
+                processor.save_results()
+                tenant_paths = processor.save_tenant_results()
 
         # 結果表示
         print("\n" + "=" * 50)
         print("処理結果")
         print("=" * 50)
         print(stats)
+        for name, tenant_stats in processor.tenant_stats.items():
+            print(f"  {name}: {tenant_stats}")
         print(f"出力ファイル: {args.output}")
+        for name, path in tenant_paths.items():
+            print(f"  {name}: {path}")
         print("=" * 50)
 
         return 0 if stats.failed == 0 else 1
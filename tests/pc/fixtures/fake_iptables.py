@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+テスト用の偽 iptables-save / iptables-restore
+
+iptables-save / iptables-restore という名前のシンボリックリンク経由で呼び出す。
+- FAKE_IPTABLES_STATE: ルールを保存するファイル（iptables-save 形式）
+- FAKE_IPTABLES_LOG:   呼び出し内容を1行ずつ追記するファイル
+"""
+
+import os
+import sys
+
+
+def load_state(path):
+    tables = {}
+    table = None
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line.startswith("*"):
+                    table = line[1:]
+                    tables.setdefault(table, [])
+                elif line.startswith("-A "):
+                    tables[table].append(line)
+    return tables
+
+
+def render_state(tables, only=None):
+    lines = []
+    for table, rules in tables.items():
+        if only and table != only:
+            continue
+        lines.append(f"*{table}")
+        lines += rules
+        lines.append("COMMIT")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    command = os.path.basename(sys.argv[0])
+    state_path = os.environ["FAKE_IPTABLES_STATE"]
+    with open(os.environ["FAKE_IPTABLES_LOG"], "a") as log:
+        log.write(" ".join([command] + sys.argv[1:]) + "\n")
+
+    tables = load_state(state_path)
+    if command == "iptables-save":
+        only = sys.argv[sys.argv.index("-t") + 1] if "-t" in sys.argv else None
+        sys.stdout.write(render_state(tables, only))
+        return 0
+
+    if "--noflush" not in sys.argv:
+        tables = {}
+    table = None
+    for line in sys.stdin.read().splitlines():
+        if line.startswith("*"):
+            table = line[1:]
+            tables.setdefault(table, [])
+        elif line.startswith("-A "):
+            tables[table].append(line)
+        elif line.startswith("-D "):
+            rule = "-A " + line[3:]
+            if rule not in tables[table]:
+                sys.stderr.write(f"iptables-restore: Bad rule: {line}\n")
+                return 1
+            tables[table].remove(rule)
+    with open(state_path, "w") as f:
+        f.write(render_state(tables))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,768 @@
+#!/usr/bin/env python3
+"""
+テスト: pc/network,build.py
+
+ファイル名にカンマを含むため importlib で読み込みます。
+外部コマンド・実機の状態には依存せず、記録済みの出力やダミーのファイルで検証します。
+"""
+
+import errno
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_network_build():
+    path = os.path.join(ROOT, 'pc', 'network,build.py')
+    spec = importlib.util.spec_from_file_location('network_build', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+nb = load_network_build()
+
+PROC_NET_ROUTE = (
+    "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT\n"
+    "wlan0\t00000000\t0101A8C0\t0003\t0\t0\t600\t00000000\t0\t0\t0\n"
+    "eth0\t00000000\t010200C0\t0003\t0\t0\t100\t00000000\t0\t0\t0\n"
+    "eth0\t000200C0\t00000000\t0001\t0\t0\t100\t00FFFFFF\t0\t0\t0\n"
+)
+
+
+class TestRouteParsing(unittest.TestCase):
+    """ルート情報のパース"""
+
+    def test_proc_net_route(self):
+        routes = nb.parse_proc_net_route(PROC_NET_ROUTE)
+        self.assertEqual(len(routes), 3)
+        self.assertEqual(routes[0].gateway, "192.168.1.1")
+        self.assertEqual(routes[2].destination, "192.0.2.0")
+        self.assertEqual(routes[2].mask, "255.255.255.0")
+
+    def test_ip_route_matches_proc(self):
+        """ip route の出力と /proc/net/route で同じ結果になること"""
+        ip_output = (
+            "default via 192.168.1.1 dev wlan0 metric 600\n"
+            "default via 192.0.2.1 dev eth0 metric 100\n"
+            "192.0.2.0/24 dev eth0 proto kernel scope link src 192.0.2.10 metric 100\n"
+        )
+        self.assertEqual(nb.parse_ip_route(ip_output), nb.parse_proc_net_route(PROC_NET_ROUTE))
+
+    def test_default_route_lowest_metric(self):
+        snapshot = nb.NetworkSnapshot(backend="test", routes=nb.parse_proc_net_route(PROC_NET_ROUTE))
+        self.assertEqual(snapshot.default_route.interface, "eth0")
+
+
+class TestProcfsBackend(unittest.TestCase):
+    """/sys・/proc のダミーツリーからのスナップショット"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        for iface, state, wireless in [("eth9", "up", False), ("wlan9", "down", True)]:
+            d = os.path.join(root, "sys", "class", "net", iface)
+            os.makedirs(os.path.join(d, "wireless") if wireless else d)
+            with open(os.path.join(d, "operstate"), "w") as f:
+                f.write(state + "\n")
+        os.makedirs(os.path.join(root, "proc", "net"))
+        with open(os.path.join(root, "proc", "net", "route"), "w") as f:
+            f.write(PROC_NET_ROUTE)
+        self.backend = nb.ProcfsBackend(
+            sys_root=os.path.join(root, "sys"), proc_root=os.path.join(root, "proc")
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshot(self):
+        snapshot = nb.take_snapshot(self.backend)
+        self.assertEqual(snapshot.backend, "procfs")
+        self.assertEqual(sorted(snapshot.interfaces), ["eth9", "wlan9"])
+        self.assertEqual(snapshot.interfaces["eth9"].operstate, "up")
+        self.assertTrue(snapshot.interfaces["wlan9"].wireless)
+        self.assertEqual(snapshot.default_route.gateway, "192.0.2.1")
+        for step in ("interfaces", "routes", "ssid", "total"):
+            self.assertIn(step, snapshot.timings)
+
+    def test_ssid_falls_back_to_iwgetid_only_for_unsupported_drivers(self):
+        """ioctl 非対応のインターフェースだけ iwgetid に切り替え、ioctl は再試行しないこと"""
+        interfaces = self.backend.interfaces()
+        self.addCleanup(nb._ssid_ioctl_unsupported.clear)
+        with mock.patch.object(nb.fcntl, "ioctl", side_effect=OSError(errno.ENODATA, "no data")), \
+                mock.patch.object(nb.subprocess, "check_output", return_value="office\n") as iwgetid:
+            self.assertIsNone(self.backend.ssid(interfaces))
+            iwgetid.assert_not_called()
+
+        with mock.patch.object(nb.fcntl, "ioctl", side_effect=OSError(errno.EOPNOTSUPP, "not supported")) as ioctl, \
+                mock.patch.object(nb.subprocess, "check_output", return_value="office\n") as iwgetid:
+            self.assertEqual(self.backend.ssid(interfaces), "office")
+            self.assertEqual(self.backend.ssid(interfaces), "office")
+        self.assertEqual(ioctl.call_count, 1)
+        self.assertEqual(iwgetid.call_count, 2)
+
+
+class TestFirewallManager(unittest.TestCase):
+    """偽の iptables-save / iptables-restore に対する差分適用"""
+
+    INITIAL_STATE = (
+        "*nat\n"
+        "-A POSTROUTING -o eth0 -j MASQUERADE\n"
+        "-A POSTROUTING -o eth0 -j MASQUERADE\n"
+        "-A POSTROUTING -o docker0 -j MASQUERADE\n"
+        "COMMIT\n"
+    )
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        fake = os.path.abspath(os.path.join(FIXTURES, 'fake_iptables.py'))
+        for name in ("iptables-save", "iptables-restore"):
+            os.symlink(fake, os.path.join(self.tmp.name, name))
+        self.state = os.path.join(self.tmp.name, "state")
+        self.log = os.path.join(self.tmp.name, "log")
+        with open(self.state, "w") as f:
+            f.write(self.INITIAL_STATE)
+        open(self.log, "w").close()
+
+        self._saved = (nb.IPTABLES_SAVE, nb.IPTABLES_RESTORE, os.environ.copy())
+        nb.IPTABLES_SAVE = os.path.join(self.tmp.name, "iptables-save")
+        nb.IPTABLES_RESTORE = os.path.join(self.tmp.name, "iptables-restore")
+        os.environ["FAKE_IPTABLES_STATE"] = self.state
+        os.environ["FAKE_IPTABLES_LOG"] = self.log
+
+    def tearDown(self):
+        nb.IPTABLES_SAVE, nb.IPTABLES_RESTORE, environ = self._saved
+        os.environ.clear()
+        os.environ.update(environ)
+        self.tmp.cleanup()
+
+    def calls(self):
+        with open(self.log) as f:
+            return f.read().splitlines()
+
+    def rules(self):
+        with open(self.state) as f:
+            return [line for line in f.read().splitlines() if line.startswith("-A")]
+
+    def test_untagged_rules_are_kept_by_default(self):
+        """タグのないルールは手動で追加したものと区別できないため削除しないこと"""
+        plan = nb.FirewallManager().apply(nb.desired_nat_rules())
+        self.assertEqual((len(plan.additions), len(plan.deletions)), (1, 0))
+        self.assertEqual(self.rules()[:3], self.INITIAL_STATE.splitlines()[1:4])
+
+    def test_nat_interface_from_config(self):
+        """計画したNATの手順が設定の nat_interface で適用されること"""
+        config = nb.NetworkConfig(nat_interface="wlan0")
+        state = nb.SystemState(snapshot=nb.NetworkSnapshot(backend="test"),
+                               nat_rules=nb.FirewallManager().current_rules())
+        nat = nb.plan_changes(config, state).change("nat")
+        self.assertTrue(nb.CommandExecutor().run([nat.step])["nat"].ok)
+        self.assertIn("-A POSTROUTING -o wlan0 -m comment --comment network-build -j MASQUERADE",
+                      self.rules())
+
+    def test_migrate_legacy_rules_in_one_transaction(self):
+        """移行時は重複した旧ルールを削除し、管理ルールを1件だけ追加すること"""
+        plan = nb.FirewallManager(legacy_rules=nb.LEGACY_NAT_RULES).apply(nb.desired_nat_rules())
+        self.assertEqual((len(plan.additions), len(plan.deletions)), (1, 2))
+        self.assertEqual(
+            self.rules(),
+            [
+                "-A POSTROUTING -o docker0 -j MASQUERADE",
+                "-A POSTROUTING -o eth0 -m comment --comment network-build -j MASQUERADE",
+            ],
+        )
+        self.assertEqual(self.calls(), ["iptables-save -t nat", "iptables-restore --noflush"])
+
+    def test_apply_is_idempotent(self):
+        """2回目は iptables-save だけで変更しないこと"""
+        manager = nb.FirewallManager()
+        manager.apply(nb.desired_nat_rules())
+        plan = manager.apply(nb.desired_nat_rules())
+        self.assertFalse(plan)
+        self.assertEqual(self.calls()[2:], ["iptables-save -t nat"])
+
+    def test_quoted_comment_is_recognized(self):
+        """引用符付きコメントも同じルールとして扱うこと"""
+        current = nb.parse_iptables_save(
+            '*nat\n-A POSTROUTING -o eth0 -m comment --comment "network-build" -j MASQUERADE\nCOMMIT\n'
+        )
+        self.assertFalse(nb.FirewallManager().plan(nb.desired_nat_rules(), current))
+
+    def test_stale_managed_rule_removed(self):
+        """管理ルールがあるべき状態から外れたら削除されること"""
+        current = nb.parse_iptables_save(
+            "*nat\n-A POSTROUTING -o wlan0 -m comment --comment network-build -j MASQUERADE\nCOMMIT\n"
+        )
+        plan = nb.FirewallManager().plan(nb.desired_nat_rules(), current)
+        self.assertEqual(plan.render().splitlines(), [
+            "*nat",
+            "-D POSTROUTING -o wlan0 -m comment --comment network-build -j MASQUERADE",
+            "-A POSTROUTING -o eth0 -m comment --comment network-build -j MASQUERADE",
+            "COMMIT",
+        ])
+
+
+class SocketPairSource:
+    """テスト用イベントソース（もう一方のソケットへの書き込みをイベントとみなす）"""
+
+    name = "test"
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.reader.setblocking(False)
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def drain(self):
+        try:
+            while self.reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+
+
+class TestNetworkWatcher(unittest.TestCase):
+    """イベント駆動の待機"""
+
+    def test_returns_as_soon_as_event_confirms_state(self):
+        """イベント受信後すぐに待機が終わること（再確認間隔を待たない）"""
+        source = SocketPairSource()
+        state = {"connected": False}
+
+        def connect_later():
+            time.sleep(0.05)
+            state["connected"] = True
+            source.writer.send(b"x")
+
+        with nb.NetworkWatcher(source, recheck_interval=10.0) as watcher:
+            thread = threading.Thread(target=connect_later)
+            start = time.monotonic()
+            thread.start()
+            self.assertTrue(watcher.wait_for(lambda: state["connected"], timeout=5.0))
+            elapsed = time.monotonic() - start
+            thread.join()
+        self.assertLess(elapsed, 1.0)
+
+    def test_timeout(self):
+        """条件を満たさなければタイムアウトで False を返すこと"""
+        with nb.NetworkWatcher(SocketPairSource(), recheck_interval=0.01) as watcher:
+            start = time.monotonic()
+            self.assertFalse(watcher.wait_for(lambda: False, timeout=0.1))
+            self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+
+class TestStateFiles(unittest.TestCase):
+    """状態ファイルの読み書き（シンボリックリンク・他のユーザーのファイルを信用しない）"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmp.name, "state")
+        self.path = os.path.join(self.dir, "history.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_creates_private_directory(self):
+        nb.write_state_file(self.path, '{"SSID1": {"success": 1}}')
+        self.assertEqual(os.stat(self.dir).st_mode & 0o777, 0o700)
+        self.assertEqual(nb.read_state_file(self.path), '{"SSID1": {"success": 1}}')
+        self.assertEqual(os.listdir(self.dir), ["history.json"])  # 一時ファイルが残らない
+
+    def test_symlink_is_not_followed(self):
+        target = os.path.join(self.tmp.name, "target")
+        with open(target, "w") as f:
+            f.write('{"SSID1": {"success": 100}}')
+        os.makedirs(self.dir, mode=0o700)
+        os.symlink(target, self.path)
+        self.assertIsNone(nb.read_state_file(self.path))
+        self.assertEqual(nb.ConnectionHistory(self.path).success_rate("SSID1"), 0.5)
+
+        nb.write_state_file(self.path, "{}")
+        self.assertFalse(os.path.islink(self.path))
+        with open(target) as f:
+            self.assertEqual(f.read(), '{"SSID1": {"success": 100}}')
+
+    def test_directory_writable_by_others_is_rejected(self):
+        os.makedirs(self.dir)
+        os.chmod(self.dir, 0o777)
+        with self.assertRaises(PermissionError):
+            nb.write_state_file(self.path, "{}")
+
+    @unittest.skipUnless(hasattr(os, "geteuid") and os.geteuid() == 0, "root でのみ所有者を変更できる")
+    def test_file_owned_by_other_user_is_ignored(self):
+        nb.write_state_file(self.path, '{"time": 0, "output": ""}')
+        os.chown(self.path, 65534, 65534)
+        self.assertIsNone(nb.read_state_file(self.path))
+
+
+class TestCandidateSelection(unittest.TestCase):
+    """記録済みの nmcli 出力による候補の順位付け"""
+
+    def setUp(self):
+        with open(os.path.join(FIXTURES, 'nmcli_wifi_list.txt')) as f:
+            self.output = f.read()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = nb.ConnectionHistory(os.path.join(self.tmp.name, "history.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse(self):
+        networks = nb.parse_nmcli_wifi_list(self.output)
+        self.assertEqual(len(networks), 5)  # SSID非公開のAPは除外
+        self.assertEqual(networks[3].ssid, "Cafe:Guest")
+        self.assertEqual(networks[0].band, "5GHz")
+        self.assertEqual(networks[4].security, "WPA2 WPA3")
+
+    def test_rank_by_signal_and_band(self):
+        """安全なネットワークのみを、信号強度と周波数帯で順位付けすること"""
+        ranked = nb.rank_candidates(nb.parse_nmcli_wifi_list(self.output), self.history)
+        self.assertEqual([n.ssid for _, n in ranked], ["SSID2", "SSID1", "SSID3"])
+        self.assertEqual(ranked[1][1].freq_mhz, 5180)  # 同一SSIDは最も良いAP
+
+    def test_history_affects_rank(self):
+        """接続に失敗し続けたSSIDの順位が下がること"""
+        for _ in range(5):
+            self.history.record("SSID2", False)
+            self.history.record("SSID1", True)
+        ranked = nb.rank_candidates(nb.parse_nmcli_wifi_list(self.output), self.history)
+        self.assertEqual(ranked[0][1].ssid, "SSID1")
+        reloaded = nb.ConnectionHistory(os.path.join(self.tmp.name, "history.json"))
+        self.assertLess(reloaded.success_rate("SSID2"), 0.5)
+
+    def test_connect_timeout_is_recorded_as_failure(self):
+        """nmcli が応答しなければタイムアウトで打ち切り、失敗として履歴に残して次の候補へ進むこと"""
+        candidates = [nb.WifiNetwork("SSID2", 80, 5180), nb.WifiNetwork("SSID1", 60, 2412)]
+        errors = [subprocess.TimeoutExpired(["nmcli"], nb.COMMAND_TIMEOUT), FileNotFoundError("nmcli")]
+        with mock.patch.object(nb.subprocess, "run", side_effect=errors) as run:
+            connected = nb.connect_to_safe_network(candidates, watcher=mock.Mock(),
+                                                   history=self.history, backend=FakeBackend())
+        self.assertFalse(connected)
+        self.assertEqual(run.call_args.kwargs["timeout"], nb.COMMAND_TIMEOUT)
+        self.assertLess(self.history.success_rate("SSID2"), 0.5)
+        self.assertLess(self.history.success_rate("SSID1"), 0.5)
+
+    def test_scan_cache(self):
+        """TTL以内はキャッシュを使い nmcli を呼ばないこと"""
+        import json
+        from unittest import mock
+
+        cache = os.path.join(self.tmp.name, "scan.json")
+        with open(cache, "w") as f:
+            json.dump({"time": time.time(), "output": self.output}, f)
+        with mock.patch.object(nb.subprocess, "run") as run:
+            networks = nb.scan_networks(cache, ttl=30.0)
+        run.assert_not_called()
+        self.assertEqual(len(networks), 5)
+
+
+class FakeBackend:
+    """固定の状態を返すバックエンド"""
+
+    name = "fake"
+
+    def __init__(self, ssid="SSID1", gateway=None):
+        self.ssid_value = ssid
+        self.gateway = gateway or nb.GATEWAY_IP
+
+    def interfaces(self):
+        return {"wlan0": nb.InterfaceInfo("wlan0", ["192.168.1.10"], "up", True)}
+
+    def routes(self):
+        return [nb.Route("wlan0", "0.0.0.0", self.gateway, "0.0.0.0")]
+
+    def ssid(self, interfaces):
+        return self.ssid_value
+
+
+class FakeFirewall:
+    """管理ルールが設定済みのファイアウォール"""
+
+    def current_rules(self):
+        return nb.desired_nat_rules()
+
+
+class FakeSystem:
+    """CommandExecutor と nmcli の代わり（実行したコマンドを記録し、優先度の変更を反映する）"""
+
+    def __init__(self, fail=(), backend=None):
+        self.backend = backend
+        self.commands = []
+        self.priorities = {}
+        self.fail = set(fail)
+
+    def run(self, steps):
+        results = {}
+        for step in steps:
+            if any(not results[name].ok for name in step.depends_on):
+                results[step.name] = nb.StepResult(step.name, skipped=True)
+                continue
+            self.commands.append(step.argv)
+            if step.name in self.fail:
+                results[step.name] = nb.StepResult(step.name, returncode=1)
+                continue
+            if step.argv[:3] == ["nmcli", "connection", "modify"]:
+                self.priorities[step.argv[3]] = int(step.argv[5])
+            if step.argv[:4] == ["ip", "route", "replace", "default"] and self.backend is not None:
+                self.backend.gateway = step.argv[5]
+            results[step.name] = nb.StepResult(step.name, returncode=0, elapsed=0.001)
+        return results
+
+    def subprocess_run(self, cmd, **kwargs):
+        """nmcli -t -f NAME,AUTOCONNECT-PRIORITY connection show"""
+        output = "".join(f"{name}:{priority}\n" for name, priority in self.priorities.items())
+        return subprocess.CompletedProcess(cmd, 0, stdout=output)
+
+
+class TestReconciler(unittest.TestCase):
+    """デーモンモードの調整ループ（capture_state → plan_changes → apply_plan）"""
+
+    def setUp(self):
+        self.system = FakeSystem()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.config = nb.NetworkConfig(profile_export_path=os.path.join(tmp.name, "export", "profile.xml"))
+        for patcher in (
+            mock.patch.object(nb.subprocess, "run", side_effect=self.system.subprocess_run),
+            mock.patch.object(nb, "EXPORT_MARKER_PATH", os.path.join(tmp.name, "state", "exported.json")),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def reconciler(self, backend=None, system=None):
+        return nb.Reconciler(backend or FakeBackend(), FakeFirewall(), self.config,
+                             executor=system or self.system)
+
+    def test_steady_state_does_nothing(self):
+        """適用後、ずれがなければ外部コマンドを実行しないこと"""
+        reconciler = self.reconciler()
+        first = reconciler.run_once()
+        self.assertEqual(first["steps"]["priority"]["action"], "applied")
+        self.assertEqual(first["steps"]["profile"]["action"], "applied")
+        self.assertEqual(len(self.system.commands), 2)
+
+        second = reconciler.run_once()
+        actions = {name: step["action"] for name, step in second["steps"].items()}
+        self.assertEqual(actions, {
+            "snapshot": "read", "wifi": "noop", "nat": "noop",
+            "routing": "noop", "priority": "noop", "profile": "noop",
+        })
+        self.assertEqual(len(self.system.commands), 2)
+        self.assertIn("duration_ms", second["steps"]["nat"])
+
+    def test_priority_drift_is_repaired(self):
+        """外部から優先度を変更されたら、再適用の間隔を待たずに設定し直すこと"""
+        reconciler = self.reconciler()
+        reconciler.run_once()
+        self.system.priorities["SSID1"] = 0
+        status = reconciler.run_once()
+        self.assertEqual(status["steps"]["priority"]["action"], "applied")
+        self.assertEqual(status["steps"]["profile"]["action"], "noop")
+
+    def test_route_drift_is_repaired(self):
+        """デフォルトゲートウェイがずれていれば設定し直すこと"""
+        backend = FakeBackend(gateway="10.0.0.1")
+        self.system.backend = backend
+        reconciler = self.reconciler(backend)
+        status = reconciler.run_once()
+        self.assertEqual(status["steps"]["routing"]["action"], "applied")
+        self.assertIn(["ip", "route", "replace", "default", "via", nb.GATEWAY_IP], self.system.commands)
+        # 既存のデフォルトルートを置き換えるので、次のサイクルでは計画されない
+        status = reconciler.run_once()
+        self.assertEqual(status["steps"]["routing"]["action"], "noop")
+        self.assertEqual(status["default_gateway"], nb.GATEWAY_IP)
+
+    def test_failed_steps_are_reported(self):
+        """失敗した手順と、それに依存して実行しなかった手順が状態に残ること"""
+        system = FakeSystem(fail={"priority"})
+        status = self.reconciler(system=system).run_once()
+        self.assertEqual(status["steps"]["priority"]["action"], "failed")
+        self.assertEqual(status["steps"]["profile"]["action"], "skipped")
+        self.assertIsNone(nb.read_exported_ssid(self.config))
+
+    def test_daemon_writes_status_file(self):
+        """各サイクルの結果が状態ファイルに書き出されること"""
+        import json
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "status.json")
+            nb.run_daemon(self.reconciler(), interval=0.01, jitter=0.5, status_path=path, max_cycles=2)
+            with open(path) as f:
+                status = json.load(f)
+            self.assertEqual(os.listdir(tmp), ["status.json"])  # 一時ファイルが残らない
+        self.assertEqual(status["cycle"], 2)
+        self.assertEqual(status["ssid"], "SSID1")
+        self.assertIn("next_run_in_s", status)
+
+
+def sleep_command(seconds, code=0):
+    return [sys.executable, "-c", f"import sys, time; time.sleep({seconds}); sys.exit({code})"]
+
+
+class TestCommandExecutor(unittest.TestCase):
+    """依存関係・タイムアウト付きのコマンド実行"""
+
+    def test_independent_steps_run_concurrently(self):
+        start = time.monotonic()
+        results = nb.CommandExecutor().run([
+            nb.CommandStep("a", sleep_command(0.3)),
+            nb.CommandStep("b", sleep_command(0.3)),
+        ])
+        self.assertLess(time.monotonic() - start, 0.55)
+        self.assertTrue(all(r.ok for r in results.values()))
+
+    def test_dependencies_are_ordered(self):
+        results = nb.CommandExecutor().run([
+            nb.CommandStep("second", sleep_command(0), depends_on=("first",)),
+            nb.CommandStep("first", sleep_command(0.2)),
+        ])
+        first, second = results["first"], results["second"]
+        self.assertGreaterEqual(second.started, first.started + first.elapsed)
+
+    def test_timeout_kills_command(self):
+        start = time.monotonic()
+        result = nb.CommandExecutor().run([nb.CommandStep("hang", sleep_command(30), timeout=0.2)])["hang"]
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.ok)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_failed_dependency_skips_step(self):
+        results = nb.CommandExecutor().run([
+            nb.CommandStep("fail", sleep_command(0, code=3)),
+            nb.CommandStep("needs", sleep_command(0), depends_on=("fail",)),
+            nb.CommandStep("after", sleep_command(0), depends_on=("fail",), requires_success=False),
+        ])
+        self.assertEqual(results["fail"].returncode, 3)
+        self.assertTrue(results["needs"].skipped)
+        self.assertTrue(results["after"].ok)
+
+    def test_stdin_input(self):
+        cmd = [sys.executable, "-c", "import sys; sys.stdout.write(sys.stdin.read().upper())"]
+        result = nb.CommandExecutor().run([nb.CommandStep("cat", cmd, input="*nat\n")])["cat"]
+        self.assertEqual(result.stdout, "*NAT\n")
+
+    def test_invalid_graph(self):
+        with self.assertRaises(ValueError):
+            nb.CommandExecutor().run([
+                nb.CommandStep("a", sleep_command(0), depends_on=("b",)),
+                nb.CommandStep("b", sleep_command(0), depends_on=("a",)),
+            ])
+        with self.assertRaises(ValueError):
+            nb.CommandExecutor().run([nb.CommandStep("a", sleep_command(0), depends_on=("x",))])
+
+    def test_missing_binary(self):
+        result = nb.CommandExecutor().run([nb.CommandStep("x", ["/nonexistent/cmd"])])["x"]
+        self.assertIsNone(result.returncode)
+
+    def test_missing_binary_does_not_raise_for_dependents(self):
+        results = nb.CommandExecutor().run([
+            nb.CommandStep("x", ["/nonexistent/cmd"]),
+            nb.CommandStep("y", sleep_command(0), depends_on=("x",)),
+        ])
+        self.assertTrue(results["y"].skipped)
+
+
+def read_fixture(*parts):
+    with open(os.path.join(FIXTURES, *parts)) as f:
+        return f.read()
+
+
+class TestConfig(unittest.TestCase):
+    """設定ファイルの読み込み"""
+
+    def test_load(self):
+        config = nb.load_config(os.path.join(FIXTURES, 'state', 'network_build.json'))
+        self.assertEqual(config.safe_networks, ("office-5G", "office:guest"))
+        self.assertEqual(config.gateway_ip, "192.168.1.254")
+        self.assertEqual(nb.routing_command(config),
+                         ["ip", "route", "replace", "default", "via", "192.168.1.254"])
+        self.assertIn("wlan0", nb.desired_nat_rules(config)[0].spec)
+
+    def test_partial_config_uses_defaults(self):
+        config = nb.NetworkConfig.from_dict({"gateway_ip": "10.0.0.1"})
+        self.assertEqual(config.safe_networks, tuple(nb.SAFE_NETWORKS))
+        self.assertEqual(config.nat_interface, "eth0")
+
+    def test_missing_default_file_uses_defaults(self):
+        from unittest import mock
+
+        with mock.patch.object(nb, "CONFIG_PATH", "/nonexistent/network-build.json"):
+            self.assertEqual(nb.load_config(), nb.NetworkConfig())
+        with self.assertRaises(OSError):
+            nb.load_config("/nonexistent/network-build.json")
+
+    def test_invalid(self):
+        for data in ([], {"unknown": 1}, {"safe_networks": []}, {"safe_networks": "SSID1"},
+                     {"gateway_ip": "gateway"}, {"priority": "1"}, {"priority": True},
+                     {"nat_interface": ""}):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                nb.NetworkConfig.from_dict(data)
+
+    def test_broken_json(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            f.write("{")
+            f.flush()
+            with self.assertRaises(ValueError):
+                nb.load_config(f.name)
+
+
+class TestPlanner(unittest.TestCase):
+    """記録済みの状態に対する変更計画"""
+
+    def setUp(self):
+        self.config = nb.load_config(os.path.join(FIXTURES, 'state', 'network_build.json'))
+
+    def recorded_state(self, ssid="office-5G", exported_ssid=None):
+        snapshot = nb.NetworkSnapshot(
+            backend="fixture",
+            interfaces={"wlan0": nb.InterfaceInfo("wlan0", ["192.168.1.10"], "up", True)},
+            routes=nb.parse_proc_net_route(read_fixture('state', 'proc_net_route')),
+            ssid=ssid,
+        )
+        return nb.SystemState(
+            snapshot=snapshot,
+            nat_rules=nb.parse_iptables_save(read_fixture('state', 'iptables_save_nat.txt')),
+            priorities=nb.parse_nmcli_priorities(read_fixture('state', 'nmcli_connections.txt')),
+            exported_ssid=exported_ssid,
+        )
+
+    def converged_state(self):
+        """計画どおりに適用した後の状態"""
+        state = self.recorded_state(exported_ssid="office-5G")
+        state.snapshot.routes[0].gateway = self.config.gateway_ip
+        state.nat_rules = [r for r in state.nat_rules if "docker0" in r.spec] + nb.desired_nat_rules(self.config)
+        state.priorities[self.config.priority_connection] = self.config.priority
+        return state
+
+    def test_parse_priorities(self):
+        priorities = nb.parse_nmcli_priorities(read_fixture('state', 'nmcli_connections.txt'))
+        self.assertEqual(priorities["office:guest"], 0)
+        self.assertEqual(priorities["Wired connection 1"], -999)
+
+    def test_plan_from_recorded_state(self):
+        from unittest import mock
+
+        with mock.patch.object(nb.subprocess, "run") as run, \
+                mock.patch.object(nb.subprocess, "check_output") as check_output:
+            plan = nb.plan_changes(self.config, self.recorded_state())
+        run.assert_not_called()
+        check_output.assert_not_called()
+
+        self.assertEqual([c.name for c in plan.changes], ["nat", "routing", "priority", "profile"])
+        self.assertNotIn("-D POSTROUTING -o eth0 -j MASQUERADE", plan.change("nat").step.input)
+        plan = nb.plan_changes(self.config, self.recorded_state(), nb.LEGACY_NAT_RULES)
+        nat = plan.change("nat").step.input
+        self.assertEqual(nat.count("-D POSTROUTING -o eth0 -j MASQUERADE"), 2)
+        self.assertIn("-A POSTROUTING -o wlan0 -m comment --comment network-build -j MASQUERADE", nat)
+        self.assertNotIn("docker0", nat)
+        self.assertEqual(plan.change("routing").step.argv[-1], "192.168.1.254")
+        self.assertEqual(plan.change("priority").step.argv,
+                         ["nmcli", "connection", "modify", "office-5G", "connection.priority", "10"])
+        self.assertEqual(plan.change("profile").step.depends_on, ("priority",))
+        self.assertIn("$ ip route replace default via 192.168.1.254", plan.render())
+
+    def test_converged_state_has_empty_plan(self):
+        plan = nb.plan_changes(self.config, self.converged_state())
+        self.assertFalse(plan)
+        self.assertEqual(plan.steps(), [])
+        self.assertIn("変更はありません", plan.render())
+
+    def test_unsafe_network_plans_wifi(self):
+        plan = nb.plan_changes(self.config, self.recorded_state(ssid="cafe-free"))
+        self.assertEqual(plan.changes[0].name, "wifi")
+        self.assertIsNone(plan.changes[0].step)
+
+    def test_unknown_state_is_reported(self):
+        state = self.converged_state()
+        state.nat_rules = None
+        state.priorities = None
+        plan = nb.plan_changes(self.config, state)
+        self.assertEqual([c.name for c in plan.changes], ["priority"])
+        self.assertEqual(len(plan.warnings), 1)
+
+    def test_plan_is_fast(self):
+        state = self.recorded_state()
+        start = time.perf_counter()
+        for _ in range(100):
+            nb.plan_changes(self.config, state)
+        self.assertLess((time.perf_counter() - start) / 100, 0.01)
+
+    def test_apply_runs_only_the_diff(self):
+        """計画に含まれるコマンドだけが実行され、保存したSSIDが記録されること"""
+        class RecordingExecutor:
+            def run(self, steps):
+                self.steps = steps
+                return {s.name: nb.StepResult(s.name, returncode=0) for s in steps}
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(nb, "EXPORT_MARKER_PATH", os.path.join(tmp, "state", "exported.json")):
+            config = nb.NetworkConfig.from_dict({
+                "gateway_ip": "192.168.1.254",
+                "profile_export_path": os.path.join(tmp, "profile.xml"),
+            })
+            state = self.recorded_state(ssid="SSID1")
+            state.nat_rules = nb.desired_nat_rules(config)
+            state.priorities = {"SSID1": 1}
+            executor = RecordingExecutor()
+            plan = nb.plan_changes(config, state)
+            nb.apply_plan(plan, config, executor=executor)
+            self.assertEqual([s.name for s in executor.steps], ["routing", "profile"])
+            self.assertEqual(nb.read_exported_ssid(config), "SSID1")
+
+            state.exported_ssid = nb.read_exported_ssid(config)
+            self.assertNotIn("profile", [c.name for c in nb.plan_changes(config, state).changes])
+
+            # 保存先を変えたら保存し直す
+            moved = nb.NetworkConfig(gateway_ip="192.168.1.254", profile_export_path=os.path.join(tmp, "other.xml"))
+            self.assertIsNone(nb.read_exported_ssid(moved))
+
+    def test_export_directory_is_created(self):
+        """保存先のディレクトリがまだなくても、プロファイルの保存前に作成されること"""
+        class ExportingExecutor:
+            """nmcli connection export と同じく、ディレクトリがなければ失敗する"""
+            def run(self, steps):
+                results = {}
+                for step in steps:
+                    code = 0
+                    if step.name == "profile":
+                        try:
+                            with open(step.argv[-1], "w") as f:
+                                f.write("<profile/>")
+                        except OSError:
+                            code = 1
+                    results[step.name] = nb.StepResult(step.name, returncode=code)
+                return results
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(nb, "EXPORT_MARKER_PATH", os.path.join(tmp, "marker", "exported.json")):
+            state_dir = os.path.join(tmp, "network-build")
+            config = nb.NetworkConfig(gateway_ip="192.168.1.254",
+                                      profile_export_path=os.path.join(state_dir, "current_network.xml"))
+            state = self.recorded_state(ssid="SSID1")
+            state.nat_rules = nb.desired_nat_rules(config)
+            state.priorities = {"SSID1": 1}
+            results = nb.apply_plan(nb.plan_changes(config, state), config, executor=ExportingExecutor())
+            self.assertTrue(results["profile"].ok)
+            self.assertTrue(os.path.isfile(config.profile_export_path))
+            self.assertEqual(os.stat(state_dir).st_mode & 0o777, 0o700)
+            self.assertEqual(nb.read_exported_ssid(config), "SSID1")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
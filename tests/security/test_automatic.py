@@ -0,0 +1,871 @@
+#!/usr/bin/env python3
+"""
+テスト: security/automatic.py（SaaSアカウント一括作成ツール）
+
+API を呼ばずに確認できる部分（ロギングなど）を対象とする。
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SECURITY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'security'))
+sys.path.insert(0, SECURITY_DIR)
+import automatic
+
+# `import automatic` にかける時間の上限（ミリ秒）。遅いCIでは環境変数で緩める
+IMPORT_BUDGET_MS = float(os.getenv("AUTOMATIC_IMPORT_BUDGET_MS", "100"))
+# 起動時に読み込んではいけないモジュール（HTTPスタック）
+DEFERRED_MODULES = {"requests", "urllib3", "http.client", "ssl", "random"}
+
+
+class SlowHandler(logging.Handler):
+    """遅い端末・ログ収集先を模したハンドラー"""
+
+    def __init__(self, delay=0.0, gate=None):
+        super().__init__()
+        self.delay = delay
+        self.gate = gate
+        self.lines = []
+        self.setFormatter(logging.Formatter(automatic.LOG_FORMAT))
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        self.lines.append(self.format(record))
+
+
+def make_logger(handler):
+    logger = logging.getLogger(f"test_automatic.{id(handler)}")
+    logger.handlers = [handler]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger
+
+
+class TestQueuedLogging(unittest.TestCase):
+    """キュー経由のロギング"""
+
+    def test_all_lines_written_when_queue_has_room(self):
+        target = SlowHandler()
+        queued = automatic.QueuedLogging(target, queue_size=1000)
+        queued.start()
+        logger = make_logger(queued.handler)
+        for i in range(100):
+            logger.info("処理中 [%d/100]: user%d", i, i)
+        self.assertEqual(queued.stop(), 0)
+        self.assertEqual(len(target.lines), 101)  # 最後の1行は破棄件数の報告
+        self.assertTrue(target.lines[0].endswith("[INFO] 処理中 [0/100]: user0"))
+        self.assertIn("ログ出力の破棄: 0 行", target.lines[-1])
+
+    def test_slow_writer_does_not_block_caller(self):
+        """書き出し先が詰まっていても呼び出し側は待たず、失った行数が数えられること"""
+        gate = threading.Event()
+        target = SlowHandler(gate=gate)
+        queued = automatic.QueuedLogging(target, queue_size=50, sample_every=5)
+        queued.start()
+        logger = make_logger(queued.handler)
+
+        start = time.perf_counter()
+        for i in range(1000):
+            logger.info("✓ 作成成功: user%d", i)
+        elapsed = time.perf_counter() - start
+        gate.set()
+        lost = queued.stop()
+
+        self.assertLess(elapsed, 1.0)
+        self.assertGreater(queued.handler.sampled_out, 0)
+        self.assertEqual(lost, queued.handler.dropped + queued.handler.sampled_out)
+        self.assertEqual(len(target.lines) - 1 + lost, 1000)
+        self.assertIn(f"ログ出力の破棄: {lost} 行", target.lines[-1])
+
+    def test_warnings_are_not_sampled(self):
+        gate = threading.Event()
+        target = SlowHandler(gate=gate)
+        queued = automatic.QueuedLogging(target, queue_size=100, sample_every=1000)
+        queued.start()
+        logger = make_logger(queued.handler)
+        for i in range(60):
+            logger.info("info %d", i)
+        for i in range(20):
+            logger.warning("✗ 作成失敗: user%d", i)
+        gate.set()
+        queued.stop()
+        self.assertEqual(sum("[WARNING] ✗" in line for line in target.lines), 20)
+
+
+class TestJsonFormatter(unittest.TestCase):
+    """構造化ログ出力"""
+
+    def test_format(self):
+        formatter = automatic.JsonFormatter()
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord("saas", logging.ERROR, __file__, 1,
+                                       "予期しないエラー (%s): %s", ("user1", "boom"),
+                                       sys.exc_info())
+        entry = json.loads(formatter.format(record))
+        self.assertEqual(entry["level"], "ERROR")
+        self.assertEqual(entry["message"], "予期しないエラー (user1): boom")
+        self.assertIn("ValueError: boom", entry["exception"])
+
+
+def parse_importtime(stderr):
+    """-X importtime の出力を (モジュール名, 階層, 累積マイクロ秒) のリストにする"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((name.strip(), depth, int(cumulative)))
+    return entries
+
+
+def subtree(entries, module):
+    """module とその読み込み中に読み込まれたモジュール（importtime は子が先に出力される）"""
+    for i, (name, depth, cumulative) in enumerate(entries):
+        if name == module and depth == 0:
+            start = i
+            while start > 0 and entries[start - 1][1] > 0:
+                start -= 1
+            return cumulative, {n for n, _, _ in entries[start:i + 1]}
+    raise AssertionError(f"{module} の importtime が見つかりません")
+
+
+def run_importtime(*args):
+    env = dict(os.environ, SAAS_API_URL="http://127.0.0.1:9/accounts")
+    # バイトコードのキャッシュを使う通常の起動を測る（毎回のコンパイル時間を含めない）
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=SECURITY_DIR, env=env, capture_output=True, text=True, timeout=60,
+    )
+    return proc, parse_importtime(proc.stderr)
+
+
+class TestStartupTime(unittest.TestCase):
+    """起動時間（-X importtime で計測）"""
+
+    def test_http_stack_is_not_imported_at_startup(self):
+        _, entries = run_importtime("-c", "import automatic")
+        _, modules = subtree(entries, "automatic")
+        self.assertFalse(modules & DEFERRED_MODULES, sorted(modules & DEFERRED_MODULES))
+
+    def test_dry_run_does_not_import_http_stack(self):
+        proc, entries = run_importtime("automatic.py", "--count", "2", "--dry-run")
+        self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+        imported = {name for name, _, _ in entries}
+        self.assertFalse(imported & {"requests", "urllib3"})
+
+    def test_import_time_budget(self):
+        """3回のうち最速の累積時間が上限以内であること"""
+        best = min(subtree(run_importtime("-c", "import automatic")[1], "automatic")[0]
+                   for _ in range(3))
+        self.assertLess(best / 1000, IMPORT_BUDGET_MS,
+                        f"import automatic に {best / 1000:.1f}ms かかりました（上限 {IMPORT_BUDGET_MS}ms）")
+
+    def test_client_loads_http_stack(self):
+        config = automatic.ApiConfig(base_url="http://127.0.0.1:9/accounts")
+        with automatic.SaasApiClient(config) as client:
+            self.assertIn("requests", sys.modules)
+            self.assertIsInstance(client._transport, automatic.RequestsTransport)
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """ユーザー名の接頭辞で応答を切り替えるスタブAPI（keep-alive対応）"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # ヘッダーと本文を別々に書くため（遅延ACKとの干渉を避ける）
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        username = json.loads(body)["username"]
+        self.server.bodies.append(body)
+        attempts = self.server.attempts
+        attempts[username] = attempts.get(username, 0) + 1
+
+        if self.server.outage:
+            status, data = 503, b""
+        elif username.startswith(("ok", "slow")):
+            record = {"id": f"acc-{username}"}
+            self.server.accounts[username] = record
+            if username.startswith("slow"):
+                time.sleep(0.5)  # 作成は完了しているが応答が遅い
+            status, data = 201, json.dumps(record).encode()
+        elif username.startswith("alt"):
+            status, data = 200, b'{"account_id": "alt-1"}'
+        elif username.startswith("dup"):
+            status, data = 409, b'{"message": "already exists"}'
+        elif username.startswith("err"):
+            status, data = 422, b'{"code": 1}'
+        elif username.startswith("html"):
+            status, data = 400, b"<html>bad request</html>"
+        elif username.startswith("list"):
+            status, data = 400, b"[1, 2]"
+        elif username.startswith("text"):
+            status, data = 200, b"created"
+        elif username.startswith("flaky") and attempts[username] == 1:
+            status, data = 503, b""
+        elif username.startswith("flaky"):
+            status, data = 201, b'{"id": "flaky-1"}'
+        else:  # down*
+            status, data = 503, b""
+
+        self.respond(status, data)
+
+    def do_GET(self):
+        username = self.path.rsplit("/", 1)[-1]
+        self.server.lookups.append(username)
+        if username.startswith("hedge") and self.server.lookups.count(username) == 1:
+            time.sleep(1.0)  # 1本目だけ遅い
+        record = self.server.accounts.get(username)
+        if record is None:
+            self.respond(404, b'{"message": "not found"}')
+        else:
+            self.respond(200, json.dumps(record).encode())
+
+    def respond(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *_):
+        pass
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # タイムアウトしたクライアントが切断したときの BrokenPipe は想定内
+
+
+class StubApiServer:
+    """ローカルで起動するスタブAPIサーバー"""
+
+    def __enter__(self):
+        self.httpd = QuietHTTPServer(("127.0.0.1", 0), StubApiHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.bodies = []
+        self.httpd.attempts = {}
+        self.httpd.outage = False
+        self.httpd.accounts = {}
+        self.httpd.lookups = []
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/v1/accounts"
+        self.lookup_url = self.url + "/{username}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *_):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def client(self, transport, **overrides):
+        options = dict(timeout=5, backoff_factor=0)
+        options.update(overrides)
+        config = automatic.ApiConfig(base_url=self.url, transport=transport, **options)
+        return automatic.SaasApiClient(config, logger=logging.getLogger("test_automatic.stub"))
+
+
+def account(username):
+    return automatic.AccountRequest(username, f"{username}@example.com", "SecurePass1!@#")
+
+
+class TestTransports(unittest.TestCase):
+    """requests / http.client のどちらでも AccountResult が同じになること"""
+
+    USERNAMES = ["ok1", "alt1", "dup1", "err1", "html1", "list1", "text1", "flaky1", "down1"]
+
+    def run_all(self, server, transport):
+        server.httpd.bodies, server.httpd.attempts = [], {}
+        with server.client(transport, max_retries=2) as client:
+            results = {name: client.create_account(account(name)) for name in self.USERNAMES}
+        return results, server.httpd.bodies, server.httpd.attempts
+
+    def test_results_are_identical(self):
+        with StubApiServer() as server:
+            lean, lean_bodies, lean_attempts = self.run_all(server, "http.client")
+            full, full_bodies, full_attempts = self.run_all(server, "requests")
+
+        self.assertEqual(lean_bodies, full_bodies)
+        self.assertEqual(lean_attempts, full_attempts)
+        for name in self.USERNAMES:
+            with self.subTest(username=name):
+                self.assertEqual(lean[name].status, full[name].status)
+                self.assertEqual(lean[name].account_id, full[name].account_id)
+                self.assertEqual(lean[name].error_message, full[name].error_message)
+
+        self.assertEqual(lean["ok1"].account_id, "acc-ok1")
+        self.assertEqual(lean["dup1"].error_message, "already exists")
+        self.assertTrue(lean["err1"].error_message.startswith("422 Client Error: Unprocessable Entity for url: "))
+        self.assertEqual(lean["html1"].error_message, "HTTP 400")
+        self.assertEqual(lean["flaky1"].status, automatic.AccountStatus.SUCCESS)
+        self.assertEqual(lean_attempts["down1"], 3)
+        self.assertIn("Max retries exceeded", lean["down1"].error_message)
+
+    def test_payload_matches_json_dumps(self):
+        template = automatic.PayloadTemplate("username", "email", "password")
+        values = ("用户\"x", "a\\b@example.com", "p\u00e9\n\t")
+        expected = json.dumps(dict(zip(("username", "email", "password"), values))).encode()
+        self.assertEqual(template.encode(*values), expected)
+
+    def test_connection_refused(self):
+        with StubApiServer() as server:
+            url = server.url
+        config = automatic.ApiConfig(base_url=url, timeout=1, max_retries=0,
+                                     backoff_factor=0, transport="http.client")
+        with automatic.SaasApiClient(config) as client:
+            result = client.create_account(account("ok1"))
+        self.assertEqual(result.status, automatic.AccountStatus.FAILED)
+        self.assertIn("ConnectionRefusedError", result.error_message)
+
+    def test_unknown_transport(self):
+        with self.assertRaises(ValueError):
+            automatic.create_transport(automatic.ApiConfig(base_url="http://x", transport="curl"))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """サーキットブレーカーの状態遷移"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = automatic.CircuitBreaker(
+            failure_ratio=0.5, window=10, min_calls=4, open_seconds=30, clock=self.clock
+        )
+
+    def test_opens_at_failure_ratio(self):
+        for success in (True, False, True):
+            self.breaker.record(success)
+        self.assertEqual(self.breaker.state, automatic.CircuitState.CLOSED)  # 件数不足
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, automatic.CircuitState.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.seconds_until_probe(), 30)
+
+    def test_half_open_allows_one_probe(self):
+        for _ in range(4):
+            self.breaker.record(False)
+        self.clock.now = 30
+        self.assertEqual(self.breaker.state, automatic.CircuitState.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  # 試験送信中は他を通さない
+
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, automatic.CircuitState.OPEN)
+        self.assertEqual(self.breaker.trips, 2)
+
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, automatic.CircuitState.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+
+class TestRetryBudget(unittest.TestCase):
+
+    def test_retries_limited_to_ratio_of_requests(self):
+        budget = automatic.RetryBudget(ratio=0.1, min_retries=2)
+        granted = 0
+        for _ in range(100):
+            budget.record_request()
+            granted += budget.try_acquire() + budget.try_acquire()
+        self.assertEqual(granted, 12)  # 2 + 100 * 0.1
+        self.assertEqual(budget.denied, 200 - 12)
+
+
+class TestResilience(unittest.TestCase):
+    """障害時にリトライで負荷を増やさず、早く失敗・復旧すること"""
+
+    def client(self, server, **overrides):
+        options = dict(max_retries=3, breaker_window=10, breaker_min_calls=5,
+                       breaker_open_seconds=0.2, retry_budget_min=2)
+        options.update(overrides)
+        return server.client("http.client", **options)
+
+    def test_outage_fails_fast(self):
+        with StubApiServer() as server, self.client(server, breaker_open_seconds=60) as client:
+            server.httpd.outage = True
+            results = [client.create_account(account(f"ok{i}")) for i in range(50)]
+            sent = sum(server.httpd.attempts.values())
+
+        statuses = [r.status for r in results]
+        self.assertLessEqual(sent, 10)
+        self.assertEqual(statuses[-1], automatic.AccountStatus.SKIPPED)
+        self.assertGreaterEqual(statuses.count(automatic.AccountStatus.SKIPPED), 45)
+        self.assertEqual(client.breaker.trips, 1)
+
+    def test_retry_budget_caps_extra_load(self):
+        """ブレーカーが作動しない程度の障害でもリトライは予算内に収まること"""
+        with StubApiServer() as server, self.client(server, breaker_failure_ratio=1.1) as client:
+            server.httpd.outage = True
+            for i in range(40):
+                client.create_account(account(f"ok{i}"))
+            sent = sum(server.httpd.attempts.values())
+        self.assertEqual(sent, 40 + 2 + 4)  # 最低2回 + 40件の10%
+        self.assertEqual(client.retry_budget.retries, 6)
+
+    def test_pause_mode_waits_for_recovery(self):
+        with StubApiServer() as server, self.client(server, breaker_mode="pause") as client:
+            server.httpd.outage = True
+            for i in range(5):
+                client.create_account(account(f"ok{i}"))
+            self.assertEqual(client.breaker.state, automatic.CircuitState.OPEN)
+            server.httpd.outage = False
+            start = time.monotonic()
+            result = client.create_account(account("ok-after"))
+        self.assertEqual(result.status, automatic.AccountStatus.SUCCESS)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertEqual(client.breaker.state, automatic.CircuitState.CLOSED)
+
+    def test_pause_mode_respects_deadline(self):
+        """遮断中の待機も1アカウントあたりの期限を超えないこと"""
+        with StubApiServer() as server, self.client(server, breaker_mode="pause",
+                                                    breaker_open_seconds=60, deadline=0.3) as client:
+            server.httpd.outage = True
+            for i in range(5):
+                client.create_account(account(f"ok{i}"))
+            self.assertEqual(client.breaker.state, automatic.CircuitState.OPEN)
+            start = time.monotonic()
+            result = client.create_account(account("ok-after"))
+            elapsed = time.monotonic() - start
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(result.status, automatic.AccountStatus.FAILED)
+        self.assertIn("期限", result.error_message)
+
+    def test_processor_does_not_sleep_for_skipped(self):
+        with StubApiServer() as server, self.client(server, breaker_open_seconds=60) as client:
+            server.httpd.outage = True
+            processor = automatic.AccountProcessor(
+                client, automatic.ProcessConfig(rate_limit_seconds=0.05),
+                logging.getLogger("test_automatic.stub"),
+            )
+            start = time.monotonic()
+            stats = processor.process(account(f"ok{i}") for i in range(60))
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertGreater(stats.skipped, 50)
+        self.assertEqual(stats.total, stats.failed + stats.skipped)
+
+
+class TestTenantScheduling(unittest.TestCase):
+    """複数テナントの重み付き公平キューイング"""
+
+    def test_weighted_interleaving(self):
+        sources = {"big": [account(f"ok-big{i}") for i in range(100)],
+                   "small": [account(f"ok-small{i}") for i in range(5)]}
+        order = [name for name, _ in automatic.FairScheduler(sources, {"big": 4})]
+        self.assertEqual(order[:10], ["big"] * 4 + ["small"] + ["big"] * 4 + ["small"])
+        # 件数の多いテナントがあっても、少ないテナントは先頭から重みの比で送られる
+        self.assertEqual(max(i for i, name in enumerate(order) if name == "small"), 24)
+        self.assertEqual(order.count("big"), 100)
+        # テナント内の順番は入力どおり
+        requests = [r.username for name, r in automatic.FairScheduler(sources) if name == "big"]
+        self.assertEqual(requests, [f"ok-big{i}" for i in range(100)])
+
+    def test_invalid_tenants(self):
+        with self.assertRaises(ValueError):
+            automatic.FairScheduler({"a/b": []})
+        with self.assertRaises(ValueError):
+            automatic.FairScheduler({"a": []}, {"a": 0})
+        self.assertEqual(list(automatic.FairScheduler({"a": [], "b": []})), [])
+
+    def test_process_tenants(self):
+        with StubApiServer() as server, server.client("http.client") as client:
+            processor = automatic.AccountProcessor(
+                client, automatic.ProcessConfig(rate_limit_seconds=0),
+                logging.getLogger("test_automatic.stub"),
+            )
+            stats = processor.process_tenants({
+                "big": (account(f"ok-big{i}") for i in range(20)),
+                "small": [account("ok-small0"), account("dup-small1")],
+            })
+            sent = [json.loads(body)["username"] for body in server.httpd.bodies]
+
+        self.assertEqual(sent.index("dup-small1"), 3)
+        self.assertEqual((stats["big"].total, stats["big"].success), (20, 20))
+        self.assertEqual((stats["small"].total, stats["small"].success, stats["small"].failed), (2, 1, 1))
+        self.assertEqual((processor.stats.total, processor.stats.failed), (22, 1))
+        self.assertEqual([r.username for r in processor.tenant_results["small"]], ["ok-small0", "dup-small1"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = processor.save_tenant_results(automatic.Path(tmp) / "out.csv")
+            self.assertEqual(paths["small"].name, "out-small.csv")
+            with open(paths["big"], newline="", encoding="utf-8") as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 20)
+
+    def test_tenant_option(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for name in ("a", "b"):
+                paths.append(os.path.join(tmp, f"{name}.csv"))
+                with open(paths[-1], "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(automatic.WORKLOAD_FIELDS)
+                    writer.writerows((f"{name}{i}", f"{name}{i}@example.com", "SecurePass1!@#")
+                                     for i in range(3))
+            logger = logging.getLogger("test_automatic.tenant")
+            with unittest.mock.patch.dict(os.environ, {"SAAS_API_URL": "http://127.0.0.1:9/accounts"}), \
+                    unittest.mock.patch.object(automatic, "setup_logging", return_value=logger), \
+                    self.assertLogs(logger, logging.INFO) as logs:
+                code = automatic.main(["--tenant", f"a:2={paths[0]}", "--tenant", f"b={paths[1]}",
+                                       "--dry-run"])
+        self.assertEqual(code, 0)
+        scheduled = [line.split("] ", 1)[1].split(" <")[0] for line in logs.output if "] " in line]
+        self.assertEqual(scheduled, ["a: a0", "a: a1", "b: b0", "a: a2", "b: b1", "b: b2"])
+        for spec in ("a=", "a:0=x.csv", "a:x=x.csv", "x.csv"):
+            with self.subTest(spec=spec), self.assertRaises(argparse.ArgumentTypeError):
+                automatic.parse_tenant_spec(spec)
+
+
+class TestDeadlinesAndHedging(unittest.TestCase):
+    """タイムアウト・期限・照会のヘッジ"""
+
+    def test_read_timeout_is_separate_from_connect_timeout(self):
+        for transport in ("http.client", "requests"):
+            with self.subTest(transport=transport), StubApiServer() as server, \
+                    server.client(transport, timeout=0.2, connect_timeout=2, max_retries=0) as client:
+                start = time.monotonic()
+                result = client.create_account(account("slow1"))
+                self.assertLess(time.monotonic() - start, 0.45)
+                self.assertEqual(result.status, automatic.AccountStatus.FAILED)
+
+    def test_deadline_bounds_retries(self):
+        with StubApiServer() as server, \
+                server.client("http.client", timeout=0.2, max_retries=10, deadline=0.5) as client:
+            start = time.monotonic()
+            result = client.create_account(account("slow1"))
+            elapsed = time.monotonic() - start
+        self.assertLess(elapsed, 0.8)
+        self.assertIn("期限", result.error_message)
+
+    def test_timed_out_create_is_confirmed_by_lookup(self):
+        """作成要求がタイムアウトしても、照会で作成済みなら再送しないこと"""
+        with StubApiServer() as server, server.client(
+                "http.client", timeout=0.2, max_retries=3, lookup_url=server.lookup_url) as client:
+            result = client.create_account(account("slow1"))
+            self.assertEqual(server.httpd.attempts["slow1"], 1)
+        self.assertEqual(result.status, automatic.AccountStatus.SUCCESS)
+        self.assertEqual(result.account_id, "acc-slow1")
+
+    def test_find_account(self):
+        with StubApiServer() as server, server.client("requests", lookup_url=server.lookup_url) as client:
+            client.create_account(account("ok1"))
+            self.assertEqual(client.find_account("ok1"), {"id": "acc-ok1"})
+            self.assertIsNone(client.find_account("missing"))
+
+    def test_slow_lookup_is_hedged(self):
+        with StubApiServer() as server, server.client(
+                "http.client", lookup_url=server.lookup_url, hedge=True, hedge_delay=0.1) as client:
+            server.httpd.accounts["hedge1"] = {"id": "acc-hedge1"}
+            start = time.monotonic()
+            record = client.find_account("hedge1")
+            elapsed = time.monotonic() - start
+            self.assertEqual(record, {"id": "acc-hedge1"})
+            self.assertLess(elapsed, 0.6)
+            self.assertEqual(client.hedges, 1)
+            self.assertEqual(server.httpd.lookups, ["hedge1", "hedge1"])
+
+    def test_create_is_never_hedged(self):
+        with StubApiServer() as server, server.client(
+                "http.client", lookup_url=server.lookup_url, hedge=True, hedge_delay=0.05) as client:
+            result = client.create_account(account("slow1"))
+            self.assertEqual(result.status, automatic.AccountStatus.SUCCESS)
+            self.assertEqual(server.httpd.attempts["slow1"], 1)
+            self.assertEqual(client.hedges, 0)
+
+    def test_hedge_delay_follows_p95(self):
+        tracker = automatic.LatencyTracker(min_samples=20)
+        self.assertIsNone(tracker.percentile(0.95))
+        for i in range(100):
+            tracker.record(i / 1000)
+        self.assertAlmostEqual(tracker.percentile(0.95), 0.095)
+
+
+class TestWorkload(unittest.TestCase):
+    """合成ワークロードの生成"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, count, profile="production", seed=7, fmt="csv"):
+        path = automatic.Path(self.tmp.name) / f"{profile}-{seed}.{fmt}"
+        written = automatic.write_workload(
+            path, count, automatic.WORKLOAD_PROFILES[profile], seed=seed, fmt=fmt
+        )
+        self.assertEqual(written, count)
+        return path
+
+    def test_same_seed_same_bytes(self):
+        first = self.write(20000, seed=7).read_bytes()
+        self.assertEqual(first, self.write(20000, seed=7).read_bytes())
+        self.assertNotEqual(first, self.write(20000, seed=8).read_bytes())
+
+    def test_sequential_matches_generate_accounts(self):
+        rows = [row for chunk in automatic.generate_workload(1000) for row in chunk]
+        accounts = [(a.username, a.email, a.password) for a in automatic.generate_accounts(1000)]
+        self.assertEqual(rows, accounts)
+        self.assertEqual(rows[3], ("user3", "user3@example.com", "SecurePass3!@#"))
+
+    def test_production_rates(self):
+        profile = automatic.WORKLOAD_PROFILES["production"]
+        count = 100000
+        rows = [row for chunk in automatic.generate_workload(count, profile, seed=1, chunk_size=10000)
+                for row in chunk]
+        self.assertEqual(len(rows), count)
+        duplicates = count - len(set(rows))
+        self.assertAlmostEqual(duplicates / count, profile.duplicate_rate, delta=0.005)
+        long_names = sum(len(name) >= profile.long_field_length for name, _, _ in rows)
+        self.assertAlmostEqual(long_names / count, profile.long_field_rate, delta=0.0005)
+        domains = [email.rpartition("@")[2] for _, email, _ in rows]
+        self.assertGreater(domains.count(profile.domains[0]), domains.count(profile.domains[-1]) * 5)
+
+    def test_csv_round_trip_skips_invalid(self):
+        path = self.write(5000, profile="adversarial")
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 5000)
+        with self.assertRaises(ValueError):
+            list(automatic.load_accounts_from_csv(path))
+        logger = logging.getLogger("test_automatic.workload")
+        with self.assertLogs(logger, logging.WARNING) as logs:
+            accounts = list(automatic.load_accounts_from_csv(path, skip_invalid=True, logger=logger))
+        self.assertEqual(len(accounts) + len(logs.records), 5000)
+        self.assertTrue(logs.records)
+
+    def test_jsonl_matches_rows(self):
+        path = self.write(5000, profile="adversarial", fmt="jsonl")
+        profile = automatic.WORKLOAD_PROFILES["adversarial"]
+        rows = [row for chunk in automatic.generate_workload(5000, profile, seed=7) for row in chunk]
+        with open(path, encoding="utf-8") as f:
+            parsed = [tuple(json.loads(line).values()) for line in f]
+        self.assertEqual(parsed, rows)
+
+    def test_profile_validation(self):
+        with self.assertRaises(ValueError):
+            automatic.WorkloadProfile(duplicate_rate=1.5)
+
+    def test_special_prefix_round_trip(self):
+        prefix = 'a,"b\\c\r\nd'
+        profile = automatic.WORKLOAD_PROFILES["adversarial"]
+        rows = [row for chunk in automatic.generate_workload(3000, profile, seed=7, prefix=prefix)
+                for row in chunk]
+        self.assertEqual(rows[0][0], f"{prefix}0")
+        paths = {}
+        for fmt in ("csv", "jsonl"):
+            paths[fmt] = automatic.Path(self.tmp.name) / f"special.{fmt}"
+            automatic.write_workload(paths[fmt], 3000, profile, seed=7, prefix=prefix, fmt=fmt)
+        with open(paths["csv"], newline="", encoding="utf-8") as f:
+            self.assertEqual([tuple(row) for row in list(csv.reader(f))[1:]], rows)
+        with open(paths["jsonl"], encoding="utf-8") as f:
+            self.assertEqual([tuple(json.loads(line).values()) for line in f], rows)
+        accounts = list(automatic.generate_accounts(3, prefix=prefix))
+        self.assertEqual(accounts[1].username, f"{prefix}1")
+
+    def test_generate_command(self):
+        path = os.path.join(self.tmp.name, "cli.csv")
+        code = automatic.main(["generate", "-n", "300", "--profile", "adversarial",
+                               "--seed", "7", "--domains", "a.example,b.example", "-o", path])
+        self.assertEqual(code, 0)
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], list(automatic.WORKLOAD_FIELDS))
+        self.assertEqual(len(rows), 301)
+        emails = [row[1] for row in rows[1:]]
+        self.assertTrue(any(email.endswith("@b.example") for email in emails))
+        self.assertFalse(any("example.com" in email for email in emails))
+
+
+class TestReconcile(unittest.TestCase):
+    """入力CSVと結果CSVの突き合わせ"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = automatic.Path(self.tmp.name)
+        self.input = self.dir / "input.csv"
+        self.write_csv(self.input, automatic.WORKLOAD_FIELDS, [
+            (f"user{i}", f"user{i}@example.com", f"SecurePass{i}!@#") for i in range(10)
+        ] + [("user3", "user3@example.com", "SecurePass3!@#")])
+        # user0-5 成功, user6 失敗, user7 スキップ, user8-9 なし, ghost は入力にない
+        self.first = self.dir / "first.csv"
+        self.write_csv(self.first, automatic.RESULT_FIELDS, [
+            (f"user{i}", f"user{i}@example.com", "success", f"id{i}", "", "") for i in range(6)
+        ] + [
+            ("user6", "user6@example.com", "failed", "", "HTTPエラー 500", ""),
+            ("user7", "user7@example.com", "skipped", "", "遮断中", ""),
+            ("ghost", "ghost@example.com", "success", "id-ghost", "", ""),
+        ])
+
+    def write_csv(self, path, header, rows):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def read_csv(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    def test_missing_failed_extra(self):
+        output, extra = self.dir / "retry.csv", self.dir / "extra.csv"
+        stats = automatic.reconcile(self.input, [self.first], output, extra)
+        self.assertEqual(
+            (stats.input_rows, stats.succeeded, stats.missing, stats.failed,
+             stats.extra, stats.duplicate_inputs),
+            (11, 6, 2, 2, 1, 1),
+        )
+        retry = self.read_csv(output)
+        self.assertEqual([(r["username"], r["reason"]) for r in retry],
+                         [("user6", "failed"), ("user7", "skipped"),
+                          ("user8", "missing"), ("user9", "missing")])
+        self.assertEqual(retry[0]["error_message"], "HTTPエラー 500")
+        self.assertEqual([r["username"] for r in self.read_csv(extra)], ["ghost"])
+        # 再実行用CSVは --input としてそのまま読める
+        accounts = list(automatic.load_accounts_from_csv(output))
+        self.assertEqual(accounts[3].password, "SecurePass9!@#")
+
+    def test_later_results_and_success_win(self):
+        second = self.dir / "second.csv"
+        self.write_csv(second, automatic.RESULT_FIELDS, [
+            ("user6", "user6@example.com", "success", "id6", "", ""),
+            ("user0", "user0@example.com", "failed", "", "重複", ""),
+            ("user8", "user8@example.com", "failed", "", "タイムアウト", ""),
+        ])
+        output = self.dir / "retry.csv"
+        stats = automatic.reconcile(self.input, [self.first, second], output)
+        self.assertEqual((stats.succeeded, stats.failed, stats.missing), (7, 2, 1))
+        self.assertEqual([(r["username"], r["reason"]) for r in self.read_csv(output)],
+                         [("user7", "skipped"), ("user8", "failed"), ("user9", "missing")])
+
+    def test_partitioned_matches_in_memory(self):
+        path = self.dir / "workload.csv"
+        automatic.write_workload(path, 20000, automatic.WORKLOAD_PROFILES["production"], seed=3)
+        rows = self.read_csv(path)
+        results = self.dir / "results.csv"
+        self.write_csv(results, automatic.RESULT_FIELDS, [
+            (r["username"], r["email"], "failed" if i % 7 == 0 else "success", "", "", "")
+            for i, r in enumerate(rows) if i % 5
+        ] + [(f"extra{i}", f"extra{i}@example.com", "success", "", "", "") for i in range(50)])
+
+        outputs = {}
+        for name, limit in (("memory", 1 << 30), ("partitioned", 64 * 1024)):
+            output, extra = self.dir / f"{name}.csv", self.dir / f"{name}-extra.csv"
+            stats = automatic.reconcile(path, [results], output, extra, key="both",
+                                        memory_limit=limit, temp_dir=self.dir)
+            outputs[name] = (str(stats), output.read_bytes(), extra.read_bytes(), stats.partitions)
+        self.assertEqual(outputs["memory"][3], 1)
+        self.assertGreater(outputs["partitioned"][3], 1)
+        self.assertEqual(outputs["memory"][:3], outputs["partitioned"][:3])
+        # 一時ファイルは残らない
+        self.assertFalse(list(self.dir.glob("reconcile-*")))
+
+    def test_empty_results_and_missing_columns(self):
+        empty = self.dir / "empty.csv"
+        empty.write_text("")
+        stats = automatic.reconcile(self.input, [empty], self.dir / "retry.csv")
+        self.assertEqual(stats.missing, 10)
+        broken = self.dir / "broken.csv"
+        self.write_csv(broken, ("username", "email"), [("user0", "user0@example.com")])
+        with self.assertRaises(ValueError):
+            automatic.reconcile(self.input, [broken], self.dir / "retry.csv")
+
+    def test_reconcile_command(self):
+        output = self.dir / "retry.csv"
+        code = automatic.main(["reconcile", "-i", str(self.input), "-r", str(self.first),
+                               "-o", str(output), "--key", "email"])
+        self.assertEqual(code, 0)
+        self.assertEqual(len(self.read_csv(output)), 4)
+        self.assertEqual(automatic.main(["reconcile", "-i", str(self.dir / "none.csv"),
+                                         "-r", str(self.first)]), 1)
+
+
+class TestProfiling(unittest.TestCase):
+    """--profile / --trace-memory（lib/script_profiling.py）"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.report = os.path.join(self.tmp.name, "report.txt")
+
+    def main(self, *argv):
+        with contextlib.redirect_stderr(io.StringIO()):
+            return automatic.main(list(argv))
+
+    def test_generate_report_and_unchanged_output(self):
+        plain = os.path.join(self.tmp.name, "plain.csv")
+        profiled = os.path.join(self.tmp.name, "profiled.csv")
+        generate = ["-n", "3000", "--profile", "adversarial", "--seed", "3"]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.main("generate", *generate, "-o", plain), 0)
+            # サブコマンドの前の --profile は計測、後ろの --profile はワークロードの種類
+            self.assertEqual(self.main("--profile", "--trace-memory", "--profile-output", self.report,
+                                       "generate", *generate, "-o", profiled), 0)
+        with open(plain, "rb") as a, open(profiled, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        with open(self.report, encoding="utf-8") as f:
+            report = f.read()
+        self.assertIn("generate", report.split("## cProfile")[0])
+        self.assertIn("write_workload", report)
+        self.assertIn("メモリの確保元", report)
+        stats = pstats.Stats(self.report + ".pstats")
+        self.assertTrue(any(name == "write_workload" for _, _, name in stats.stats))
+
+    def test_options_anywhere_without_subcommand(self):
+        with unittest.mock.patch.dict(os.environ, {"SAAS_API_URL": "http://127.0.0.1:9/accounts"}):
+            self.assertEqual(self.main("--count", "2", "--dry-run", "--profile",
+                                       "--profile-output", self.report), 0)
+        with open(self.report, encoding="utf-8") as f:
+            self.assertIn("--count 2 --dry-run", f.readline())
+
+    def test_nested_phase_peaks(self):
+        # オプションがなければ読み込まない
+        self.assertIsNone(automatic._load_profiling(["--count", "2"]))
+        profiling = automatic._load_profiling(["--trace-memory"])
+        profiler = profiling.Profiler(self.report, profile=False, trace_memory=True)
+        with contextlib.redirect_stderr(io.StringIO()):
+            profiler.start()
+            try:
+                with profiling.phase("outer"):
+                    with profiling.phase("inner"):
+                        data = bytearray(8_000_000)
+                    del data
+                    with profiling.phase("inner"):
+                        pass
+            finally:
+                profiler.stop()
+        count, _, inner_peak = profiler.phases["inner"]
+        self.assertEqual(count, 2)
+        self.assertGreaterEqual(inner_peak, 8_000_000)
+        self.assertGreaterEqual(profiler.phases["outer"][2], inner_peak)
+        # 計測していないときの phase は何もしない
+        with profiling.phase("ignored"):
+            pass
+        self.assertNotIn("ignored", profiler.phases)
+
+
+if __name__ == '__main__':
+    unittest.main()
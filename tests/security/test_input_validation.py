@@ -15,7 +15,9 @@ from unittest.mock import patch
 
 # テスト対象のモジュールをインポート
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-from Validation.vali import Validator
+from Validation.vali import (
+    BinTable, PostalCodeIndex, PublicSuffixTrie, Validator, ValidationCache, main as vali_main,
+)
 
 
 class TestEmailValidationSecurity(unittest.TestCase):
@@ -206,6 +208,48 @@ class TestPhoneNumberValidationSecurity(unittest.TestCase):
                 self.assertFalse(Validator.validate_phone_number(phone))
 
 
+class TestPhoneNumberNormalization(unittest.TestCase):
+    """電話番号の正規化テスト"""
+
+    def test_normalize_forms(self):
+        """国内形式・E.164形式への正規化"""
+        self.assertEqual(
+            Validator.normalize_phone_number("(03) 1234-5678"), "0312345678"
+        )
+        self.assertEqual(
+            Validator.normalize_phone_number("090-1234-5678", e164=True),
+            "+819012345678",
+        )
+
+    def test_normalize_rejects_invalid(self):
+        """無効な番号は None を返すこと"""
+        for phone in ["090-1234-5678'; DROP TABLE--", "03-1234-%s%s%s", "", "1234567890"]:
+            with self.subTest(phone=phone):
+                self.assertIsNone(Validator.normalize_phone_number(phone))
+
+    def test_matches_regex_validation(self):
+        """従来の正規表現による判定と一致すること"""
+        import re
+
+        phones = [
+            "090-1234-5678", "09012345678", "03 1234 5678", "(03)1234-5678",
+            "0\u30009012345678", "0９0-1234-5678", "090-1234-567", "+81-90-1234-5678",
+            "090-1234-5678\n", "0-0-0",
+        ]
+        for phone in phones:
+            with self.subTest(phone=phone):
+                cleaned = re.sub(r"[()\s-]", "", phone)
+                expected = bool(Validator.PHONE_REGEX.fullmatch(cleaned))
+                self.assertEqual(Validator.validate_phone_number(phone), expected)
+
+    def test_batch(self):
+        """バッチ版は入力順に結果を返すこと"""
+        self.assertEqual(
+            Validator.normalize_phone_numbers(["0312345678", "abc", "0９0-1234-5678"]),
+            ["0312345678", None, "09012345678"],
+        )
+
+
 class TestCreditCardValidationSecurity(unittest.TestCase):
     """クレジットカード検証のセキュリティテスト"""
 
@@ -360,6 +404,418 @@ class TestValidatorIntegration(unittest.TestCase):
         self.assertEqual(len(result['errors']), 0)
 
 
+class TestBytesValidation(unittest.TestCase):
+    """bytes系バリデーションのテスト"""
+
+    CASES = [
+        (Validator.validate_email, Validator.validate_email_bytes, [
+            "user@example.com", "user@example.com\nBcc: attacker@evil.com",
+            "admin'--@example.com", "a" * 300 + "@example.com", "",
+        ]),
+        (Validator.validate_phone_number, Validator.validate_phone_number_bytes, [
+            "090-1234-5678", "(03) 1234 5678", "090-1234-5678'; DROP TABLE--", "0-0-0", "",
+        ]),
+        (Validator.validate_postal_code, Validator.validate_postal_code_bytes, [
+            "100-0001", " 1000001\n", "123-4567'; DROP TABLE--", "1000-001", "",
+        ]),
+        (Validator.validate_credit_card, Validator.validate_credit_card_bytes, [
+            "4111 1111 1111 1111", "4111111111111112", "9" * 100, "1234", "",
+        ]),
+    ]
+
+    def test_matches_str_validators(self):
+        """ASCII入力では str 版と同じ結果になること"""
+        for str_func, bytes_func, values in self.CASES:
+            for value in values:
+                data = value.encode("ascii")
+                for buf in (data, bytearray(data), memoryview(data)):
+                    with self.subTest(func=bytes_func.__name__, value=value, type=type(buf)):
+                        self.assertEqual(bytes_func(buf), str_func(value))
+
+    def test_non_ascii_rejected(self):
+        """非ASCIIのバイト列は拒否されること"""
+        self.assertFalse(Validator.validate_email_bytes("user@exаmple.com".encode()))
+        self.assertFalse(Validator.validate_credit_card_bytes("４１１１".encode() * 4))
+
+    def test_mmap_slice(self):
+        """mmap したファイルのスライスをそのまま検証できること"""
+        import mmap
+        import tempfile
+
+        with tempfile.TemporaryFile() as f:
+            f.write(b"user@example.com,090-1234-5678,100-0001,4111111111111111\n")
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    self.assertTrue(Validator.validate_email_bytes(view[0:16]))
+                    self.assertTrue(Validator.validate_phone_number_bytes(view[17:30]))
+                    self.assertTrue(Validator.validate_postal_code_bytes(view[31:39]))
+                    self.assertTrue(Validator.validate_credit_card_bytes(view[40:56]))
+                finally:
+                    view.release()
+
+        # mmap オブジェクトもそのまま渡せること
+        with tempfile.TemporaryFile() as f:
+            f.write(b"4111111111111111")
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.assertTrue(Validator.validate_credit_card_bytes(mm))
+                self.assertFalse(Validator.validate_phone_number_bytes(mm))
+
+
+class TestPublicSuffixCheck(unittest.TestCase):
+    """Public Suffix List によるメールドメインチェックのテスト"""
+
+    RULES = ["com", "jp", "co.jp", "*.kawasaki.jp", "!city.kawasaki.jp", "*.ck", "!www.ck"]
+
+    def setUp(self):
+        self.trie = PublicSuffixTrie(PublicSuffixTrie.compile(self.RULES))
+
+    def test_suffix_length(self):
+        """通常・ワイルドカード・例外ルールの判定"""
+        cases = {
+            "example.com": 1,
+            "example.co.jp": 2,
+            "foo.bar.kawasaki.jp": 3,
+            "city.kawasaki.jp": 2,
+            "www.ck": 1,
+            "gmail.con": 0,
+        }
+        for domain, expected in cases.items():
+            with self.subTest(domain=domain):
+                self.assertEqual(self.trie.public_suffix_length(domain), expected)
+
+    def test_registrable(self):
+        """サフィックスそのもの・未知のTLDは登録可能ドメインではない"""
+        self.assertTrue(self.trie.is_registrable("Example.CO.JP"))
+        self.assertFalse(self.trie.is_registrable("co.jp"))
+        self.assertFalse(self.trie.is_registrable("bar.kawasaki.jp"))
+        self.assertFalse(self.trie.is_registrable("gmail.con"))
+
+    def test_load_from_file(self):
+        """コンパイル済みファイルを mmap で読み込めること"""
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "psl.trie")
+            with open(path, "wb") as f:
+                f.write(PublicSuffixTrie.compile(self.RULES))
+            trie = PublicSuffixTrie.load(path)
+            self.assertEqual(trie.public_suffix_length("example.co.jp"), 2)
+
+    def test_validate_email_with_bundled_list(self):
+        """同梱のリストでタイプミスのドメインを拒否すること"""
+        self.assertTrue(Validator.validate_email("user@gmail.com", check_public_suffix=True))
+        self.assertTrue(Validator.validate_email("user@example.co.jp", check_public_suffix=True))
+        self.assertFalse(Validator.validate_email("user@gmail.con", check_public_suffix=True))
+        self.assertFalse(Validator.validate_email("user@co.jp", check_public_suffix=True))
+        # 既定では従来どおり形式のみ
+        self.assertTrue(Validator.validate_email("user@gmail.con"))
+
+    def test_validate_email_with_cache(self):
+        """キャッシュ有効時も同じ結果になること"""
+        Validator.enable_cache()
+        try:
+            self.assertFalse(Validator.validate_email("user@gmail.con", check_public_suffix=True))
+            self.assertTrue(Validator.validate_email("user@gmail.con"))
+        finally:
+            Validator.disable_cache()
+
+
+class TestCardBrand(unittest.TestCase):
+    """BIN/IIN 範囲表によるカードブランド判定のテスト"""
+
+    RULES = [
+        ("4", "4", "visa", [13, 16, 19]),
+        ("51", "55", "mastercard", [16]),
+        ("36", "36", "diners", list(range(14, 20))),
+        ("300", "305", "diners", list(range(16, 20))),
+        ("62", "62", "unionpay", list(range(16, 20))),
+        ("622126", "622925", "discover", list(range(16, 20))),
+    ]
+
+    def setUp(self):
+        self.table = BinTable(BinTable.compile(self.RULES))
+
+    def test_lookup_prefers_narrow_range(self):
+        """重なる範囲では狭いほうのブランドになること"""
+        cases = {
+            "4111111111111111": "visa",
+            "5500000000000004": "mastercard",
+            "6221260000000000": "discover",
+            "6229250000000000": "discover",
+            "6229260000000000": "unionpay",
+            "6200000000000000": "unionpay",
+            "3050000000000000": "diners",
+            "5600000000000000": None,
+            "1": None,
+        }
+        for digits, brand in cases.items():
+            with self.subTest(digits=digits):
+                self.assertEqual(self.table.brand(digits), brand)
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            BinTable.compile([("55", "51", "mastercard", [16])])
+        with self.assertRaises(ValueError):
+            BinTable.compile([("4x", "4x", "visa", [16])])
+        with self.assertRaises(ValueError):
+            BinTable(b"XXXX" + bytes(12))
+
+    def test_load_from_file(self):
+        """コンパイル済みファイルを mmap で読み込めること"""
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bin.bin")
+            with open(path, "wb") as f:
+                f.write(BinTable.compile(self.RULES))
+            table = BinTable.load(path)
+            self.assertEqual(table.brand("36227206271667"), "diners")
+
+    def test_bundled_table_is_up_to_date(self):
+        """同梱のバイナリが範囲表から再生成したものと一致すること"""
+        with open(BinTable.DEFAULT_BINARY_PATH, "rb") as f:
+            self.assertEqual(
+                f.read(), BinTable.compile(BinTable.parse_table(BinTable.DEFAULT_TABLE_PATH))
+            )
+
+    def test_classify_credit_card(self):
+        """ブランド・ブランドごとの桁数・Luhn を1回で判定すること"""
+        cases = {
+            "4111 1111 1111 1111": "visa",
+            "4222222222222": "visa",
+            "5500-0000-0000-0004": "mastercard",
+            "378282246310005": "amex",
+            "3530111333300000": "jcb",
+            "6011000990139424": "discover",
+            "36227206271667": "diners",
+            "４１１１１１１１１１１１１１１１": "visa",      # 全角数字
+            "4111111111111112": None,                     # Luhn NG
+            "5500 0000 0000 0000 4": None,                 # Mastercard は16桁のみ
+            "37828224631000": None,                        # Amex は15桁のみ
+            "1234567890123452": None,                      # 範囲表にないBIN
+            "4111111111111111'; DROP TABLE cards--": None,
+            "": None,
+        }
+        for card, brand in cases.items():
+            with self.subTest(card=card):
+                self.assertEqual(Validator.classify_credit_card(card), brand)
+                self.assertEqual(Validator.classify_credit_cards([card]), [brand])
+
+    def test_batch_matches_single(self):
+        cards = ["4111 1111 1111 1111", "378282246310005", "1234", "6759649826438453"] * 50
+        self.assertEqual(
+            Validator.classify_credit_cards(iter(cards)),
+            [Validator.classify_credit_card(card) for card in cards],
+        )
+
+    def test_consistent_with_luhn_check(self):
+        """ブランドが判定された番号は validate_credit_card でも有効であること"""
+        for prefix in ("4", "51", "34", "3528", "6011", "62", "2200", "5018"):
+            for i in range(20):
+                body = f"{prefix}{i:04d}".ljust(15, "7")
+                card = next(body + d for d in "0123456789"
+                            if Validator.validate_credit_card(body + d))
+                with self.subTest(card=card):
+                    if Validator.classify_credit_card(card) is not None:
+                        self.assertTrue(Validator.validate_credit_card(card))
+                    self.assertIsNotNone(Validator.card_brand(card))
+
+
+class TestPostalCodeExistence(unittest.TestCase):
+    """郵便番号の存在チェック（ビットマップ）のテスト"""
+
+    # 日本郵便 KEN_ALL.CSV（15列）・JIGYOSYO.CSV（13列）と同じ列構成の抜粋
+    KEN_ALL = [
+        ["13101", "100  ", "1000001", "ﾄｳｷｮｳﾄ", "ﾁﾖﾀﾞｸ", "ﾁﾖﾀﾞ", "東京都", "千代田区", "千代田",
+         "0", "0", "0", "0", "0", "0"],
+        ["13101", "100  ", "1000002", "ﾄｳｷｮｳﾄ", "ﾁﾖﾀﾞｸ", "ｺｳｷｮｶﾞｲｴﾝ", "東京都", "千代田区", "皇居外苑",
+         "0", "0", "0", "0", "0", "0"],
+        ["01101", "060  ", "0600000", "ﾎｯｶｲﾄﾞｳ", "ｻｯﾎﾟﾛｼﾁｭｳｵｳｸ", "ｲｶﾆｹｲｻｲｶﾞﾅｲﾊﾞｱｲ", "北海道",
+         "札幌市中央区", "以下に掲載がない場合", "0", "0", "0", "0", "0", "0"],
+        ["23425", "498  ", "4980001", "ｱｲﾁｹﾝ", "ﾔﾄﾐｼ", "ﾄﾐﾊﾏ", "愛知県", "弥富市", "富浜",
+         "0", "0", "0", "0", "0", "0"],
+        ["23425", "498  ", "4980002", "ｱｲﾁｹﾝ", "ﾔﾄﾐｼ", "ﾄﾐﾊﾏ", "愛知県", "弥富市", "富浜",
+         "0", "0", "0", "0", "0", "0"],
+        ["24303", "49808", "4980801", "ﾐｴｹﾝ", "ｸﾜﾅｸﾞﾝｷｿｻｷﾁｮｳ", "ｵｵｾ", "三重県", "桑名郡木曽岬町", "大和田",
+         "0", "0", "0", "0", "0", "0"],
+    ]
+    JIGYOSYO = [
+        ["13101", "ｼﾕｳｷﾞｲﾝ", "衆議院", "東京都", "千代田区", "永田町", "１丁目７－１",
+         "1008960", "100  ", "銀座", "0", "0", "0"],
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        import csv
+        import io
+        import tempfile
+
+        cls.tmp = tempfile.TemporaryDirectory()
+        ken_all = os.path.join(cls.tmp.name, "KEN_ALL.CSV")
+        jigyosyo = os.path.join(cls.tmp.name, "JIGYOSYO.CSV")
+        for path, rows, encoding in ((ken_all, cls.KEN_ALL, "cp932"),
+                                     (jigyosyo, cls.JIGYOSYO, "utf-8")):
+            text = io.StringIO()
+            csv.writer(text, quoting=csv.QUOTE_ALL, lineterminator="\r\n").writerows(rows)
+            with open(path, "wb") as f:
+                f.write(text.getvalue().encode(encoding))
+        cls.sources = [ken_all, jigyosyo]
+        cls.index_path = os.path.join(cls.tmp.name, "postal_codes.bin")
+        with patch("builtins.print"):
+            vali_main(["build-postal", "--source", *cls.sources, "--output", cls.index_path])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.addCleanup(setattr, Validator, "_postal_codes", Validator._postal_codes)
+        Validator.load_postal_codes(self.index_path)
+
+    def test_exists(self):
+        cases = {
+            "100-0001": True,
+            "1000002": True,
+            " 060-0000 ": True,
+            "100-8960": True,   # 事業所の個別番号
+            "000-0000": False,
+            "100-0003": False,
+            "999-9999": False,
+            "100-000": False,   # 形式エラー
+        }
+        for code, expected in cases.items():
+            with self.subTest(code=code):
+                self.assertEqual(Validator.validate_postal_code(code, check_exists=True), expected)
+        # 既定では従来どおり形式のみ
+        self.assertTrue(Validator.validate_postal_code("000-0000"))
+
+    def test_prefecture(self):
+        """上3桁の代表値と異なる番号（498-0801 は三重県）も正しく引けること"""
+        cases = {
+            "100-0001": "東京都",
+            "060-0000": "北海道",
+            "498-0001": "愛知県",
+            "498-0801": "三重県",
+            "000-0000": None,
+            "abc": None,
+        }
+        for code, expected in cases.items():
+            with self.subTest(code=code):
+                self.assertEqual(Validator.postal_code_prefecture(code), expected)
+
+    def test_index_layout(self):
+        index = Validator._postal_codes
+        self.assertEqual(index.count, 7)
+        self.assertEqual(os.path.getsize(self.index_path),
+                         PostalCodeIndex.HEADER.size + PostalCodeIndex.BITMAP_SIZE + 1000 + 5)
+        self.assertNotIn(-1, index)
+        self.assertNotIn(10_000_000, index)
+
+    def test_with_cache(self):
+        """キャッシュ有効時も形式のみのチェックと結果が混ざらないこと"""
+        Validator.enable_cache()
+        try:
+            self.assertTrue(Validator.validate_postal_code("000-0000"))
+            self.assertFalse(Validator.validate_postal_code("000-0000", check_exists=True))
+        finally:
+            Validator.disable_cache()
+
+    def test_invalid_source(self):
+        with self.assertRaises(ValueError):
+            PostalCodeIndex.compile([("1000001", "東京")])
+        with self.assertRaises(ValueError):
+            PostalCodeIndex.compile([("100-0001", "東京都")])
+        with self.assertRaises(FileNotFoundError):
+            PostalCodeIndex.load(os.path.join(self.tmp.name, "missing.bin"))
+
+    def test_build_with_profile(self):
+        """--profile / --trace-memory 付きでも同じ索引を作り、区間ごとの時間を書き出すこと"""
+        output = os.path.join(self.tmp.name, "profiled.bin")
+        report = os.path.join(self.tmp.name, "profile.txt")
+        with patch("builtins.print"):
+            vali_main(["--profile", "--trace-memory", "--profile-output", report,
+                       "build-postal", "--source", *self.sources, "--output", output])
+        with open(output, "rb") as a, open(self.index_path, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        with open(report, encoding="utf-8") as f:
+            phases = f.read().split("## cProfile")[0]
+        for name in ("parse", "compile", "write"):
+            self.assertIn(name, phases)
+        self.assertTrue(os.path.exists(report + ".pstats"))
+
+
+class TestValidatorCache(unittest.TestCase):
+    """結果キャッシュのテスト"""
+
+    EMAILS = [
+        "user@example.com",
+        "USER@Example.COM",
+        "a.b+c@sub.example.co.jp",
+        "user@example.com\nBcc: attacker@evil.com",
+        "admin'--@example.com",
+        "user@<script>alert('xss')</script>.com",
+        "user@example.com\n",
+        "a" * 65 + "@example.com",
+        "user@-example.com",
+        "user@example.c",
+        "user@@example.com",
+        "@example.com",
+        "user@",
+    ]
+
+    def setUp(self):
+        Validator.enable_cache(maxsize=8)
+
+    def tearDown(self):
+        Validator.disable_cache()
+
+    def test_cached_results_match_uncached(self):
+        """キャッシュ有効時も判定結果が変わらないこと"""
+        cached = [Validator.validate_email(e) for e in self.EMAILS]
+        Validator.disable_cache()
+        uncached = [Validator.validate_email(e) for e in self.EMAILS]
+        self.assertEqual(cached, uncached)
+
+    def test_email_domain_checked_once_per_domain(self):
+        """同一ドメインの検証は1回だけ実行されること"""
+        for i in range(5):
+            self.assertTrue(Validator.validate_email(f"user{i}@Example.com"))
+        stats = Validator.cache_stats()["email_domain"]
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 4)
+
+    def test_phone_and_postal_code_hits(self):
+        """電話番号・郵便番号の繰り返し入力がヒットすること"""
+        for _ in range(3):
+            self.assertTrue(Validator.validate_phone_number("090-1234-5678"))
+            self.assertFalse(Validator.validate_postal_code("123-4567'; DROP TABLE--"))
+        stats = Validator.cache_stats()
+        self.assertEqual((stats["phone"]["hits"], stats["phone"]["misses"]), (2, 1))
+        self.assertEqual(
+            (stats["postal_code"]["hits"], stats["postal_code"]["misses"]), (2, 1)
+        )
+
+    def test_lru_eviction(self):
+        """上限を超えたら最も古いエントリが破棄されること"""
+        cache = ValidationCache(maxsize=2)
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("b", lambda: 2)
+        cache.get_or_compute("a", lambda: 1)  # a を最新に
+        cache.get_or_compute("c", lambda: 3)  # b が破棄される
+        self.assertEqual(cache.get_or_compute("b", lambda: 20), 20)
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertEqual(cache.misses, 4)
+
+    def test_disabled_by_default(self):
+        """無効時は統計が空であること"""
+        Validator.disable_cache()
+        Validator.validate_email("user@example.com")
+        self.assertEqual(Validator.cache_stats(), {})
+
+
 class TestSecurityAutomaticPy(unittest.TestCase):
     """security/automatic.pyのセキュリティテスト"""
 
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+パフォーマンステスト: SaasApiClient のトランスポート比較
+
+security/automatic.py の requests / http.client トランスポートで、
+ローカルのスタブAPIサーバーに対する1件あたりの create_account 時間を計測し、
+軽量版（http.client）が requests 版より遅くなっていないことを確認します。
+
+結果の表示:
+    python tests/security/test_saas_transport_performance.py
+
+環境変数:
+    SAAS_TRANSPORT_BENCH_REQUESTS  計測するリクエスト数（既定: 300）
+    SAAS_TRANSPORT_BENCH_RATIO     http.client / requests の許容比（既定: 1.0）
+"""
+
+import os
+import sys
+import time
+import unittest
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(__file__))
+from test_automatic import StubApiServer, account
+
+REQUESTS = int(os.getenv('SAAS_TRANSPORT_BENCH_REQUESTS', '300'))
+RATIO = float(os.getenv('SAAS_TRANSPORT_BENCH_RATIO', '1.0'))
+WARMUP = 20
+
+
+def measure(server: StubApiServer, transport: str, count: int = REQUESTS) -> float:
+    """1件あたりの所要時間（秒, 3回の最小値）"""
+    accounts = [account(f"ok{i}") for i in range(count)]
+    best = float('inf')
+    with server.client(transport) as client:
+        for request in accounts[:WARMUP]:
+            client.create_account(request)
+        for _ in range(3):
+            start = time.perf_counter()
+            for request in accounts:
+                client.create_account(request)
+            best = min(best, (time.perf_counter() - start) / count)
+    return best
+
+
+def run_benchmarks() -> Dict[str, float]:
+    with StubApiServer() as server:
+        return {name: measure(server, name) for name in ('requests', 'http.client')}
+
+
+class TestTransportPerformance(unittest.TestCase):
+    """トランスポートの性能比較"""
+
+    def test_lean_transport_is_not_slower(self):
+        results = run_benchmarks()
+        self.assertLess(
+            results['http.client'], results['requests'] * RATIO,
+            f"http.client {results['http.client'] * 1e6:.0f}µs / "
+            f"requests {results['requests'] * 1e6:.0f}µs",
+        )
+
+
+if __name__ == '__main__':
+    for name, seconds in run_benchmarks().items():
+        print(f"{name:12s} {seconds * 1e6:8.0f} µs/件  ({1 / seconds:7.0f} 件/秒)")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+テスト: 入力検証サーバー
+
+Validation/vali_server.py のサーバー経由の結果がプロセス内の Validator と
+一致すること、エラーの伝え方、複数クライアントからの同時要求が
+マイクロバッチにまとめられることを確認します。
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from Validation.vali import Validator
+from Validation.vali_server import (
+    METHODS, ValidationClient, ValidationServer, ValidationServerError,
+)
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'Validation', 'vali_server.py')
+
+SAMPLES = {
+    'validate_email': ['user@example.com', 'bad@', 'ユーザー@example.jp', ''],
+    'validate_phone_number': ['090-1234-5678', '03-1234-5678', '12345'],
+    'normalize_phone_number': ['090-1234-5678', '+81 90 1234 5678', 'abc'],
+    'validate_password': ['Passw0rd!Secure', 'short'],
+    'validate_date': ['2025-12-02', '2025-02-30'],
+    'validate_postal_code': ['100-0001', '1000001', '10-0001'],
+    'validate_credit_card': ['4111111111111111', '4111111111111112'],
+    'card_brand': ['4111111111111111', '5500000000000004', '0000000000000000'],
+    'classify_credit_card': ['4111 1111 1111 1111', '378282246310005', 'abcd'],
+    'validate_json': ['{"a": 1}', '{a: 1}'],
+}
+
+
+def temp_socket_path(test):
+    directory = tempfile.mkdtemp()
+    test.addCleanup(os.rmdir, directory)
+    return os.path.join(directory, 'vali.sock')
+
+
+class TestValidationServer(unittest.TestCase):
+    """サーバー経由の呼び出し（Unix ソケット、サーバー内実行）"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ValidationServer()
+        cls.address = cls.server.start(temp_socket_path(cls))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    @classmethod
+    def addCleanup(cls, function, *args):
+        cls.addClassCleanup(function, *args)
+
+    def client(self):
+        client = ValidationClient(self.address)
+        self.addCleanup(client.close)
+        return client
+
+    def test_results_match_in_process_validator(self):
+        client = self.client()
+        for method, values in SAMPLES.items():
+            for value in values:
+                with self.subTest(method=method, value=value):
+                    self.assertEqual(client.call(method, value), getattr(Validator, method)(value))
+
+    def test_map_preserves_input_order(self):
+        client = self.client()
+        emails = [f"user{i}@example.com" if i % 3 else f"bad{i}@" for i in range(2000)]
+        self.assertEqual(client.map('validate_email', emails), [Validator.validate_email(e) for e in emails])
+
+    def test_call_many_mixes_methods_and_arguments(self):
+        client = self.client()
+        calls = [
+            ('validate_email', ('user@example.com',)),
+            ('validate_email', ('user@example.invalid', True)),
+            ('normalize_phone_numbers', (['090-1234-5678', 'abc'],)),
+            ('classify_credit_cards', (['4111111111111111', '1234'],)),
+        ]
+        expected = [getattr(Validator, method)(*args) for method, args in calls]
+        # タプルは JSON で配列になる
+        self.assertEqual(client.call_many(calls), [list(v) if isinstance(v, tuple) else v for v in expected])
+
+    def test_server_side_exception_is_raised_after_all_responses(self):
+        client = self.client()
+        with self.assertRaisesRegex(ValidationServerError, 'TypeError'):
+            client.call_many([('validate_email', ('a@example.com',)), ('validate_email', ())])
+        # 接続は引き続き使える
+        self.assertTrue(client.call('validate_email', 'a@example.com'))
+
+    def test_unknown_method_is_rejected_by_client(self):
+        with self.assertRaises(ValueError):
+            self.client().call('load_postal_codes', '/etc/passwd')
+        self.assertNotIn('load_postal_codes', METHODS)
+
+    def test_concurrent_clients_are_batched(self):
+        emails = [f"user{i}@example.com" for i in range(3000)]
+        expected = [Validator.validate_email(e) for e in emails]
+        results = {}
+
+        def run(n):
+            with ValidationClient(self.address) as client:
+                results[n] = client.map('validate_email', emails)
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {n: expected for n in range(4)})
+        self.assertGreater(self.server.stats()['max_batch'], 1)
+
+
+class TestValidationServerOptions(unittest.TestCase):
+    """TCP・プロセスプール・CLI"""
+
+    def test_tcp_with_worker_processes(self):
+        with ValidationServer(workers=2, batch_size=64) as server:
+            address = server.start(port=0)
+            self.assertIsInstance(address, tuple)
+            with ValidationClient(address) as client:
+                cards = ['4111111111111111', '1234'] * 200
+                self.assertEqual(client.map('validate_credit_card', cards), [True, False] * 200)
+                with self.assertRaises(ValidationServerError):
+                    client.call('validate_date')
+            self.assertLessEqual(server.stats()['max_batch'], 64)
+
+    def test_invalid_options(self):
+        for kwargs in ({'workers': -1}, {'batch_size': 0}, {'batch_delay': -1}):
+            with self.subTest(**kwargs), self.assertRaises(ValueError):
+                ValidationServer(**kwargs)
+
+    def test_cli(self):
+        path = temp_socket_path(self)
+        proc = subprocess.Popen(
+            [sys.executable, SERVER_SCRIPT, '--socket', path, '--batch-delay', '0.001'],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            self.assertIn(path, proc.stdout.readline())
+            with ValidationClient(path) as client:
+                self.assertEqual(client.call('normalize_phone_number', '090-1234-5678'), '09012345678')
+        finally:
+            proc.terminate()
+            output, _ = proc.communicate(timeout=30)
+        self.assertEqual(proc.returncode, 0)
+        self.assertIn("'requests': 1", output)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+パフォーマンステスト: 入力検証サーバー
+
+Validation/vali_server.py について、プロセス内の Validator 呼び出し・
+サーバーへの1件ずつの呼び出し・送受信を重ねた map の1件あたりの時間を計測し、
+map が1件ずつの往復より速い（マイクロバッチで往復が償却される）ことを確認します。
+サーバーは別プロセスで起動し、クライアントとは GIL を共有しない。
+
+結果の表示:
+    python tests/security/test_validation_server_performance.py
+
+環境変数:
+    VALIDATION_SERVER_BENCH_REQUESTS  計測する要求数（既定: 2000）
+    VALIDATION_SERVER_BENCH_RATIO     map / 1件ずつの call の許容比（既定: 0.5）
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from Validation.vali import Validator
+from Validation.vali_server import ValidationClient
+
+REQUESTS = int(os.getenv('VALIDATION_SERVER_BENCH_REQUESTS', '2000'))
+RATIO = float(os.getenv('VALIDATION_SERVER_BENCH_RATIO', '0.5'))
+SERVER_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', 'Validation', 'vali_server.py')
+
+
+def best_of(function, count: int, repeat: int = 3) -> float:
+    """1件あたりの所要時間（秒, repeat 回の最小値）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, (time.perf_counter() - start) / count)
+    return best
+
+
+def run_benchmarks(count: int = REQUESTS) -> Dict[str, float]:
+    emails = [f"user{i}@example.com" for i in range(count)]
+    results = {
+        'in-process': best_of(lambda: [Validator.validate_email(e) for e in emails], count),
+    }
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'vali.sock')
+    proc = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--socket', path],
+                            stdout=subprocess.PIPE, text=True)
+    try:
+        proc.stdout.readline()  # 起動完了の表示
+        with ValidationClient(path) as client:
+            client.map('validate_email', emails[:100])
+            results['server call'] = best_of(
+                lambda: [client.call('validate_email', e) for e in emails], count)
+            results['server map'] = best_of(lambda: client.map('validate_email', emails), count)
+    finally:
+        proc.terminate()
+        proc.communicate(timeout=30)
+        os.rmdir(directory)
+    return results
+
+
+class TestValidationServerPerformance(unittest.TestCase):
+    """サーバー呼び出しの性能"""
+
+    def test_pipelined_map_amortizes_round_trips(self):
+        results = run_benchmarks()
+        self.assertLess(
+            results['server map'], results['server call'] * RATIO,
+            f"map {results['server map'] * 1e6:.1f}µs / call {results['server call'] * 1e6:.1f}µs",
+        )
+
+
+if __name__ == '__main__':
+    for name, seconds in run_benchmarks().items():
+        print(f"{name:12s} {seconds * 1e6:8.1f} µs/件  ({1 / seconds:9.0f} 件/秒)")
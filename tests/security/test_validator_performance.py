@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+パフォーマンステスト: 入力検証（ReDoS・性能劣化の検出）
+
+Validation/vali.py の Validator 各メソッドについて
+- 実データに近い入力（realistic）と攻撃的な入力（adversarial）の処理時間
+- 入力サイズを増やしたときの処理時間の伸び（超線形・指数的な増加の検出）
+を計測し、保存済みのJSONベースラインと比較します。
+
+処理時間はマシン差を吸収するため、校正用ワークロードとの比で記録します。
+それでも Python のバージョンやCIの混み具合で短いケースは大きくぶれるため、
+ベースラインとの比較は既定では校正値の MIN_COST 倍以上かかるケースだけで行います。
+
+ベースラインの更新:
+    python tests/security/test_validator_performance.py --update-baseline
+
+環境変数:
+    VALIDATOR_BENCH_THRESHOLD  ベースラインに対する許容倍率（既定: 3.0）
+    VALIDATOR_BENCH_MIN_COST   ベースラインと比較するケースの最小コスト（校正値比, 既定: 1.0。0 なら全ケース）
+    VALIDATOR_BENCH_OUTPUT     計測結果をJSONで書き出すパス（任意）
+"""
+
+import json
+import os
+import sys
+import time
+import unittest
+from typing import Any, Callable, Dict, List, Tuple
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from Validation.vali import PREFECTURES, PostalCodeIndex, PublicSuffixTrie, Validator
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'validator_benchmark_baseline.json')
+THRESHOLD = float(os.getenv('VALIDATOR_BENCH_THRESHOLD', '3.0'))
+MIN_COST = float(os.getenv('VALIDATOR_BENCH_MIN_COST', '1.0'))
+
+# 入力サイズを size_ratio 倍にしたとき、処理時間が size_ratio * GROWTH_SLACK 倍を
+# 超えたら超線形とみなす
+GROWTH_SLACK = 4.0
+
+# ベンチマーク対象外（設定用のメソッド）
+NON_VALIDATING_METHODS = {
+    'enable_cache', 'disable_cache', 'cache_stats', 'load_public_suffix_list', 'load_bin_table',
+    'load_postal_codes',
+}
+
+
+def synthetic_postal_codes() -> PostalCodeIndex:
+    """存在チェック用の郵便番号インデックス（日本郵便のデータは同梱しないため合成する）"""
+    return PostalCodeIndex(PostalCodeIndex.compile(
+        (f"{n:07d}", PREFECTURES[n // 10_000 % 47]) for n in range(0, 10_000_000, 97)
+    ))
+
+
+# ──────────────────────────────────────────────────
+# コーパス
+# ──────────────────────────────────────────────────
+REALISTIC: Dict[str, Tuple[Callable[[Any], Any], List[Any]]] = {
+    'validate_email': (Validator.validate_email, [
+        "user@example.com",
+        "taro.yamada@corp.example.co.jp",
+        "first.last+tag@sub.domain.example.org",
+        "user@example",
+        "user@@example.com",
+    ]),
+    'validate_email[public_suffix]': (lambda e: Validator.validate_email(e, check_public_suffix=True), [
+        "user@example.com",
+        "taro.yamada@corp.example.co.jp",
+        "user@gmail.con",
+        "user@co.jp",
+    ]),
+    'validate_phone_number': (Validator.validate_phone_number, [
+        "090-1234-5678", "03-1234-5678", "(03) 1234 5678", "0120-123-456", "12345",
+    ]),
+    'normalize_phone_number': (Validator.normalize_phone_number, [
+        "090-1234-5678", "03-1234-5678", "(03) 1234 5678", "0120-123-456", "12345",
+    ]),
+    'normalize_phone_numbers': (Validator.normalize_phone_numbers, [
+        ["090-1234-5678", "03-1234-5678", "(03) 1234 5678", "0120-123-456", "12345"] * 20,
+    ]),
+    'validate_password': (Validator.validate_password, [
+        "Passw0rd", "weakpass", "SecurePass123", "ALLUPPER1",
+    ]),
+    'validate_date': (Validator.validate_date, [
+        "2000-01-01", "2024-02-29", "2024-02-30", "not-a-date",
+    ]),
+    'validate_postal_code': (Validator.validate_postal_code, [
+        "100-0001", "1000001", " 530-0001 ", "100-00011",
+    ]),
+    'validate_postal_code[exists]': (lambda c: Validator.validate_postal_code(c, check_exists=True), [
+        "100-0001", "1000001", " 530-0001 ", "000-0000", "100-00011",
+    ]),
+    'postal_code_prefecture': (Validator.postal_code_prefecture, [
+        "100-0001", "1000001", " 530-0001 ", "000-0000", "100-00011",
+    ]),
+    'validate_credit_card': (Validator.validate_credit_card, [
+        "4111 1111 1111 1111", "5500-0000-0000-0004", "4111111111111112", "1234",
+    ]),
+    'card_brand': (Validator.card_brand, [
+        "4111 1111 1111 1111", "5500-0000-0000-0004", "6221 2600 0000 0000", "1234",
+    ]),
+    'classify_credit_card': (Validator.classify_credit_card, [
+        "4111 1111 1111 1111", "5500-0000-0000-0004", "378282246310005", "4111111111111112", "1234",
+    ]),
+    'classify_credit_cards': (Validator.classify_credit_cards, [
+        ["4111 1111 1111 1111", "5500-0000-0000-0004", "378282246310005", "4111111111111112",
+         "1234"] * 20,
+    ]),
+    'validate_json': (Validator.validate_json, [
+        '{"a": 1}', '[1, 2, 3]', '{"user": {"name": "taro", "tags": ["a", "b"]}}', '{bad}',
+    ]),
+    'validate_email_bytes': (Validator.validate_email_bytes, [
+        b"user@example.com", b"taro.yamada@corp.example.co.jp", b"user@example", b"user@@example.com",
+    ]),
+    'validate_phone_number_bytes': (Validator.validate_phone_number_bytes, [
+        b"090-1234-5678", b"03-1234-5678", b"(03) 1234 5678", b"12345",
+    ]),
+    'validate_postal_code_bytes': (Validator.validate_postal_code_bytes, [
+        b"100-0001", b"1000001", b" 530-0001 ", b"100-00011",
+    ]),
+    'validate_credit_card_bytes': (Validator.validate_credit_card_bytes, [
+        b"4111 1111 1111 1111", b"5500-0000-0000-0004", b"4111111111111112", b"1234",
+    ]),
+}
+
+ADVERSARIAL: Dict[str, Tuple[Callable[[Any], Any], List[Any]]] = {
+    'validate_email': (Validator.validate_email, [
+        "a" * 64 + "@" + "a-" * 90 + "!",
+        "a@" + "a." * 120 + "1",
+        "a." * 31 + "@" + "a" * 200,
+        "a" * 10_000 + "@example.com",
+    ]),
+    'validate_phone_number': (Validator.validate_phone_number, [
+        "0" + "-" * 1000 + "1",
+        "0" + "1" * 1000,
+        "090-1234-5678" + " " * 1000 + "x",
+    ]),
+    'validate_password': (Validator.validate_password, [
+        "a" * 10_000, "A1" + "!" * 10_000,
+    ]),
+    'validate_postal_code': (Validator.validate_postal_code, [
+        " " * 10_000 + "1000001", "1" * 10_000,
+    ]),
+    'validate_credit_card': (Validator.validate_credit_card, [
+        "4" * 10_000, "4-" * 5_000,
+    ]),
+    'classify_credit_card': (Validator.classify_credit_card, [
+        "4" * 10_000, "4-" * 5_000, "４" * 16,
+    ]),
+    'validate_json': (Validator.validate_json, [
+        '[' * 500 + ']' * 500, '"' + 'x' * 10_000 + '"',
+    ]),
+    'validate_phone_number_bytes': (Validator.validate_phone_number_bytes, [
+        b"0" + b"-" * 1000 + b"1", b"0" + b"1" * 1000, b"0" + b"1-" * 1000,
+    ]),
+    'validate_postal_code_bytes': (Validator.validate_postal_code_bytes, [
+        b" " * 10_000 + b"1000001", b"1" * 10_000,
+    ]),
+    'validate_credit_card_bytes': (Validator.validate_credit_card_bytes, [
+        b"4-" * 5_000, b"x" * 10_000,
+    ]),
+}
+
+# 名前 -> (対象関数, サイズ -> 入力 の生成関数, 入力サイズ列)
+GROWTH: Dict[str, Tuple[Callable[[Any], Any], Callable[[int], Any], List[int]]] = {
+    'EMAIL_REGEX/domain_hyphens': (
+        Validator.EMAIL_REGEX.fullmatch, lambda n: "a@" + "a-" * (n // 2) + "!", [30, 60, 120, 240]),
+    'EMAIL_REGEX/domain_labels': (
+        Validator.EMAIL_REGEX.fullmatch, lambda n: "a@" + "a." * (n // 2) + "1", [30, 60, 120, 240]),
+    'EMAIL_DOMAIN_REGEX/no_tld': (
+        Validator.EMAIL_DOMAIN_REGEX.fullmatch, lambda n: "a" * n + "!", [1000, 2000, 4000, 8000]),
+    'PublicSuffixTrie/labels': (
+        PublicSuffixTrie.load().public_suffix_length,
+        lambda n: "a." * n + "co.jp", [100, 200, 400, 800]),
+    'PHONE_REGEX/digits': (
+        Validator.PHONE_REGEX.fullmatch, lambda n: "0" + "1" * n + "x", [1000, 2000, 4000, 8000]),
+    'PHONE_REGEX/hyphens': (
+        Validator.PHONE_REGEX.fullmatch, lambda n: "0" + "1-" * (n // 2), [1000, 2000, 4000, 8000]),
+    'POSTAL_CODE_REGEX/digits': (
+        Validator.POSTAL_CODE_REGEX.fullmatch, lambda n: "1" * n, [1000, 2000, 4000, 8000]),
+    'validate_email': (
+        Validator.validate_email, lambda n: "a@" + "a." * (n // 2) + "1", [30, 60, 120, 240]),
+    'validate_phone_number': (
+        Validator.validate_phone_number, lambda n: "0" + " -" * n + "1", [1000, 2000, 4000, 8000]),
+    'normalize_phone_numbers': (
+        Validator.normalize_phone_numbers, lambda n: ["090-1234-5678"] * n, [100, 200, 400, 800]),
+    'validate_password': (
+        Validator.validate_password, lambda n: "a" * n, [1000, 2000, 4000, 8000]),
+    'validate_date': (
+        Validator.validate_date, lambda n: "2024-01-01" + "x" * n, [1000, 2000, 4000, 8000]),
+    'validate_postal_code': (
+        Validator.validate_postal_code, lambda n: " " * n + "1" * n, [1000, 2000, 4000, 8000]),
+    'validate_credit_card': (
+        Validator.validate_credit_card, lambda n: "1-" * n, [1000, 2000, 4000, 8000]),
+    'classify_credit_card': (
+        Validator.classify_credit_card, lambda n: "4-" * n, [1000, 2000, 4000, 8000]),
+    'classify_credit_cards': (
+        Validator.classify_credit_cards, lambda n: ["4111 1111 1111 1111"] * n, [100, 200, 400, 800]),
+    'validate_json': (
+        Validator.validate_json, lambda n: "[" + "1," * n + "1]", [1000, 2000, 4000, 8000]),
+    'PHONE_BYTES_REGEX/separators': (
+        Validator.PHONE_BYTES_REGEX.fullmatch, lambda n: b"0" + b"1-" * n, [1000, 2000, 4000, 8000]),
+    'PHONE_BYTES_REGEX/digits': (
+        Validator.PHONE_BYTES_REGEX.fullmatch, lambda n: b"0" + b"1" * n, [1000, 2000, 4000, 8000]),
+    'validate_postal_code_bytes': (
+        Validator.validate_postal_code_bytes, lambda n: b" " * n + b"1" * n, [1000, 2000, 4000, 8000]),
+    'validate_credit_card_bytes': (
+        Validator.validate_credit_card_bytes, lambda n: b"x" * n, [1000, 2000, 4000, 8000]),
+}
+
+
+# ──────────────────────────────────────────────────
+# 計測
+# ──────────────────────────────────────────────────
+def measure(func: Callable[[Any], Any], args: List[Any],
+            min_time: float = 0.005, repeat: int = 3) -> float:
+    """args を一巡する処理の1回あたり所要時間（秒, repeat回の最小値）"""
+    def run(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            for arg in args:
+                func(arg)
+        return time.perf_counter() - start
+
+    number = 1
+    elapsed = run(number)
+    while elapsed < min_time and number < 1_000_000:
+        number *= 4
+        elapsed = run(number)
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, run(number))
+    return best / number
+
+
+def calibrate() -> float:
+    """マシン性能の基準となる校正ワークロードの所要時間"""
+    return measure(lambda n: sum(i * i for i in range(n)), [500])
+
+
+def run_benchmarks() -> Dict[str, Any]:
+    """全ケースを計測し、校正値との比を返す（郵便番号インデックスは計測中だけ差し替える）"""
+    with mock.patch.object(Validator, '_postal_codes', synthetic_postal_codes()):
+        return _run_benchmarks()
+
+
+def _run_benchmarks() -> Dict[str, Any]:
+    cal = calibrate()
+    cases: Dict[str, float] = {}
+    for label, corpora in (('realistic', REALISTIC), ('adversarial', ADVERSARIAL)):
+        for name, (func, args) in corpora.items():
+            cases[f"{name}/{label}"] = round(measure(func, args) / cal, 4)
+
+    growth: Dict[str, float] = {}
+    for name, (func, make_input, sizes) in GROWTH.items():
+        small = measure(func, [make_input(sizes[0])])
+        large = measure(func, [make_input(sizes[-1])])
+        growth[name] = round(large / small, 2)
+
+    return {
+        'python': sys.version.split()[0],
+        'calibration_seconds': cal,
+        'cases': cases,
+        'growth': growth,
+    }
+
+
+def load_baseline() -> Dict[str, Any]:
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(results: Dict[str, Any], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+# ──────────────────────────────────────────────────
+# テスト
+# ──────────────────────────────────────────────────
+class TestValidatorPerformance(unittest.TestCase):
+    """Validatorの性能・ReDoS回帰テスト"""
+
+    results: Dict[str, Any] = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results = run_benchmarks()
+        output = os.getenv('VALIDATOR_BENCH_OUTPUT')
+        if output:
+            save_results(cls.results, output)
+
+    def test_every_validator_method_is_benchmarked(self):
+        """Validatorの全公開メソッドにベンチマークが存在すること"""
+        methods = {
+            name for name in dir(Validator)
+            if not name.startswith('_') and callable(getattr(Validator, name))
+            and name not in NON_VALIDATING_METHODS
+        }
+        missing = methods - {name.split('[')[0] for name in REALISTIC}
+        self.assertFalse(missing, f"ベンチマーク未定義のメソッド: {sorted(missing)}")
+
+    def test_no_super_linear_growth(self):
+        """入力サイズに対して処理時間が超線形に増加しないこと"""
+        for name, (_, _, sizes) in GROWTH.items():
+            with self.subTest(case=name):
+                limit = sizes[-1] / sizes[0] * GROWTH_SLACK
+                self.assertLessEqual(
+                    self.results['growth'][name], limit,
+                    f"{name}: 入力 {sizes[-1] // sizes[0]} 倍で処理時間が "
+                    f"{self.results['growth'][name]} 倍（上限 {limit} 倍）"
+                )
+
+    def test_no_regression_against_baseline(self):
+        """ベースラインから閾値を超えて遅くなっていないこと（計測のぶれが大きい短いケースは除く）"""
+        baseline = load_baseline().get('cases', {})
+        if not baseline:
+            self.skipTest("ベースライン未作成（--update-baseline で作成）")
+
+        for case, cost in self.results['cases'].items():
+            if case not in baseline or baseline[case] < MIN_COST:
+                continue
+            with self.subTest(case=case):
+                self.assertLessEqual(
+                    cost, baseline[case] * THRESHOLD,
+                    f"{case}: ベースライン {baseline[case]} に対して {cost}"
+                    f"（許容 {THRESHOLD} 倍）"
+                )
+
+
+if __name__ == '__main__':
+    if '--update-baseline' in sys.argv:
+        save_results(run_benchmarks(), BASELINE_PATH)
+        print(f"ベースラインを更新しました: {BASELINE_PATH}")
+    else:
+        unittest.main(verbosity=2)